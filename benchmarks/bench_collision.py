@@ -0,0 +1,81 @@
+# bench_collision.py
+# Compares the per-frame cost of the old Cafeteria.hit_test (offset every hitbox onto the screen,
+# then collideRectPolygon) with the compiled PolygonCollider version and the rasterised CollisionLayer.
+# Run from the project folder:  python benchmarks/bench_collision.py
+import os, sys, time
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")   # no window needed
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+pygame.init()
+pygame.display.set_mode((1, 1))
+from modules.entities import Cafeteria, collideRectPolygon
+from modules import collision
+from modules.settings import WIDTH, HEIGHT
+
+class _Camera:
+    x = 0
+    y = 0
+
+def old_hit_test(room, rect):
+    # the hit_test from before the hitboxes were compiled
+    for hitbox in room.hitboxes:
+        new_poly = []
+        for point in hitbox:
+            new_poly.append([room.rect.topleft[0] + point[0], room.rect.topleft[1] + point[1]])
+        if collideRectPolygon(rect, new_poly):
+            return True
+    return False
+
+def polygon_hit_test(room, rect):
+    return room.collider.hit_test(rect.x - room.rect.x, rect.y - room.rect.y, rect.width, rect.height)
+
+def player_path(room):
+    # walk the player's hit rect over a grid covering the whole map
+    w, h = room.image.get_size()
+    for py in range(-50, h + 50, 13):
+        for px in range(-50, w + 50, 13):
+            yield pygame.Rect(room.rect.x + px, room.rect.y + py, 40, 40)
+
+def bench(fn, room, rects, repeat=3):
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        for r in rects:
+            fn(room, r)
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(rects)
+
+if __name__ == "__main__":
+    cam = _Camera()
+    room = Cafeteria(WIDTH // 2, HEIGHT // 2 + 200, cam)
+    room.update()
+    rects = list(player_path(room))
+
+    # the compiled polygons must agree with the old code before timing means anything
+    mismatches = sum(1 for r in rects if bool(old_hit_test(room, r)) != polygon_hit_test(room, r))
+    hits = sum(1 for r in rects if polygon_hit_test(room, r))
+    blocked = sum(1 for r in rects if room.hit_test(r))
+    print(f"{len(rects)} player positions, {hits} crossing an edge ({mismatches} mismatches), {blocked} touching a blocked cell")
+
+    old = bench(old_hit_test, room, rects)
+    new = bench(polygon_hit_test, room, rects)
+    layer = bench(lambda rm, r: rm.hit_test(r), room, rects)
+    print(f"old hit_test:       {old * 1e6:8.2f} us per frame")
+    print(f"compiled polygons:  {new * 1e6:8.2f} us per frame  ({old / new:.1f}x faster)")
+    print(f"collision layer:    {layer * 1e6:8.2f} us per frame  ({old / layer:.1f}x faster)")
+
+    # batched test of every position at once (like the server checking all players), NumPy vs Python
+    local = [(r.x - room.rect.x, r.y - room.rect.y, r.width, r.height) for r in rects]
+    collider = room.collider
+    batch = collider.hit_test_many(local)
+    scalar = [collider.hit_test(*r) for r in local]
+    batch_mismatches = sum(1 for a, b in zip(batch, scalar) if a != b)
+    t = time.perf_counter(); collider.hit_test_many(local); t_batch = time.perf_counter() - t
+    t = time.perf_counter(); [collider.hit_test(*r) for r in local]; t_scalar = time.perf_counter() - t
+    kernel = "numpy" if collision.np is not None else "python fallback"
+    print(f"hit_test_many ({kernel}): {t_batch * 1e3:.2f} ms for {len(local)} rects vs {t_scalar * 1e3:.2f} ms one at a time, "
+          f"{batch_mismatches} mismatches")
+    sys.exit(1 if mismatches or batch_mismatches else 0)
@@ -0,0 +1,83 @@
+# bench_entities.py
+# Compares a crowd of GameEntity sprites with the same crowd in an EntityStore (ArrayEntity):
+# one simulation tick (move + animate) and one frame of drawing each, for a few crowd sizes.
+# Also checks that both give the same positions and animation frames.
+# Run from the project folder:  python benchmarks/bench_entities.py
+import os, sys, time, random
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")   # no window needed
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+pygame.init()
+screen = pygame.display.set_mode((1280, 720))
+from modules.entities import GameEntity
+from modules.entity_store import EntityStore, ArrayEntity
+from modules.settings import WIDTH, HEIGHT
+
+FRAMES = ["assets/crate.png"] * 4   # any image will do, four frames so the animation wraps
+
+class Walker(GameEntity):
+    def __init__(self, x, y, vx, vy):
+        super().__init__(x, y, None)
+        for path in FRAMES:
+            self.add_frame(path)
+        self.vx, self.vy = vx, vy
+
+    def tick(self):
+        # what a typical student NPC does each tick
+        self.update_position(self.vx, self.vy)
+        if self.vx < 0:
+            self.facing = "left"
+        elif self.vx > 0:
+            self.facing = "right"
+        self.animate(self.vx != 0 or self.vy != 0)
+
+class ArrayWalker(ArrayEntity):
+    FRAMES = FRAMES
+
+def crowd(n, seed=1):
+    rnd = random.Random(seed)
+    return [(rnd.uniform(-2000, 2000), rnd.uniform(-2000, 2000), rnd.choice((-2, -1, 0, 1, 2)), rnd.choice((-1, 0, 1)))
+            for _ in range(n)]
+
+def timed(fn, repeat=20):
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def draw_sprites(walkers):
+    for w in walkers:
+        if abs(w.x) < WIDTH // 2 + 64 and abs(w.y) < HEIGHT // 2 + 64:   # same culling as the store
+            w.update(0, 0, WIDTH, HEIGHT)
+            screen.blit(w.image, w.rect)
+
+if __name__ == "__main__":
+    mismatches = 0
+    for n in (500, 2000, 5000):
+        start = crowd(n)
+        walkers = [Walker(*c) for c in start]
+        store = EntityStore()
+        npcs = [ArrayWalker(x, y, None, vx, vy, store=store) for x, y, vx, vy in start]
+
+        # both versions must agree before the timing means anything
+        for _ in range(30):
+            for w in walkers:
+                w.tick()
+            store.step()
+        mismatches += sum(1 for w, a in zip(walkers, npcs)
+                          if (w.x, w.y, w.current_frame, w.facing) != (a.x, a.y, a.current_frame, a.facing))
+
+        sprite_tick = timed(lambda: [w.tick() for w in walkers])
+        store_tick = timed(store.step)
+        sprite_draw = timed(lambda: draw_sprites(walkers))
+        store_draw = timed(lambda: store.draw(screen, 0, 0))
+        print(f"{n:5d} NPCs  tick: sprites {sprite_tick * 1e3:7.2f} ms, store {store_tick * 1e3:6.2f} ms "
+              f"({sprite_tick / store_tick:5.1f}x)   draw: sprites {sprite_draw * 1e3:6.2f} ms, "
+              f"store {store_draw * 1e3:6.2f} ms ({sprite_draw / store_draw:4.1f}x)")
+    print(f"{mismatches} mismatches")
+    sys.exit(1 if mismatches else 0)
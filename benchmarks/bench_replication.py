@@ -0,0 +1,78 @@
+# bench_replication.py
+# How much a room full of shared entities costs on the wire (see modules/replication.py):
+#   full state: every entity's fields sent every broadcast
+#   deltas:     only the fields that changed, batched into one "entities" message per broadcast
+# Also checks that two players changing different fields of one entity in the same broadcast both
+# end up with each other's change. Exit code 1 if a check fails.
+# Run from the project folder:  python benchmarks/bench_replication.py [--entities 500] [--changing 10]
+import argparse, json, os, sys, types
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from modules.replication import EntityTable, EntityReplicator
+
+class Crate:
+    REPLICATE = ("x", "y", "opened", "hp")
+    def __init__(self, key):
+        self.net_key = key
+        self.x, self.y, self.opened, self.hp = 100.0, 200.0, False, 10
+
+def player(sid):
+    """A replicator with just the parts of NetClient it uses."""
+    return EntityReplicator(types.SimpleNamespace(my_sid=sid, player_id=sid, sio=None, state=None))
+
+def over_the_wire(message):
+    # what the client gets: Socket.IO sends JSON, so ids become strings
+    return json.loads(json.dumps(message))
+
+def register(table, sid, replicator, ent):
+    replicator.track(ent)
+    rec = table.register(sid, {"key": ent.net_key, "type": "Crate", "fields": replicator.baseline[ent.net_key]})
+    replicator.inbox.append(("ids", over_the_wire({"entities": [rec]})))
+    replicator.sync([])
+
+def size(message):
+    return len(json.dumps(message, separators=(",", ":")))
+
+def same_broadcast_check():
+    table = EntityTable()
+    a, b = player("A"), player("B")
+    crate_a, crate_b = Crate("room:0"), Crate("room:0")
+    register(table, "A", a, crate_a)
+    register(table, "B", b, crate_b)
+    crate_a.opened = True
+    crate_b.hp = 3
+    for sid, replicator, crate in (("A", a, crate_a), ("B", b, crate_b)):
+        replicator.sync([crate])
+        table.update(sid, over_the_wire(replicator.changes))
+        replicator.changes = {}
+    message = over_the_wire(table.take(0.0))
+    for replicator in (a, b):
+        replicator.inbox.append(("entities", message))
+        replicator.sync([])
+    return crate_a.hp == 3 and crate_b.opened is True
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--entities", type=int, default=500)
+    ap.add_argument("--changing", type=int, default=10, help="entities that change between broadcasts")
+    args = ap.parse_args()
+
+    table = EntityTable()
+    me = player("me")
+    crates = [Crate(f"room:{i}") for i in range(args.entities)]
+    for crate in crates:
+        register(table, "me", me, crate)
+    for crate in crates[:args.changing]:
+        crate.x += 3
+        crate.opened = not crate.opened
+    me.sync(crates)
+    table.update("me", over_the_wire(me.changes))
+    deltas = size(table.take(0.0))
+    full = size({"changed": {ent["key"]: ent["fields"] for ent in table.entities.values()}})
+    print(f"{args.entities} entities, {args.changing} changing between broadcasts")
+    print(f"  full state: {full:8d} bytes a broadcast")
+    print(f"  deltas:     {deltas:8d} bytes a broadcast ({deltas / full:.1%})")
+
+    ok = same_broadcast_check()
+    print(f"  two players, two fields, one broadcast: {'both changes arrive' if ok else 'FAILED'}")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,51 @@
+# bench_server_start.py
+# How long the server takes from "python ..." to answering its first HTTP request, and how much
+# memory (RSS) it is using by then. Runs it a few times and prints the average and the best.
+# Linux only (reads /proc for the memory). Run from the project folder:
+#   python benchmarks/bench_server_start.py                       (python -m modules.server)
+#   python benchmarks/bench_server_start.py --cwd modules -- python server.py    (any other command)
+import argparse, os, subprocess, sys, time, urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def start_once(command, cwd, url, timeout=20.0):
+    started = time.perf_counter()
+    proc = subprocess.Popen(command, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"server exited with code {proc.returncode}")
+            try:
+                urllib.request.urlopen(url, timeout=0.5).read()
+                return time.perf_counter() - started, rss_mb(proc.pid)
+            except OSError:
+                time.sleep(0.005)
+        raise RuntimeError("server didn't answer in time")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--cwd", default=".", help="folder to run the command in (relative to the project folder)")
+    ap.add_argument("--url", default="http://127.0.0.1:8000/socket.io/?EIO=4&transport=polling")
+    ap.add_argument("command", nargs="*", help="default: python -m modules.server")
+    args = ap.parse_args()
+    command = args.command or [sys.executable, "-m", "modules.server"]
+    if command[0] == "python":
+        command[0] = sys.executable
+
+    results = [start_once(command, os.path.join(ROOT, args.cwd), args.url) for _ in range(args.runs)]
+    times = [t * 1000 for t, _ in results]
+    rss = [m for _, m in results]
+    print(" ".join(command[1:]) if command[0] == sys.executable else " ".join(command))
+    print(f"  cold start: {sum(times) / len(times):7.1f} ms average, {min(times):7.1f} ms best")
+    print(f"  RSS:        {sum(rss) / len(rss):7.1f} MB average")
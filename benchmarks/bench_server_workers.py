@@ -0,0 +1,83 @@
+# bench_server_workers.py
+# Load test for python -m modules.server with and without --workers: starts the server, connects a
+# class worth of bot clients that walk about (sending "move" like the game does) and counts how many
+# world updates reach them. Also reports the CPU each server process used - with one process that is
+# the number that hits 100% of one core first.
+# Linux only (reads /proc). Run from the project folder:
+#   python benchmarks/bench_server_workers.py --workers 1
+#   python benchmarks/bench_server_workers.py --workers 4 --clients 60
+# Only shows a difference on a PC with more than one core.
+import argparse, asyncio, multiprocessing, os, random, subprocess, sys, time
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+def server_pids(parent):
+    pids = [parent]
+    out = subprocess.run(["pgrep", "-P", str(parent)], capture_output=True, text=True).stdout
+    return pids + [int(p) for p in out.split()]
+
+def bots(first, count, url, seconds, move_rate, results):
+    import socketio
+    async def run():
+        received = [0]
+        clients = []
+        for i in range(first, first + count):
+            c = socketio.AsyncClient()
+            c.on("world", lambda world: received.__setitem__(0, received[0] + 1))
+            await c.connect(url, auth={"name": f"bot{i}", "id": f"bot{i}", "appearance": {}}, transports=["websocket"])
+            clients.append(c)
+        async def walk(c):
+            dx = random.choice((-8, 8))
+            end = time.perf_counter() + seconds
+            while time.perf_counter() < end:
+                await c.emit("move", {"dx": dx, "dy": 0})
+                dx = -dx
+                await asyncio.sleep(1 / move_rate)
+        await asyncio.gather(*(walk(c) for c in clients))
+        await asyncio.sleep(0.5)
+        results.put(received[0])
+        for c in clients:
+            await c.disconnect()
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--clients", type=int, default=30)
+    ap.add_argument("--bot-processes", type=int, default=3)
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--move-rate", type=float, default=10.0, help="moves a second each bot sends")
+    ap.add_argument("--port", type=int, default=8765)
+    args = ap.parse_args()
+
+    server = subprocess.Popen([sys.executable, "-m", "modules.server", "--port", str(args.port), "--no-save",
+                               "--workers", str(args.workers)], cwd=ROOT, stdout=subprocess.DEVNULL)
+    time.sleep(2.0)
+    try:
+        pids = server_pids(server.pid)
+        before = {pid: cpu_seconds(pid) for pid in pids}
+        results = multiprocessing.Queue()
+        per = args.clients // args.bot_processes
+        procs = [multiprocessing.Process(target=bots, args=(n * per, per, f"http://127.0.0.1:{args.port}",
+                                                            args.seconds, args.move_rate, results))
+                 for n in range(args.bot_processes)]
+        started = time.perf_counter()
+        for p in procs:
+            p.start()
+        received = sum(results.get() for _ in procs)
+        elapsed = time.perf_counter() - started
+        used = {pid: cpu_seconds(pid) - before[pid] for pid in pids}
+        for p in procs:
+            p.join()
+    finally:
+        server.terminate()
+        server.wait()
+    sent = per * args.bot_processes * args.move_rate * args.seconds
+    print(f"{args.workers} worker(s), {per * args.bot_processes} bots, {sent:.0f} moves sent in {args.seconds:.0f} s")
+    print(f"  world updates received: {received} ({received / elapsed:.0f} a second over {elapsed:.1f} s)")
+    for pid, cpu in used.items():
+        print(f"  server process {pid}: {cpu:5.2f} s CPU ({cpu / elapsed:4.0%} of a core)")
@@ -0,0 +1,74 @@
+# bench_sheet_ingest.py
+# How long does the server's event loop stop while a big sprite sheet is uploaded?
+# Runs ingest_sheet (check, scale, re-encode - see modules/sheet_ingest.py) on a large test sheet
+# twice: straight on the event loop, and in a thread pool like server.py does, while a ticker task
+# measures the worst pause. Also prints how much smaller the re-encoded sheet is.
+# Needs Pillow only (no pygame, no server). Run from the project folder:  python benchmarks/bench_sheet_ingest.py
+import asyncio, base64, hashlib, io, os, random, sys, time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PIL import Image, ImageDraw
+from modules.config import MAX_SHEET_BYTES
+from modules.sheet_ingest import ingest_sheet
+
+def make_sheet(cols=9, rows=4, cell=200, seed=1):
+    """A grid of blobby frames with soft edges - roughly what an exported character sheet looks like."""
+    rnd = random.Random(seed)
+    im = Image.new("RGBA", (cols * cell, rows * cell), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(im)
+    for r in range(rows):
+        for c in range(cols):
+            x, y = c * cell, r * cell
+            for _ in range(40):
+                cx, cy, rad = x + rnd.randint(40, cell - 40), y + rnd.randint(40, cell - 40), rnd.randint(5, 35)
+                colour = (rnd.randint(0, 255), rnd.randint(0, 255), rnd.randint(0, 255), 255)
+                draw.ellipse((cx - rad, cy - rad, cx + rad, cy + rad), fill=colour)
+    out = io.BytesIO()
+    im.save(out, format="PNG", compress_level=1)   # like a quick export from an art program
+    return out.getvalue()
+
+async def worst_pause(job, interval=0.005):
+    """Run job() (a coroutine) while measuring the longest time the loop couldn't run the ticker."""
+    worst = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal worst
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            worst = max(worst, time.perf_counter() - start - interval)
+
+    tick_task = asyncio.create_task(ticker())
+    await asyncio.sleep(interval * 2)
+    started = time.perf_counter()
+    result = await job()
+    took = time.perf_counter() - started
+    done = True
+    await tick_task
+    return result, took * 1000, worst * 1000
+
+async def main():
+    png = make_sheet()
+    b64 = base64.b64encode(png).decode("ascii")
+    h = hashlib.sha256(png).hexdigest()
+    meta = {"count": 36, "cols": 9, "pad": 0, "scale": 1.0, "atlas": None}
+    print(f"test sheet: {len(png) / 1024:.0f} KB PNG, {len(b64) / 1024:.0f} KB base64")
+    pool = ThreadPoolExecutor(max_workers=2)
+    loop = asyncio.get_running_loop()
+
+    async def inline():
+        return ingest_sheet(h, b64, meta, MAX_SHEET_BYTES * 8)
+
+    async def in_pool():
+        return await loop.run_in_executor(pool, ingest_sheet, h, b64, meta, MAX_SHEET_BYTES * 8)
+
+    for name, job in (("on the event loop", inline), ("in a thread pool", in_pool)):
+        result, took, pause = await worst_pause(job)
+        stats = result["stats"]
+        print(f"{name:18}: {took:7.1f} ms to ingest, worst event loop pause {pause:7.1f} ms, "
+              f"{stats['in_bytes'] / 1024:.0f} KB -> {stats['out_bytes'] / 1024:.0f} KB")
+    pool.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
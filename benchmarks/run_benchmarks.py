@@ -0,0 +1,302 @@
+# run_benchmarks.py
+# Micro-benchmarks for the game's hot paths, with stored baselines so anything that gets slower shows
+# up as a failure. Runs headless (SDL dummy driver), so it works over SSH and on a build server.
+#   python benchmarks/run_benchmarks.py              run them all and compare with benchmarks/baselines.json
+#   python benchmarks/run_benchmarks.py --save       run them all and save the results as the new baselines
+#   python benchmarks/run_benchmarks.py -k world     only the benchmarks with "world" in their name
+# A benchmark fails when it takes more than --tolerance (default 0.5 = 50%) longer than its baseline,
+# three times running (the first time it's measured again in case the PC was just busy). Each result is
+# the median of several timed runs, not the best, so baselines still hold on a noisy shared machine.
+# Times depend on the PC, so save baselines on the machine you compare on (the file says which one).
+# Exit code: 0 all fine, 1 something got slower.
+import argparse, asyncio, gc, json, os, platform, random, sys, time
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")   # no window needed
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame
+pygame.init()
+screen = pygame.display.set_mode((1280, 720))
+from modules.entities import pallete_swap, load_frames_grid, collideRectPolygon, Cafeteria, HUD, OLD_COLOR_HIGHLIGHT
+from modules.assets import ASSETS
+from modules.assets_net import frames_from_surface
+from modules.chat import ChatLog
+from modules.profiler import Profiler
+from modules.network_client import NetClient
+from modules.settings import WIDTH, HEIGHT, PLAYER_START_X, PLAYER_START_Y
+
+BASELINES = os.path.join(ROOT, "benchmarks", "baselines.json")
+SHEET = "assets/player_sheet.png"
+BENCHMARKS = []   # (name, setup) - setup() returns (function to time, operations per call)
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS.append((name, setup))
+        return setup
+    return register
+
+# ----- sprites -----
+@benchmark("pallete_swap")
+def _():
+    frame = ASSETS.frames(SHEET, cols=9, count=9, pad=1)[0]
+    return lambda: pallete_swap(frame, OLD_COLOR_HIGHLIGHT, (255, 165, 0)), 1
+
+@benchmark("load_frames_grid (cold)")
+def _():
+    def load():
+        ASSETS.forget(SHEET)   # so it really decodes and slices the sheet, not just returns the cached frames
+        load_frames_grid(SHEET, cols=9, count=9, pad=1)
+    return load, 1
+
+@benchmark("load_frames_grid (cached)")
+def _():
+    load_frames_grid(SHEET, cols=9, count=9, pad=1)
+    return lambda: load_frames_grid(SHEET, cols=9, count=9, pad=1), 1
+
+@benchmark("frames_from_surface")
+def _():
+    sheet = pygame.image.load(SHEET).convert_alpha()
+    return lambda: frames_from_surface(sheet, cols=9, count=9, pad=1), 1
+
+@benchmark("frames_from_surface (scale 0.66)")
+def _():
+    sheet = pygame.image.load(SHEET).convert_alpha()
+    return lambda: frames_from_surface(sheet, cols=9, count=9, pad=1, scale=0.66), 1
+
+# ----- collision -----
+class _Camera:
+    x = 0
+    y = 0
+
+def _cafeteria_rects():
+    room = Cafeteria(WIDTH // 2, HEIGHT // 2 + 200, _Camera())
+    room.update()
+    w, h = room.image.get_size()
+    rects = [pygame.Rect(room.rect.x + px, room.rect.y + py, 40, 40)
+             for py in range(-50, h + 50, 37) for px in range(-50, w + 50, 37)]
+    return room, rects
+
+@benchmark("Cafeteria.hit_test")
+def _():
+    room, rects = _cafeteria_rects()
+    def walk():
+        for r in rects:
+            room.hit_test(r)
+    return walk, len(rects)
+
+@benchmark("collideRectPolygon")
+def _():
+    room, rects = _cafeteria_rects()
+    polygons = [[[room.rect.x + x, room.rect.y + y] for x, y in hitbox] for hitbox in room.hitboxes]
+    def walk():
+        for r in rects:
+            for poly in polygons:
+                collideRectPolygon(r, poly)
+    return walk, len(rects) * len(polygons)
+
+# ----- network -----
+class _State:
+    """Just the parts of GameState that NetClient's handlers use."""
+    def __init__(self):
+        self.profiler = Profiler()
+        self.player_data = {}
+        self.players_group = {}
+        self.player = pygame.sprite.Sprite()
+        self.player.x, self.player.y = PLAYER_START_X, PLAYER_START_Y
+        self.chat = ChatLog(pygame.font.Font('assets/FreeSans.ttf', 16), 10, HEIGHT - 10)
+
+def _world(n, seed=1):
+    rnd = random.Random(seed)
+    return {f"sid{i:04d}": {"x": rnd.randint(0, 3000), "y": rnd.randint(0, 3000), "name": f"p{i}", "color": "#64b5f6",
+                            "appearance": {"hash": "", "count": 9, "cols": 9, "pad": 1, "scale": 1.0}}
+            for i in range(n)}
+
+def _on_world(n):
+    def setup():
+        client = NetClient(_State(), "http://localhost:8000")
+        world = _world(n)
+        client.handlers["world"](world)   # the first world creates the sprites, after that it's updates
+        step = [1]
+        def apply():
+            step[0] = -step[0]
+            for p in world.values():
+                p["x"] += step[0]     # everybody walks, like a busy class
+            client.handlers["world"](world)
+        return apply, 1
+    return setup
+
+for _n in (10, 50, 200):
+    benchmark(f"NetClient.on_world ({_n} players)")(_on_world(_n))
+
+def _on_move(n, instances=1):
+    def setup():
+        from modules import server
+        sent = {}
+        async def fake_emit(event, data, to=None, room=None, **kwargs):
+            # python-socketio encodes a broadcast once and then queues it for every client in the room
+            packet = json.dumps([event, data], separators=(",", ":"))
+            for sid in ([to] if to else server.LOBBY.instances[room].world):
+                sent[sid] = packet
+        server.sio.emit = fake_emit
+        server.WORLD.clear()
+        server.WORLD.update(_world(n))
+        server.LOBBY.instances.clear()
+        for i, (sid, p) in enumerate(server.WORLD.items()):
+            server.LOBBY.join(sid, server.LOBBY.get(f"bench-{i % instances}"), p)   # shared out like the lobby would
+        loop = asyncio.new_event_loop()
+        moves = 50
+        async def move_everyone():
+            for i in range(moves):
+                await server.on_move(f"sid{i % n:04d}", {"dx": 1 - 2 * (i & 1), "dy": 0})
+        return lambda: loop.run_until_complete(move_everyone()), moves
+    return setup
+
+for _n in (10, 50, 200):
+    benchmark(f"server on_move fan-out ({_n} players)")(_on_move(_n))
+benchmark("server on_move fan-out (5x40 players)")(_on_move(200, 5))
+
+def _entity_sync(n, changing=5):
+    def setup():
+        from modules.spatial import SpatialGroup
+        from modules.replication import EntityReplicator
+        class Crate(pygame.sprite.Sprite):
+            REPLICATE = ("x", "y", "opened")
+            def __init__(self, i):
+                super().__init__()
+                self.x, self.y, self.opened = i * 40.0, 100.0, False
+        client = NetClient(_State(), "http://localhost:8000")
+        client.my_sid = "me"
+        group = SpatialGroup()
+        client.entities.attach(group)
+        crates = [Crate(i) for i in range(n)]
+        group.add(*crates)
+        client.entities._apply_ids([{"id": i + 1, "key": c.net_key, "owner": "", "fields": {}} for i, c in enumerate(crates)])
+        def tick():
+            for c in crates[:changing]:
+                c.opened = not c.opened   # a few crates change each tick, the rest are checked and skipped
+            client.entities.sync(crates)
+            client.entities.changes.clear()
+        return tick, 1
+    return setup
+
+for _n in (100, 500):
+    benchmark(f"EntityReplicator.sync ({_n} entities)")(_entity_sync(_n))
+
+# ----- UI -----
+@benchmark("HUD.draw")
+def _():
+    hud = HUD(font_size=20, max_msgs=4)
+    hud.set_score(1234)
+    for text in ("Connected to the server", "You were hit!", "Saved trace.json", "Images: 12.3 MB"):
+        hud.add_msg(text, duration_ms=10 ** 9)
+    return lambda: hud.draw(screen), 1
+
+@benchmark("ChatLog.draw")
+def _():
+    chat = ChatLog(pygame.font.Font('assets/FreeSans.ttf', 16), 10, HEIGHT - 10)
+    for i in range(100):
+        chat.add(f"player{i % 7}: message number {i} with enough words in it to wrap onto a second line sometimes")
+    chat.draw(screen)
+    return lambda: chat.draw(screen), 1
+
+@benchmark("ChatLog.draw (new message)")
+def _():
+    chat = ChatLog(pygame.font.Font('assets/FreeSans.ttf', 16), 10, HEIGHT - 10)
+    count = [0]
+    def draw():
+        count[0] += 1
+        chat.add(f"player{count[0] % 7}: message number {count[0]}")
+        chat.draw(screen)   # has to wrap the message and redraw the panel
+    return draw, 1
+
+# ----- runner -----
+def measure(func, ops, repeat=7, min_time=0.05):
+    """Median time per operation in microseconds. Calls func enough times that each repeat takes min_time."""
+    func()   # warm up (first calls fill caches)
+    gc.collect()
+    gc.disable()   # like timeit, so a garbage collection doesn't land in one benchmark and not another
+    try:
+        return _measure(func, ops, repeat, min_time)
+    finally:
+        gc.enable()
+
+def _measure(func, ops, repeat, min_time):
+    loops = 1
+    while True:
+        t = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - t
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2 if elapsed > min_time / 10 else 10
+    times = [elapsed]
+    for _ in range(repeat - 1):
+        t = time.perf_counter()
+        for _ in range(loops):
+            func()
+        times.append(time.perf_counter() - t)
+    # the median rather than the best: school PCs (and shared servers) are noisy, and a baseline
+    # from one lucky run would make every normal run after it look like a slowdown
+    return sorted(times)[len(times) // 2] / (loops * ops) * 1e6
+
+def machine():
+    return f"{platform.machine()} {platform.processor() or ''} {os.cpu_count()} CPUs, Python {platform.python_version()}, pygame {pygame.version.ver}".replace("  ", " ")
+
+def load_baselines():
+    if not os.path.exists(BASELINES):
+        return None
+    with open(BASELINES) as f:
+        return json.load(f)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--save", action="store_true", help="save the results as the new baselines")
+    ap.add_argument("-k", dest="keyword", default="", help="only run benchmarks with this in their name")
+    ap.add_argument("--tolerance", type=float, default=0.5, help="how much slower than the baseline counts as a failure")
+    args = ap.parse_args()
+
+    baselines = load_baselines()
+    old = (baselines or {}).get("results", {})
+    if baselines and baselines.get("machine") != machine() and not args.save:
+        print(f"Note: baselines are from {baselines.get('machine')}; this is {machine()}. Use --save to remake them.")
+
+    results = {}
+    failed = []
+    for name, setup in BENCHMARKS:
+        if args.keyword.lower() not in name.lower():
+            continue
+        func, ops = setup()
+        base = old.get(name)
+        if args.save:
+            # a baseline is the middle of three runs, so one lucky (or unlucky) run doesn't set it
+            us = sorted(measure(func, ops) for _ in range(3))[1]
+        else:
+            us = measure(func, ops)
+            for _ in range(2):
+                if base is None or us <= base * (1 + args.tolerance):
+                    break
+                us = min(us, measure(func, ops))   # looks slower: check again before calling it a failure
+        results[name] = round(us, 3)
+        if base is None:
+            verdict = "new"
+        else:
+            change = us / base - 1
+            verdict = f"{change:+6.0%}"
+            if change > args.tolerance:
+                verdict += "  SLOWER"
+                failed.append(name)
+        print(f"{name:40} {us:12.2f} us  {'' if base is None else f'(baseline {base:.2f})':>22}  {verdict}")
+
+    if args.save:
+        merged = dict(old) if baselines and baselines.get("machine") == machine() else {}
+        merged.update(results)
+        with open(BASELINES, "w") as f:
+            json.dump({"machine": machine(), "results": merged}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Saved {len(results)} baselines to {os.path.relpath(BASELINES)}")
+    elif failed:
+        print(f"{len(failed)} benchmark(s) more than {args.tolerance:.0%} slower than the baseline: {', '.join(failed)}")
+        sys.exit(1)
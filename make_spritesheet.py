@@ -1,5 +1,17 @@
 # make_spritesheet.py
+# Packs animation frames into one sprite sheet PNG plus a JSON file describing where each frame is.
+#
+# Two ways to pack:
+#   --mode grid      (default) every frame in a grid cell the size of the biggest frame.
+#                    Works with SHEET_COLS/SHEET_PAD in BasePlayer without the JSON.
+#   --mode maxrects  cuts the transparent border off each frame (unless --no-trim) and fits the
+#                    pieces together as tightly as it can (MaxRects bin packing). Much smaller PNGs,
+#                    so they fit under the 512 KB network limit. Needs the JSON to be loaded, which
+#                    the game does automatically when it sits next to the PNG (same name, .json).
+#
+# e.g. python make_spritesheet.py --mode maxrects --scale 0.66 --out assets/me.png --json assets/me.json frames/*.png
 import math, json, argparse, os
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
 
 def pack(images, cols=None, pad=0, scale=1.0):
@@ -29,25 +41,149 @@ def pack(images, cols=None, pad=0, scale=1.0):
 
     return sheet, rects, (fw, fh), (cols, rows)
 
+# ---------------- MaxRects packing ----------------
+
+def load_frame(job):
+    """Load, scale and trim one frame. Runs in a worker process, so it only takes/returns picklable things."""
+    index, path, scale, trim = job
+    im = Image.open(path).convert("RGBA")
+    if scale != 1.0:
+        im = im.resize((int(im.width*scale), int(im.height*scale)), Image.BICUBIC)
+    source_w, source_h = im.size
+    box = (0, 0, source_w, source_h)
+    if trim:
+        box = im.getchannel("A").getbbox() or (0, 0, 1, 1)   # fully transparent frame: keep one pixel
+        im = im.crop(box)
+    return index, im, box[0], box[1], source_w, source_h
+
+def load_frames(paths, scale=1.0, trim=True, workers=None):
+    """[(index, image, trim_x, trim_y, source_w, source_h)] in the same order as paths."""
+    jobs = [(i, p, scale, trim) for i, p in enumerate(paths)]
+    if workers == 1 or len(jobs) < 2:
+        return [load_frame(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(load_frame, jobs, chunksize=max(1, len(jobs) // 32)))
+
+class MaxRects:
+    """
+    One bin of the MaxRects packer. Keeps a list of every empty rectangle (they can overlap) and puts
+    each new piece in the empty rectangle it fits most snugly (best short side fit).
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.free = [(0, 0, width, height)]
+
+    def insert(self, w, h):
+        best = None
+        best_fit = None
+        for fx, fy, fw, fh in self.free:
+            if w <= fw and h <= fh:
+                left_w, left_h = fw - w, fh - h
+                fit = (min(left_w, left_h), max(left_w, left_h))
+                if best_fit is None or fit < best_fit:
+                    best, best_fit = (fx, fy), fit
+        if best is None:
+            return None
+        self._split((best[0], best[1], w, h))
+        return best
+
+    def _split(self, used):
+        ux, uy, uw, uh = used
+        new_free = []
+        for free in self.free:
+            fx, fy, fw, fh = free
+            if ux >= fx + fw or ux + uw <= fx or uy >= fy + fh or uy + uh <= fy:
+                new_free.append(free)   # doesn't touch the new piece
+                continue
+            # keep the parts of this empty rectangle on each side of the new piece
+            if ux > fx:
+                new_free.append((fx, fy, ux - fx, fh))
+            if ux + uw < fx + fw:
+                new_free.append((ux + uw, fy, fx + fw - ux - uw, fh))
+            if uy > fy:
+                new_free.append((fx, fy, fw, uy - fy))
+            if uy + uh < fy + fh:
+                new_free.append((fx, uy + uh, fw, fy + fh - uy - uh))
+        # drop empty rectangles that sit completely inside another one
+        self.free = [a for i, a in enumerate(new_free)
+                     if not any(j != i and _contains(b, a) and (b != a or j < i) for j, b in enumerate(new_free))]
+
+def _contains(outer, inner):
+    return (inner[0] >= outer[0] and inner[1] >= outer[1] and
+            inner[0] + inner[2] <= outer[0] + outer[2] and inner[1] + inner[3] <= outer[1] + outer[3])
+
+def _place_all(sizes, width, pad):
+    """Pack (w, h) sizes into a bin width pixels wide. Returns ([(x, y)], used_w, used_h) or None."""
+    height = sum(h + pad for _, h in sizes)   # tall enough for anything
+    packer = MaxRects(width + pad, height)
+    order = sorted(range(len(sizes)), key=lambda i: (max(sizes[i]), sizes[i][0] * sizes[i][1]), reverse=True)
+    spots = [None] * len(sizes)
+    for i in order:
+        w, h = sizes[i]
+        spot = packer.insert(w + pad, h + pad)
+        if spot is None:
+            return None
+        spots[i] = spot
+    used_w = max(x + w for (x, _), (w, _) in zip(spots, sizes))
+    used_h = max(y + h for (_, y), (_, h) in zip(spots, sizes))
+    return spots, used_w, used_h
+
+def pack_maxrects(images, pad=0, scale=1.0, trim=True, workers=None):
+    """Trim and bin-pack frames. Returns (sheet, rects) where each rect also records how it was trimmed."""
+    frames = load_frames(images, scale, trim, workers)
+    sizes = [im.size for _, im, _, _, _, _ in frames]
+    widest = max(w for w, _ in sizes)
+    area = sum((w + pad) * (h + pad) for w, h in sizes)
+    # try a range of sheet widths and keep whichever wastes the least space
+    side = math.sqrt(area)
+    widths = {widest} | {max(widest, int(side * f)) for f in (0.7, 0.8, 0.9, 1.0, 1.1, 1.25, 1.5, 2.0)}
+    best = None
+    for width in sorted(widths):
+        placed = _place_all(sizes, width, pad)
+        if placed is None:
+            continue
+        spots, used_w, used_h = placed
+        score = (used_w * used_h, abs(used_w - used_h))
+        if best is None or score < best[0]:
+            best = (score, spots, used_w, used_h)
+    _, spots, sheet_w, sheet_h = best
+
+    sheet = Image.new("RGBA", (sheet_w, sheet_h), (0,0,0,0))
+    rects = []
+    for (index, im, trim_x, trim_y, source_w, source_h), (x, y) in zip(frames, spots):
+        sheet.paste(im, (x, y))
+        rects.append({"x": x, "y": y, "w": im.width, "h": im.height, "index": index,
+                      "trim_x": trim_x, "trim_y": trim_y, "source_w": source_w, "source_h": source_h})
+    return sheet, rects
+
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("--out", required=True, help="output PNG path")
     ap.add_argument("--json", required=True, help="output JSON path")
-    ap.add_argument("--cols", type=int, default=0, help="columns (0 = auto)")
+    ap.add_argument("--mode", choices=("grid", "maxrects"), default="grid", help="grid cells or tight MaxRects packing")
+    ap.add_argument("--cols", type=int, default=0, help="columns (0 = auto, grid mode only)")
     ap.add_argument("--pad", type=int, default=0, help="padding between frames")
     ap.add_argument("--scale", type=float, default=1.0, help="scale frames before packing (e.g., 0.66)")
+    ap.add_argument("--no-trim", action="store_true", help="maxrects mode: keep transparent borders")
+    ap.add_argument("--workers", type=int, default=None, help="processes used to load frames (default: one per CPU)")
     ap.add_argument("frames", nargs="+", help="input frame images in order")
     args = ap.parse_args()
 
-    os.makedirs(os.path.dirname(args.out), exist_ok=True)
-    os.makedirs(os.path.dirname(args.json), exist_ok=True)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    os.makedirs(os.path.dirname(args.json) or ".", exist_ok=True)
 
-    sheet, rects, cell, grid = pack(args.frames, cols=(args.cols or None), pad=args.pad, scale=args.scale)
-    sheet.save(args.out)
-    meta = {"frames": rects, "cell": {"w": cell[0], "h": cell[1]}, "grid": {"cols": grid[0], "rows": grid[1]}}
+    if args.mode == "maxrects":
+        sheet, rects = pack_maxrects(args.frames, pad=args.pad, scale=args.scale, trim=not args.no_trim, workers=args.workers)
+        cell = (max(r["source_w"] for r in rects), max(r["source_h"] for r in rects))
+        meta = {"packing": "maxrects", "frames": rects, "cell": {"w": cell[0], "h": cell[1]}}
+    else:
+        sheet, rects, cell, grid = pack(args.frames, cols=(args.cols or None), pad=args.pad, scale=args.scale)
+        meta = {"frames": rects, "cell": {"w": cell[0], "h": cell[1]}, "grid": {"cols": grid[0], "rows": grid[1]}}
+    sheet.save(args.out, optimize=True)
     with open(args.json, "w") as f:
         json.dump(meta, f)
-    print(f"Wrote {args.out} and {args.json}")
+    print(f"Wrote {args.out} ({sheet.width}x{sheet.height}, {os.path.getsize(args.out) / 1024:.1f} KB) and {args.json}")
 
     print("Wrote:", os.path.abspath(args.out))
-    print("Wrote:", os.path.abspath(args.json))
\ No newline at end of file
+    print("Wrote:", os.path.abspath(args.json))
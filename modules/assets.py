@@ -0,0 +1,182 @@
+# assets.py
+# One place to load images. Every image is decoded once per (path, scale, mode) and the same Surface is
+# handed to everyone who asks, so twenty crates made from crate.png cost one decode and one Surface.
+# Sprite sheets are sliced once as well. The surfaces are SHARED - copy() one before drawing onto it.
+#
+# A preload manifest (assets/manifest.json, see ASSET_MANIFEST in settings.py) lists what to load at
+# start-up so it doesn't happen in the middle of the game:
+# {"images": [{"path": "assets/crate.png", "scale": 0.15},
+#             {"path": "assets/starfield720.png", "mode": "opaque"}],
+#  "sheets": [{"path": "assets/player_sheet.png", "cols": 9, "count": 9, "pad": 1}],
+#  "atlases": [{"path": "assets/my_character.png"}]}      (sheets packed with make_spritesheet.py --mode maxrects)
+#
+# mode is "alpha" (convert_alpha, the default), "opaque" (convert, faster to draw when there's no
+# transparency) or "raw" (as loaded, works before the window exists).
+#
+# decode() only reads and decodes a file, so it can run on a loading thread (see startup.py). The
+# decoded image waits in self.decoded until image() converts it on the main thread.
+import json, math, os
+import pygame
+from modules.assets_net import atlas_from_json, frames_from_atlas, packed_atlas
+
+class AssetManager:
+    def __init__(self):
+        self.images = {}     # (path, scale, mode) -> Surface
+        self.sheets = {}     # (path, scale, how it was cut) -> [frames]
+        self.derived = {}    # any other key -> value made by derive(), e.g. recoloured frames
+        self.decoded = {}    # path -> Surface read by decode() but not converted yet
+        self.loads = 0       # how many times we actually decoded a file
+
+    def image(self, path, scale=1.0, mode="alpha"):
+        key = (os.path.normpath(path), float(scale), mode)
+        img = self.images.get(key)
+        if img is None:
+            if scale != 1.0:
+                base = self.image(path, 1.0, mode)
+                img = pygame.transform.scale(base, (int(base.get_width() * scale), int(base.get_height() * scale)))
+            else:
+                img = self.decoded.pop(key[0], None)
+                if img is None:
+                    img = pygame.image.load(path)
+                    self.loads += 1
+                if mode == "alpha":
+                    img = img.convert_alpha()
+                elif mode == "opaque":
+                    img = img.convert()
+            self.images[key] = img
+        return img
+
+    def frames(self, path, cols, count, pad=0, frame_w=None, frame_h=None, scale=1.0, origin=(0, 0)):
+        """A uniform grid sheet cut into frames (see load_frames_grid). Returns a new list of shared frames."""
+        key = (os.path.normpath(path), float(scale), cols, count, pad, frame_w, frame_h, tuple(origin))
+        frames = self.sheets.get(key)
+        if frames is None:
+            sheet = self.image(path)
+            sw, sh = sheet.get_size()
+            rows = math.ceil(count / cols)
+            # Derive sizes unless overridden
+            fw = frame_w if frame_w is not None else (sw - origin[0] - (cols - 1) * pad) // cols
+            fh = frame_h if frame_h is not None else (sh - origin[1] - (rows - 1) * pad) // rows
+            frames = []
+            y = origin[1]
+            for r in range(rows):
+                x = origin[0]
+                for c in range(cols):
+                    if len(frames) >= count:
+                        break
+                    frame = sheet.subsurface(pygame.Rect(x, y, fw, fh)).copy()
+                    if scale != 1.0:
+                        frame = pygame.transform.scale(frame, (int(fw * scale), int(fh * scale)))
+                    frames.append(frame)
+                    x += fw + pad
+                y += fh + pad
+            self.sheets[key] = frames
+        return list(frames)
+
+    def atlas_frames(self, path, json_path=None, scale=1.0):
+        """
+        Frames from a sheet made by make_spritesheet.py, using its JSON (default: same name, .json).
+        Trimmed frames are put back at their original size so they line up. Returns a new list of shared frames.
+        """
+        json_path = json_path or atlas_json_path(path)
+        key = (os.path.normpath(path), float(scale), "atlas", os.path.normpath(json_path))
+        frames = self.sheets.get(key)
+        if frames is None:
+            with open(json_path) as f:
+                atlas = atlas_from_json(json.load(f))
+            frames = frames_from_atlas(self.image(path), atlas, scale)
+            self.sheets[key] = frames
+        return list(frames)
+
+    def decode(self, path):
+        """Read and decode an image file without converting it. Safe to call from a worker thread."""
+        path = os.path.normpath(path)
+        if path not in self.decoded and not any(k[0] == path for k in self.images):
+            self.decoded[path] = pygame.image.load(path)
+            self.loads += 1
+
+    def derive(self, key, make):
+        """Cache anything built from other assets: derive(("player", colour), lambda: recolour(...))."""
+        value = self.derived.get(key)
+        if value is None:
+            value = make()
+            self.derived[key] = value
+        return value
+
+    def forget(self, path):
+        """Drop every cached copy of a file (e.g. when a room is unloaded). Sprites using it keep theirs."""
+        path = os.path.normpath(path)
+        for key in [k for k in self.images if k[0] == path]:
+            del self.images[key]
+        for key in [k for k in self.sheets if k[0] == path]:
+            del self.sheets[key]
+        self.decoded.pop(path, None)
+
+    def clear(self):
+        self.images.clear()
+        self.sheets.clear()
+        self.derived.clear()
+        self.decoded.clear()
+
+    # ----- preloading -----
+    def preload(self, manifest):
+        """Load everything listed in a manifest dict (format at the top of this file)."""
+        for item in manifest.get("images", []):
+            self.image(item["path"], item.get("scale", 1.0), item.get("mode", "alpha"))
+        for item in manifest.get("sheets", []):
+            self.frames(item["path"], item["cols"], item["count"], item.get("pad", 0), item.get("frame_w"),
+                        item.get("frame_h"), item.get("scale", 1.0))
+        for item in manifest.get("atlases", []):
+            self.atlas_frames(item["path"], item.get("json"), item.get("scale", 1.0))
+
+    def preload_file(self, path):
+        """preload() from a JSON manifest file. Missing files are skipped so a manifest is optional."""
+        self.preload(read_manifest(path))
+
+    # ----- memory reporting -----
+    def memory_report(self):
+        """[(description, bytes)] for every cached asset, biggest first."""
+        rows = []
+        for (path, scale, mode), img in self.images.items():
+            rows.append((f"{path} x{scale:g} {mode} {img.get_width()}x{img.get_height()}", _surface_bytes(img)))
+        for key, frames in self.sheets.items():
+            rows.append((f"{key[0]} {len(frames)} frames x{key[1]:g}", sum(_surface_bytes(f) for f in frames)))
+        for key, value in self.derived.items():
+            surfaces = value if isinstance(value, (list, tuple)) else [value]
+            size = sum(_surface_bytes(s) for s in surfaces if isinstance(s, pygame.Surface))
+            rows.append((f"derived {key!r}", size))
+        rows.sort(key=lambda row: row[1], reverse=True)
+        return rows
+
+    def total_bytes(self):
+        return sum(size for _, size in self.memory_report())
+
+    def print_report(self):
+        for name, size in self.memory_report():
+            print(f"{size / 1024:10.1f} KB  {name}")
+        print(f"{self.total_bytes() / (1024 * 1024):10.1f} MB  total, {self.loads} files decoded")
+
+
+def read_manifest(path):
+    """A preload manifest with any missing files left out ({} if there's no manifest at all)."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        manifest = json.load(f)
+    for section in ("images", "sheets", "atlases"):
+        manifest[section] = [item for item in manifest.get(section, []) if os.path.exists(item["path"])]
+    return manifest
+
+def manifest_paths(manifest):
+    """Every image file a manifest uses, once each (for decode())."""
+    paths = [item["path"] for section in ("images", "sheets", "atlases") for item in manifest.get(section, [])]
+    return list(dict.fromkeys(os.path.normpath(p) for p in paths))
+
+def atlas_json_path(sheet_path):
+    """Where make_spritesheet.py puts the JSON for a sheet."""
+    return os.path.splitext(sheet_path)[0] + ".json"
+
+def _surface_bytes(surface):
+    return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+ASSETS = AssetManager()   # shared by the whole game
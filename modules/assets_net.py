@@ -1,7 +1,7 @@
 # assets_net.py
 import base64, hashlib, io, pygame, math
-
-MAX_SHEET_BYTES = 512 * 1024  # 512 KB safety cap
+from modules.config import MAX_SHEET_BYTES
+from modules.atlas import MAX_ATLAS_FRAMES, atlas_from_json, clean_atlas, packed_atlas
 
 def sha256_hex(b: bytes) -> str:
     return hashlib.sha256(b).hexdigest()
@@ -33,3 +33,24 @@ def frames_from_surface(sheet: pygame.Surface, *, cols: int, count: int, pad: in
             x = c * (fw + pad); y = r * (fh + pad)
             frames.append(sheet.subsurface(pygame.Rect(x, y, fw, fh)).copy())
     return frames
+
+def frames_from_atlas(sheet: pygame.Surface, atlas, scale: float = 1.0):
+    sw, sh = sheet.get_size()
+    frames = []
+    for x, y, w, h, trim_x, trim_y, source_w, source_h in atlas:
+        frame = pygame.Surface((max(1, source_w), max(1, source_h)), pygame.SRCALPHA)
+        piece = pygame.Rect(x, y, w, h).clip(pygame.Rect(0, 0, sw, sh))   # never read outside the sheet
+        frame.blit(sheet, (trim_x, trim_y), piece)
+        if scale != 1.0:
+            frame = pygame.transform.smoothscale(frame, (max(1, int(source_w * scale)), max(1, int(source_h * scale))))
+        frames.append(frame)
+    return frames
+
+def frames_from_meta(sheet: pygame.Surface, meta):
+    """Cut a sheet that came over the network into frames, using its atlas if it has one."""
+    scale = float(meta.get("scale", 1.0))
+    atlas = clean_atlas(meta.get("atlas"), sheet.get_size(), scale)   # checked against the sheet we really got
+    if atlas is not None:
+        return frames_from_atlas(sheet, atlas, scale)
+    return frames_from_surface(sheet, cols=int(meta.get("cols", 9)), count=int(meta.get("count", 1)),
+                               pad=int(meta.get("pad", 0)), scale=float(meta.get("scale", 1.0)))
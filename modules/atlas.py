@@ -0,0 +1,59 @@
+# atlas.py
+# Frame positions (atlases) for packed sprite sheets: read, and checked when they come over the
+# network. assets_net.py cuts the frames out.
+import json, os
+from modules.config import MAX_SHEET_SIDE, MAX_ATLAS_PIXELS
+
+# Sheets packed with make_spritesheet.py --mode maxrects have their frames trimmed and moved around,
+# so the frame positions come with the sheet as an "atlas": one [x, y, w, h, trim_x, trim_y, source_w,
+# source_h] list per frame. Each frame is put back at its original size so animations still line up.
+MAX_ATLAS_FRAMES = 256
+
+def atlas_from_json(meta):
+    """The atlas list from a make_spritesheet JSON dict, in frame order."""
+    frames = sorted(meta.get("frames", []), key=lambda f: f.get("index", 0))
+    return [[f["x"], f["y"], f["w"], f["h"], f.get("trim_x", 0), f.get("trim_y", 0),
+             f.get("source_w", f["w"]), f.get("source_h", f["h"])] for f in frames]
+
+def clean_atlas(atlas, sheet_size=None, scale=1.0):
+    """
+    Checks an atlas that came over the network. Returns it as ints, or None if it looks wrong.
+    sheet_size: (width, height) of the sheet once it is known - every frame has to be inside it.
+    Every client that shows the sheet makes a source_w x source_h image per frame (times scale), so
+    together they mustn't come to more than MAX_ATLAS_PIXELS.
+    """
+    if not isinstance(atlas, list) or not 0 < len(atlas) <= MAX_ATLAS_FRAMES:
+        return None
+    sheet_w, sheet_h = sheet_size or (MAX_SHEET_SIDE, MAX_SHEET_SIDE)
+    pixels = 0
+    cleaned = []
+    for entry in atlas:
+        if not isinstance(entry, (list, tuple)) or len(entry) != 8:
+            return None
+        try:
+            values = [int(v) for v in entry]
+        except (TypeError, ValueError, OverflowError):
+            return None
+        x, y, w, h, trim_x, trim_y, source_w, source_h = values
+        if min(values) < 0 or x + w > sheet_w or y + h > sheet_h:
+            return None   # outside the sheet
+        if not (0 < source_w <= MAX_SHEET_SIDE and 0 < source_h <= MAX_SHEET_SIDE):
+            return None
+        if trim_x + w > source_w or trim_y + h > source_h:
+            return None   # the piece doesn't fit in its frame
+        pixels += source_w * source_h
+        cleaned.append(values)
+    if pixels * max(1.0, scale) ** 2 > MAX_ATLAS_PIXELS:
+        return None
+    return cleaned
+
+def packed_atlas(sheet_path):
+    """The atlas for a sheet packed with make_spritesheet.py --mode maxrects, or None for grid sheets."""
+    json_path = os.path.splitext(sheet_path)[0] + ".json"
+    if not os.path.exists(json_path):
+        return None
+    with open(json_path) as f:
+        meta = json.load(f)
+    if meta.get("packing") != "maxrects":
+        return None
+    return atlas_from_json(meta)
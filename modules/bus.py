@@ -0,0 +1,136 @@
+# bus.py
+# A message bus between the server's worker processes (python -m modules.server --workers N), so no
+# Redis or other service has to be installed. The parent process runs a BusHub on a Unix socket; each
+# worker connects a BusClient to it. A message is a dict sent as one line of JSON, and the hub passes
+# every line on to all the other workers. Lines from one worker arrive in the order it sent them.
+#
+# Two kinds of message share the bus:
+#   - Socket.IO's own ("method": "emit", "disconnect", ...) - BusManager plugs the bus into
+#     python-socketio as a client manager, so sio.emit() reaches the clients of every worker
+#   - the game's ("method": "players", "sheet", ...) - passed to the server's own handler
+# When a worker goes away the hub tells the others ("method": "host_gone") so they can drop its players.
+# Uses Unix sockets, so --workers doesn't work on Windows.
+import asyncio, json, os
+from socketio.async_pubsub_manager import AsyncPubSubManager
+
+LINE_LIMIT = 16 * 1024 * 1024   # longest message (a sheet upload passed on to the other workers is ~700 KB)
+
+class BusHub:
+    def __init__(self, path):
+        self.path = path
+        self.writers = {}     # writer -> host_id the worker said hello with ("" until it has)
+        self.server = None
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)   # left behind by a server that was killed
+        self.server = await asyncio.start_unix_server(self._serve, path=self.path, limit=LINE_LIMIT)
+
+    async def _serve(self, reader, writer):
+        self.writers[writer] = ""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.startswith(b'{"method":"hello"'):
+                    self.writers[writer] = json.loads(line).get("host_id", "")
+                    continue
+                await self._send_to_others(writer, line)
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            host_id = self.writers.pop(writer, "")
+            writer.close()
+            if host_id:
+                gone = json.dumps({"method": "host_gone", "host_id": host_id}).encode() + b"\n"
+                await self._send_to_others(None, gone)
+
+    async def _send_to_others(self, sender, line):
+        for writer in list(self.writers):
+            if writer is not sender:
+                try:
+                    writer.write(line)
+                    await writer.drain()
+                except ConnectionError:
+                    pass   # that worker is going; _serve tidies up when its reader ends
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class BusClient:
+    """One worker's connection to the hub."""
+    def __init__(self, path, host_id):
+        self.path = path
+        self.host_id = host_id
+        self.reader = None
+        self.writer = None
+
+    async def connect(self, tries=50):
+        for _ in range(tries):   # the hub may still be starting
+            try:
+                self.reader, self.writer = await asyncio.open_unix_connection(self.path, limit=LINE_LIMIT)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                await asyncio.sleep(0.1)
+        else:
+            raise ConnectionError(f"no message bus at {self.path}")
+        await self.publish({"method": "hello", "host_id": self.host_id})
+
+    async def publish(self, message):
+        self.writer.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+        await self.writer.drain()
+
+    async def messages(self):
+        """Every message from the other workers, until the hub closes (the parent process has stopped)."""
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                return
+            yield json.loads(line)
+
+
+class BusManager(AsyncPubSubManager):
+    """
+    python-socketio client manager that uses the bus, like its Redis manager uses Redis.
+    Game messages (anything with a method Socket.IO doesn't know) go to on_game_message(message).
+    """
+    name = "bus"
+    SOCKETIO_METHODS = {"emit", "callback", "disconnect", "enter_room", "leave_room", "close_room"}
+
+    def __init__(self, bus, on_game_message):
+        super().__init__(channel="socketio")
+        self.bus = bus
+        self.host_id = bus.host_id
+        self.on_game_message = on_game_message
+
+    async def emit(self, event, data, namespace=None, room=None, skip_sid=None, callback=None, to=None, **kwargs):
+        # a message for one of our own clients (e.g. "sheet_bytes") doesn't need to go past the other workers
+        target = to or room
+        if target is not None and callback is None and self.is_connected(target, namespace or "/"):
+            kwargs["ignore_queue"] = True
+        return await super().emit(event, data, namespace=namespace, room=room, skip_sid=skip_sid,
+                                  callback=callback, to=to, **kwargs)
+
+    async def _publish(self, data):
+        await self.bus.publish(data)
+
+    def start(self):
+        """Start listening now rather than when the first client connects (python-socketio's default),
+        so game messages from the other workers are handled straight away."""
+        self.server.manager_initialized = True
+        self.initialize()
+
+    async def _listen(self):
+        async for message in self.bus.messages():
+            if message.get("method") in self.SOCKETIO_METHODS:
+                yield message
+            else:
+                await self.on_game_message(message)
+        await self.on_game_message({"method": "bus_closed"})
+        await asyncio.Event().wait()   # the worker is stopping; returning would make python-socketio log an error
@@ -0,0 +1,122 @@
+# chat.py
+# Chat log shown in the bottom-left corner of the screen.
+# Messages are kept in a fixed size ring buffer (a deque with a maxlen) so a spam burst
+# can't use up memory, and all visible lines are drawn onto one panel surface that is only
+# redrawn when a message arrives or the player scrolls. Each frame is then a single blit.
+import pygame
+from collections import deque
+from modules.settings import CHAT_CAPACITY, CHAT_VISIBLE_LINES, CHAT_WIDTH
+
+class ChatLog():
+    def __init__(self, font, x, bottom, width=CHAT_WIDTH, visible_lines=CHAT_VISIBLE_LINES, capacity=CHAT_CAPACITY,
+                 colour=(0, 0, 0), background=(255, 255, 255)):
+        self.font = font
+        self.x = x
+        self.bottom = bottom            # y coordinate of the bottom edge of the panel
+        self.width = width
+        self.visible_lines = visible_lines
+        self.colour = colour
+        self.background = background
+        self.line_height = font.get_linesize()
+
+        # (text, [wrapped lines]) for each message, oldest messages drop off the front
+        self.messages = deque(maxlen=capacity)
+        # new messages from the network thread. deque.append/popleft are thread safe so the
+        # network thread never touches pygame, it just queues the text here
+        self.incoming = deque(maxlen=capacity)
+
+        self.scroll = 0                 # how many lines we have scrolled back (0 = newest)
+        self.panel = None               # pre-composited surface with the visible lines
+        self._dirty = False
+
+    # ----- adding messages -----
+    def add(self, text):
+        """Queue a message. Safe to call from the network thread."""
+        self.incoming.append(str(text))
+
+    def _drain_incoming(self):
+        added = False
+        while self.incoming:
+            text = self.incoming.popleft()
+            self.messages.append((text, self.wrap(text)))
+            added = True
+        if added:
+            self.scroll = 0             # jump back to the newest message
+            self._dirty = True
+
+    def wrap(self, text):
+        """Split text into lines that fit in the panel width."""
+        lines = []
+        for paragraph in text.splitlines() or [""]:
+            line = ""
+            for word in paragraph.split(" "):
+                candidate = word if line == "" else line + " " + word
+                if self.font.size(candidate)[0] <= self.width:
+                    line = candidate
+                    continue
+                if line:
+                    lines.append(line)
+                # a single word wider than the panel gets broken up character by character
+                while self.font.size(word)[0] > self.width and len(word) > 1:
+                    cut = len(word) - 1
+                    while cut > 1 and self.font.size(word[:cut])[0] > self.width:
+                        cut -= 1
+                    lines.append(word[:cut])
+                    word = word[cut:]
+                line = word
+            lines.append(line)
+        return lines
+
+    def line_count(self):
+        return sum(len(lines) for _, lines in self.messages)
+
+    # ----- scrollback -----
+    def scroll_by(self, lines):
+        max_scroll = max(0, self.line_count() - self.visible_lines)
+        new_scroll = max(0, min(max_scroll, self.scroll + lines))
+        if new_scroll != self.scroll:
+            self.scroll = new_scroll
+            self._dirty = True
+
+    def handle_event(self, event):
+        if event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_PAGEUP:
+                self.scroll_by(self.visible_lines // 2)
+            elif event.key == pygame.K_PAGEDOWN:
+                self.scroll_by(-(self.visible_lines // 2))
+        elif event.type == pygame.MOUSEWHEEL:
+            mx, my = pygame.mouse.get_pos()
+            if self.panel is not None and self.panel.get_rect(bottomleft=(self.x, self.bottom)).collidepoint(mx, my):
+                self.scroll_by(event.y)
+
+    # ----- drawing -----
+    def _visible(self):
+        # walk backwards from the newest message until we have enough lines
+        wanted = self.visible_lines + self.scroll
+        lines = []
+        for _, msg_lines in reversed(self.messages):
+            lines[:0] = msg_lines
+            if len(lines) >= wanted:
+                break
+        end = len(lines) - self.scroll
+        return lines[max(0, end - self.visible_lines):end]
+
+    def _redraw_panel(self):
+        lines = self._visible()
+        if not lines:
+            self.panel = None
+            return
+        width = max(self.font.size(line)[0] for line in lines)
+        self.panel = pygame.Surface((width, self.line_height * len(lines)), pygame.SRCALPHA)
+        y = 0
+        for line in lines:
+            self.panel.blit(self.font.render(line, True, self.colour, self.background), (0, y))
+            y += self.line_height
+
+    def draw(self, screen):
+        self._drain_incoming()
+        if self._dirty:
+            self._redraw_panel()
+            self._dirty = False
+        if self.panel is not None:
+            screen.blit(self.panel, (self.x, self.bottom - self.panel.get_height()))
@@ -0,0 +1,62 @@
+# clock_sync.py
+# Works out the round trip time (RTT) to the server, how much it varies (jitter) and the difference
+# between our clock and the server's (offset), from "clock_ping" / "clock_pong" messages:
+#
+#   client sends  clock_ping {"seq", "t0": our time}
+#   server sends  clock_pong {"seq", "t0", "server": server time}       we get it back at t3
+#
+#   rtt    = t3 - t0                       (the server answers straight away)
+#   offset = server - (t0 + t3) / 2        (assumes the trip there takes as long as the trip back)
+#
+# One sample is noisy - a ping that waited behind a big world message has a long RTT and a wrong
+# offset - so the estimates are filtered:
+#   - rtt and jitter are smoothed the way TCP does it (RFC 6298: srtt += (rtt - srtt) / 8,
+#     rttvar += (|rtt - srtt| - rttvar) / 4)
+#   - offset comes from the sample with the lowest RTT out of the last `window` (like NTP): the
+#     fastest round trip is the one that spent least time queued, so its offset is the most accurate
+import time
+from collections import deque
+
+class ClockSync:
+    def __init__(self, window=16):
+        self.samples = deque(maxlen=window)   # (rtt, offset) of the latest pongs
+        self.rtt = None           # smoothed round trip time, seconds
+        self.jitter = None        # smoothed variation of the RTT, seconds
+        self.min_rtt = None       # lowest RTT in the window
+        self.offset = 0.0         # server time - our time, seconds
+        self.count = 0            # pongs received
+
+    def add_sample(self, t0, server_time, t3):
+        """A pong came back at t3 for a ping sent at t0 (both our clock). Returns the sample's RTT."""
+        rtt = max(0.0, t3 - t0)
+        self.samples.append((rtt, server_time - (t0 + t3) / 2))
+        self.count += 1
+        if self.rtt is None:
+            self.rtt = rtt
+            self.jitter = rtt / 2
+        else:
+            self.jitter += (abs(rtt - self.rtt) - self.jitter) / 4
+            self.rtt += (rtt - self.rtt) / 8
+        self.min_rtt, self.offset = min(self.samples)
+        return rtt
+
+    @property
+    def synced(self):
+        return self.count > 0
+
+    def server_time(self, now=None):
+        """Our clock (time.perf_counter()) converted to the server's clock."""
+        return (time.perf_counter() if now is None else now) + self.offset
+
+    def report(self):
+        """The estimates in milliseconds, for the server's /net page and the F3 overlay."""
+        if not self.synced:
+            return {"samples": 0}
+        return {"rtt_ms": round(self.rtt * 1000, 2), "jitter_ms": round(self.jitter * 1000, 2),
+                "min_rtt_ms": round(self.min_rtt * 1000, 2), "offset_ms": round(self.offset * 1000, 2),
+                "samples": self.count}
+
+    def describe(self):
+        if not self.synced:
+            return "ping: waiting for the server"
+        return f"ping: {self.rtt * 1000:.0f} ms (jitter {self.jitter * 1000:.1f} ms)"
@@ -0,0 +1,252 @@
+# collision.py
+# Collision layer for a room: the hitbox polygons are rasterised once into a grid of blocked cells.
+# After that, "is this point inside a wall?" is one lookup and "does this rect touch anything?" is
+# four lookups in a summed-area table, however many points the hitboxes have.
+# The same grid can be used for NPC pathfinding (blocked_cell / grid_size).
+# The polygon edge tests (line_intersection etc.) are here as well, with an optional NumPy kernel for
+# testing lots of rects at once. NumPy isn't required - without it the plain Python versions are used.
+import math
+from array import array
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_CELL = 4   # pixels per collision cell. Smaller = more accurate but more memory
+
+# functions to check for collisions between a rect and a polygon
+def line_intersection(a, b, c, d):
+    # check for division by zero
+    if ((a[0] - b[0]) * (c[1] - d[1]) - (a[1] - b[1]) * (c[0] - d[0])) == 0:
+        return False
+    t = ((a[0] - c[0]) * (c[1] - d[1]) - (a[1] - c[1]) * (c[0] - d[0])) / ((a[0] - b[0]) * (c[1] - d[1]) - (a[1] - b[1]) * (c[0] - d[0]))
+    u = ((a[0] - c[0]) * (a[1] - b[1]) - (a[1] - c[1]) * (a[0] - b[0])) / ((a[0] - b[0]) * (c[1] - d[1]) - (a[1] - b[1]) * (c[0] - d[0]))
+    # check if line actually intersect
+    if (0 <= t and t <= 1 and 0 <= u and u <= 1):
+        return True
+    else: 
+        return False
+
+def colideRectLine(rect, p1, p2):
+    return (line_intersection(p1, p2, rect.topleft, rect.bottomleft) or
+            line_intersection(p1, p2, rect.bottomleft, rect.bottomright) or
+            line_intersection(p1, p2, rect.bottomright, rect.topright) or
+            line_intersection(p1, p2, rect.topright, rect.topleft))
+
+def collideRectPolygon(rect, polygon):
+    for i in range(len(polygon)-1):
+        if colideRectLine(rect, polygon[i], polygon[i+1]):
+            return True
+    return False
+
+class PolygonCollider:
+    """
+    Hitbox polygons compiled once into flat segment lists with bounding boxes, so a collision test
+    doesn't have to rebuild every polygon each frame. Points are in the polygon's own (local) space;
+    hit_test takes a rect already moved into that space. Gives the same answers as collideRectPolygon.
+    """
+    def __init__(self, polygons):
+        self._arrays = None  # NumPy copies of the segments, made the first time hit_test_many is used
+        self.polygons = []   # [(bbox, [segment, ...]), ...] where bbox = (min_x, min_y, max_x, max_y)
+        for polygon in polygons:
+            segments = []
+            for i in range(len(polygon) - 1):
+                (x1, y1), (x2, y2) = polygon[i], polygon[i + 1]
+                # (x1, y1, x2, y2, min_x, min_y, max_x, max_y)
+                segments.append((x1, y1, x2, y2, min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)))
+            if segments:
+                bbox = (min(sg[4] for sg in segments), min(sg[5] for sg in segments),
+                        max(sg[6] for sg in segments), max(sg[7] for sg in segments))
+                self.polygons.append((bbox, segments))
+
+    def hit_test(self, x, y, w, h):
+        """True if the rect (x, y, w, h) crosses or touches any polygon edge."""
+        right = x + w
+        bottom = y + h
+        # the four rect edges in the same order colideRectLine checks them
+        edges = ((x, y, x, bottom), (x, bottom, right, bottom), (right, bottom, right, y), (right, y, x, y))
+        for bbox, segments in self.polygons:
+            if bbox[2] < x or bbox[0] > right or bbox[3] < y or bbox[1] > bottom:
+                continue   # the whole polygon is nowhere near the rect
+            for x1, y1, x2, y2, sx0, sy0, sx1, sy1 in segments:
+                if sx1 < x or sx0 > right or sy1 < y or sy0 > bottom:
+                    continue
+                for cx, cy, dx, dy in edges:
+                    # same maths as line_intersection, but the denominator is only worked out once
+                    den = (x1 - x2) * (cy - dy) - (y1 - y2) * (cx - dx)
+                    if den == 0:
+                        continue
+                    t = ((x1 - cx) * (cy - dy) - (y1 - cy) * (cx - dx)) / den
+                    if t < 0 or t > 1:
+                        continue
+                    u = ((x1 - cx) * (y1 - y2) - (y1 - cy) * (x1 - x2)) / den
+                    if 0 <= u <= 1:
+                        return True
+        return False
+
+    def hit_test_many(self, rects):
+        """
+        hit_test for a whole list of (x, y, w, h) rects, e.g. every player on the server.
+        Uses the NumPy kernel when NumPy is installed, otherwise loops over hit_test.
+        """
+        rects = list(rects)
+        if np is None or not rects or not self.polygons:
+            return [self.hit_test(*r) for r in rects]
+        if self._arrays is None:
+            self._arrays = _segment_arrays(self.polygons)
+        return _hit_test_many_numpy(self._arrays, rects)
+
+# ----- NumPy collision kernel -----
+# Tests the four edges of every rect against every segment in one go. Uses exactly the same sums as
+# line_intersection (in float64, which is exact for pixel coordinates) so the answers always match.
+
+def _segment_arrays(polygons):
+    segments = [sg for _, segs in polygons for sg in segs]
+    # one row per segment: x1, y1, x2, y2, min_x, min_y, max_x, max_y
+    a = np.array(segments, dtype=np.float64)
+    return tuple(a[:, i] for i in range(8))
+
+def _hit_test_many_numpy(arrays, rects, batch=256):
+    # work through the rects in batches so hundreds of rects don't need huge temporary arrays
+    results = []
+    for i in range(0, len(rects), batch):
+        results.extend(_hit_test_batch(arrays, rects[i:i + batch]))
+    return results
+
+def _hit_test_batch(arrays, rects):
+    x1, y1, x2, y2, sx0, sy0, sx1, sy1 = arrays
+    r = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+    x, y = r[:, 0], r[:, 1]
+    right, bottom = x + r[:, 2], y + r[:, 3]
+    # 1) bounding box test for every (rect, segment) pair, keep only the pairs that could touch
+    near = ((sx1 >= x[:, None]) & (sx0 <= right[:, None]) & (sy1 >= y[:, None]) & (sy0 <= bottom[:, None]))
+    ri, si = np.nonzero(near)
+    hit = np.zeros(len(r), dtype=bool)
+    if len(ri) == 0:
+        return hit.tolist()
+    ax, ay, bx, by = x1[si], y1[si], x2[si], y2[si]
+    lx, ty, rx, by_ = x[ri], y[ri], right[ri], bottom[ri]
+    # 2) the four rect edges (c -> d) in the same order as colideRectLine
+    pair_hit = np.zeros(len(ri), dtype=bool)
+    for cx, cy, dx, dy in ((lx, ty, lx, by_), (lx, by_, rx, by_), (rx, by_, rx, ty), (rx, ty, lx, ty)):
+        den = (ax - bx) * (cy - dy) - (ay - by) * (cx - dx)
+        parallel = den == 0
+        safe = np.where(parallel, 1.0, den)
+        t = ((ax - cx) * (cy - dy) - (ay - cy) * (cx - dx)) / safe
+        u = ((ax - cx) * (ay - by) - (ay - cy) * (ax - bx)) / safe
+        pair_hit |= ~parallel & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    hit[ri[pair_hit]] = True
+    return hit.tolist()
+
+class CollisionLayer:
+    def __init__(self, width, height, cell=DEFAULT_CELL):
+        self.width = int(width)          # size of the room in pixels
+        self.height = int(height)
+        self.cell = int(cell)
+        self.cols = math.ceil(self.width / self.cell)
+        self.rows = math.ceil(self.height / self.cell)
+        self.cells = bytearray(self.cols * self.rows)   # 1 = blocked, row by row
+        self._sums = None                # summed-area table, built on first rect query
+
+    @classmethod
+    def from_polygons(cls, polygons, width=None, height=None, cell=DEFAULT_CELL):
+        """Build a layer from hitbox polygons (lists of (x, y) points in room space)."""
+        if width is None:
+            width = max(x for poly in polygons for x, _ in poly) + 1
+        if height is None:
+            height = max(y for poly in polygons for _, y in poly) + 1
+        layer = cls(width, height, cell)
+        for polygon in polygons:
+            layer.add_polygon(polygon)
+        return layer
+
+    @classmethod
+    def from_cells(cls, width, height, cell, cells):
+        """Rebuild a layer from saved cells (e.g. a cooked map file)."""
+        layer = cls(width, height, cell)
+        if len(cells) != len(layer.cells):
+            raise ValueError("collision cells don't match the room size")
+        layer.cells[:] = cells
+        return layer
+
+    # ----- building -----
+    def _block(self, cx, cy):
+        if 0 <= cx < self.cols and 0 <= cy < self.rows:
+            self.cells[cy * self.cols + cx] = 1
+
+    def add_polygon(self, polygon):
+        """Mark the inside of a closed polygon and every cell its edges pass through as blocked."""
+        c = self.cell
+        points = list(polygon)
+        if points[0] != points[-1]:
+            points.append(points[0])
+        edges = list(zip(points, points[1:]))
+
+        # 1) fill the inside: for each row of cells, find where its centre line crosses the edges
+        #    and fill between pairs of crossings (even-odd rule)
+        for cy in range(self.rows):
+            yc = (cy + 0.5) * c
+            xs = []
+            for (x1, y1), (x2, y2) in edges:
+                if (y1 <= yc < y2) or (y2 <= yc < y1):
+                    xs.append(x1 + (yc - y1) * (x2 - x1) / (y2 - y1))
+            xs.sort()
+            for i in range(0, len(xs) - 1, 2):
+                first = max(0, math.ceil(xs[i] / c - 0.5))
+                last = min(self.cols - 1, math.floor(xs[i + 1] / c - 0.5))
+                row = cy * self.cols
+                for cx in range(first, last + 1):
+                    self.cells[row + cx] = 1
+
+        # 2) mark the edges themselves so thin walls never slip between cell centres
+        for (x1, y1), (x2, y2) in edges:
+            steps = max(1, int(math.hypot(x2 - x1, y2 - y1) / (c / 2)))
+            for i in range(steps + 1):
+                x = x1 + (x2 - x1) * i / steps
+                y = y1 + (y2 - y1) * i / steps
+                self._block(int(x // c), int(y // c))
+        self._sums = None
+
+    def _build_sums(self):
+        # sums[(cy) * (cols+1) + cx] = number of blocked cells above and to the left of (cx, cy)
+        cols, rows = self.cols, self.rows
+        stride = cols + 1
+        sums = array("I", bytes(4 * stride * (rows + 1)))
+        for cy in range(rows):
+            running = 0
+            above = cy * stride
+            here = (cy + 1) * stride
+            row = cy * cols
+            for cx in range(cols):
+                running += self.cells[row + cx]
+                sums[here + cx + 1] = sums[above + cx + 1] + running
+        self._sums = sums
+
+    # ----- queries -----
+    def grid_size(self):
+        return self.cols, self.rows
+
+    def blocked_cell(self, cx, cy):
+        """True if grid cell (cx, cy) is blocked. Cells outside the room are open."""
+        if 0 <= cx < self.cols and 0 <= cy < self.rows:
+            return self.cells[cy * self.cols + cx] == 1
+        return False
+
+    def blocked_point(self, x, y):
+        """True if the room-space pixel (x, y) is inside a wall or obstacle."""
+        return self.blocked_cell(int(x // self.cell), int(y // self.cell))
+
+    def blocked_rect(self, x, y, w, h):
+        """True if any part of the room-space rect (x, y, w, h) overlaps a blocked cell."""
+        c = self.cell
+        x0 = max(0, int(x // c))
+        y0 = max(0, int(y // c))
+        x1 = min(self.cols, int((x + w - 1) // c) + 1)
+        y1 = min(self.rows, int((y + h - 1) // c) + 1)
+        if x0 >= x1 or y0 >= y1:
+            return False
+        if self._sums is None:
+            self._build_sums()
+        s = self._sums
+        stride = self.cols + 1
+        return (s[y1 * stride + x1] - s[y0 * stride + x1] - s[y1 * stride + x0] + s[y0 * stride + x0]) > 0
@@ -0,0 +1,120 @@
+# config.py
+# The game's numbers and names: sizes, speeds, limits, colours. Shared by the game and the server.
+# Nothing in here may import pygame (or anything else) - the server reads it too, and it shouldn't
+# have to load SDL to find out how fast a player walks. The game uses settings.py, which is
+# everything in here plus the pygame things (like WORLD_RECT). Every other module the server imports
+# (map_data.py, collision.py, projectile_sim.py...) keeps to the same rule.
+#
+# Game setup
+WIDTH = 1280  # Width of the virtual screen - will be scaled based on user settings
+HEIGHT = 720  # Height of the virtual screen - will be scaled based on user settings
+FPS = 60         # most frames drawn per second (raise this on high refresh rate monitors)
+SIM_RATE = 60    # simulation ticks per second. PLAYER_SPEED, ANIM_SPEED and cooldowns are all counted in ticks
+MAX_FRAME_TIME = 0.25  # seconds - if a frame takes longer than this (e.g. dragging the window) the simulation skips ahead
+DEFAULT_INTERACT_RADIUS = 120
+MAP_FILE = "maps/campus.json"  # rooms, hitboxes and spawns (see modules/map_data.py)
+ASSET_MANIFEST = "assets/manifest.json"  # images loaded at start-up (see modules/assets.py)
+ROOM_LOAD_DISTANCE = 1500      # rooms load when the player gets this close to their edge...
+ROOM_UNLOAD_DISTANCE = 2500    # ...and unload again when the player is this far away
+ROOM_MEMORY_BUDGET = 256 * 1024 * 1024  # most bytes of room images kept loaded at once
+SPATIAL_CELL_SIZE = 256       # size of the cells entities are sorted into for finding nearby ones
+ENTITY_ACTIVE_MARGIN = 256    # entities further than this off the edge of the screen aren't updated
+
+# Render setup - the world is drawn at WIDTH*RENDER_SCALE x HEIGHT*RENDER_SCALE and scaled up to the window
+RENDER_SCALE = 1.0                    # e.g. 0.5 = 640x360, 0.75 = 960x540. Text and UI are always full resolution
+RENDER_SCALES = (0.5, 0.75, 1.0)      # steps used by RENDER_AUTO_SCALE
+RENDER_AUTO_SCALE = False             # lower the render scale automatically if the game can't hold FPS
+RENDER_SMOOTH_UPSCALE = False         # smoother but slower upscaling
+
+# Profiler setup (F3 in game shows the frame-time graph, F4 saves a trace file)
+PROFILER_ENABLED = False      # start with the profiler running
+PROFILER_HISTORY = 240        # frames shown in the graph
+PROFILER_MAX_EVENTS = 100000  # most timed sections kept for the trace file
+
+# Chat setup
+CHAT_CAPACITY = 100       # most messages kept for scrollback, older ones are dropped
+CHAT_VISIBLE_LINES = 10   # lines shown on screen at once (PageUp/PageDown or mouse wheel to scroll back)
+CHAT_WIDTH = 600          # messages are word wrapped to fit this many pixels
+
+# Network setup - the game starts offline and keeps trying the server in the background
+NET_CONNECT_TIMEOUT = 2.0  # seconds to wait for the server each try
+NET_RETRY_SECONDS = 5.0    # seconds between tries while offline
+CLOCK_PING_INTERVAL = 1.0  # seconds between clock_pings that measure the ping and the server's clock
+CLOCK_PING_FAST = 5        # pings sent 5 times faster just after connecting, so the estimates settle quickly
+
+# Player setup
+#PLAYER_START_X = WIDTH//2
+#PLAYER_START_Y = HEIGHT//2
+PLAYER_START_X = 600 # was 10900
+PLAYER_START_Y = 380 # was 4150
+PLAYER_SIZE = 0.35
+PLAYER_SPEED = 8
+PLAYER_HITBOX = 40   # pixels: the square around a player that the server's projectiles hit
+
+# Projectile setup (speeds and times are in simulation ticks, see SIM_RATE)
+PROJECTILE_SPEED = 30
+PROJECTILE_LIFETIME = 60         # ticks before a projectile disappears
+PROJECTILE_SIZE = (60, 20)
+PROJECTILE_POOL_SIZE = 256       # most projectiles the game shows at once
+PROJECTILE_SERVER_POOL = 1024    # most projectiles the server tracks at once (all players)
+SHOT_COOLDOWN = 50               # ticks between shots
+MAX_SHOT_SEQ = 2 ** 31           # shot numbers ("seq") the server accepts are 0 up to this
+
+# Server flood protection (see modules/rate_limit.py): message type -> (messages per second, burst)
+# The game sends "move" 30 times a second at most, so these leave plenty of room for normal play.
+RATE_LIMITS = {
+    "move": (40, 60),            # extra moves still count, they just aren't broadcast straight away
+    "chat": (1, 5),
+    "shoot": (4, 8),             # SHOT_COOLDOWN is checked as well
+    "set_appearance": (0.5, 3),
+    "sheet_register": (0.2, 2),
+    "sheet_get": (10, 40),       # a client asks once for each player's sheet when it joins
+    "sheet_offer": (1, 5),       # "do you have my sheet?" when connecting
+    "clock_ping": (5, 10),       # clients ping once a second (5 times a second just after connecting)
+    "entity_register": (5, 20),  # once for each room loaded
+    "entity_update": (40, 60),   # sent with the moves
+}
+MOVE_SLACK = 1.5          # how much faster than PLAYER_SPEED a player may move before the server clamps them
+MOVE_BURST = 0.5          # seconds of movement a client may send at once (e.g. after a lag spike)
+WORLD_BROADCAST_RATE = 20 # times a second the server sends moves it held back because of RATE_LIMITS
+MAX_SHEET_BYTES = 512 * 1024  # biggest sprite sheet PNG a player may upload
+MAX_SHEET_SIDE = 4096     # widest or tallest sprite sheet (pixels), and frame in a sheet's atlas
+MAX_ATLAS_PIXELS = 2048 * 2048  # most pixels all of one sheet's atlas frames may add up to (see modules/atlas.py)
+MAX_ENTITIES = 5000       # replicated entities each instance keeps track of (see modules/replication.py)
+
+# Room instances (see modules/instances.py): separate copies of the world on one server
+DEFAULT_INSTANCE = "world"  # name of the first instance; more are "world-2", "world-3"... when it fills up
+INSTANCE_CAP = 40           # players in one instance
+INSTANCE_CAPS = {}          # a different cap for particular instances, e.g. {"assembly": 120}
+MAX_INSTANCES = 20          # instances one server will run at once
+LOBBY_REPLY_TIMEOUT = 2.0   # seconds a worker (--workers) waits for worker 0 to say which instance a player joins
+
+# Server state on disk (see modules/server_store.py), so a restart doesn't make everyone upload their sheets again
+SERVER_STATE_DIR = "server_state"   # folder, relative to the project folder
+SAVE_INTERVAL = 1.0                 # seconds between writes of what changed
+COMPACT_LOG_BYTES = 1024 * 1024     # rewrite the snapshot when the change log gets this big
+FORGET_PLAYERS_AFTER = 12 * 3600    # seconds a player who left is remembered for
+
+# Colours for players
+#Creating colors
+RED   = (255, 0, 0)
+ORANGE = (255,165,0)
+BLACK = (0, 0, 0)
+BLUE  = (0, 0, 255)
+PINK = (255,192,203)
+WHITE = (255, 255, 255)
+GREEN = (0, 255, 0)
+YELLOW = (255,255,0)
+BROWN = (150,75,0)
+CYAN = (0,255,255)
+PURPLE = (160,32,240)
+MAGENTA = (253,61,181)
+DARK_GREEN = (1,50,32)
+GOLD = (255, 215, 0)
+TEAL = (0, 128, 128)
+LIME = (57, 255, 20)
+PLAYER_COLOURS = {1:RED, 2:ORANGE, 3:BLACK, 4:BLUE, 5:PINK, 6:WHITE, 7:GREEN, 8:YELLOW, 9:BROWN, 10:CYAN, 11:PURPLE, 12:MAGENTA, 13:DARK_GREEN, 14:GOLD, 15:TEAL, 16:LIME}
+
+# Player sprite colours for repplacement
+OLD_COLOR_HIGHLIGHT = (255,0,0)
+OLD_COLOR_SHADOW = (0,0,255)
@@ -1,32 +1,19 @@
 import pygame
 import math
 from modules.settings import *
+from modules.ui import TEXT_CACHE
+from modules.assets import ASSETS
+from modules.assets_net import packed_atlas
+from modules.collision import CollisionLayer, PolygonCollider, line_intersection, colideRectLine, collideRectPolygon
+from modules.map_data import load_map
 import os
+import weakref
+from collections import deque
+from modules.projectile_sim import ProjectileSim
 
-# functions to check for collisions between a rect and a polygon
-def line_intersection(a, b, c, d):
-    # check for division by zero
-    if ((a[0] - b[0]) * (c[1] - d[1]) - (a[1] - b[1]) * (c[0] - d[0])) == 0:
-        return False
-    t = ((a[0] - c[0]) * (c[1] - d[1]) - (a[1] - c[1]) * (c[0] - d[0])) / ((a[0] - b[0]) * (c[1] - d[1]) - (a[1] - b[1]) * (c[0] - d[0]))
-    u = ((a[0] - c[0]) * (a[1] - b[1]) - (a[1] - c[1]) * (a[0] - b[0])) / ((a[0] - b[0]) * (c[1] - d[1]) - (a[1] - b[1]) * (c[0] - d[0]))
-    # check if line actually intersect
-    if (0 <= t and t <= 1 and 0 <= u and u <= 1):
-        return True
-    else: 
-        return False
-
-def colideRectLine(rect, p1, p2):
-    return (line_intersection(p1, p2, rect.topleft, rect.bottomleft) or
-            line_intersection(p1, p2, rect.bottomleft, rect.bottomright) or
-            line_intersection(p1, p2, rect.bottomright, rect.topright) or
-            line_intersection(p1, p2, rect.topright, rect.topleft))
-
-def collideRectPolygon(rect, polygon):
-    for i in range(len(polygon)-1):
-        if colideRectLine(rect, polygon[i], polygon[i+1]):
-            return True
-    return False
+# collision functions (line_intersection, colideRectLine, collideRectPolygon, PolygonCollider)
+# now live in collision.py so the server can use them without pygame. Imported here so existing
+# code that gets them from entities still works.
 
 def pallete_swap(image, old_color, new_color):
     image_copy = pygame.Surface(image.get_size())
@@ -39,6 +26,27 @@ def pallete_swap(image, old_color, new_color):
     image_copy2.set_colorkey((236,0,140))
     return image_copy2
 
+# Flipped copies of animation frames, made once and reused rather than flipping every frame
+_flipped_frames = weakref.WeakKeyDictionary()
+
+def flip_x(frame):
+    flipped = _flipped_frames.get(frame)
+    if flipped is None:
+        flipped = pygame.transform.flip(frame, True, False)
+        _flipped_frames[frame] = flipped
+    return flipped
+
+def recoloured_frames(colour, scale=1.0, sheet="assets/player_sheet.png"):
+    """The player sheet with its green swapped for colour. Made once per colour and shared."""
+    def make():
+        frames = []
+        for frame in ASSETS.frames(sheet, cols=9, count=9, pad=1, scale=scale):
+            img = pallete_swap(frame, OLD_COLOR_HIGHLIGHT, colour)
+            img = pallete_swap(img, OLD_COLOR_SHADOW, colour)
+            frames.append(img)
+        return frames
+    return list(ASSETS.derive(("recoloured", sheet, tuple(colour), float(scale)), make))
+
 def load_frames_grid(
     sheet_path, *, cols, count, pad=0, origin=(0, 0), frame_w=None, frame_h=None):
     """
@@ -48,28 +56,10 @@ def load_frames_grid(
     - pad: pixels between cells
     - origin: top-left offset where the first cell starts
     - frame_w/frame_h: override cell size (if None, derive from sheet)
+    The frames are shared, so copy() one before drawing onto it.
     """
-    sheet = pygame.image.load(sheet_path).convert_alpha()
-    sw, sh = sheet.get_size()
-
-    rows = math.ceil(count / cols)
-
-    # Derive sizes unless overridden
-    fw = frame_w if frame_w is not None else (sw - origin[0] - (cols - 1) * pad) // cols
-    fh = frame_h if frame_h is not None else (sh - origin[1] - (rows - 1) * pad) // rows
-
-    frames = []
-    y = origin[1]
-    for r in range(rows):
-        x = origin[0]
-        for c in range(cols):
-            if len(frames) >= count:
-                break
-            rect = pygame.Rect(x, y, fw, fh)
-            frames.append(sheet.subsurface(rect).copy())
-            x += fw + pad
-        y += fh + pad
-    return frames
+    # the sheet is decoded and sliced once (see assets.py), so the frames are shared between sprites
+    return ASSETS.frames(sheet_path, cols, count, pad, frame_w, frame_h, origin=origin)
 
 
 
@@ -80,12 +70,18 @@ def offset_ycoord(y_coord, player_y):
     return y_coord - player_y + PLAYER_START_Y
 
 class Projectile(pygame.sprite.Sprite):
+    # Older single projectile sprite, kept so existing code still works. New code should use
+    # ProjectilePool.fire() (state.projectiles_group), which is pooled and networked.
+    IMAGE = None   # shared by every Projectile instead of a new Surface per bullet
+
     def __init__(self, x, y, direction, owner, screen):
         super().__init__()
         self.x = x  # World position
         self.y = y  # World position
-        self.image = pygame.Surface((60, 20))
-        self.image.fill((255, 255, 0))
+        if Projectile.IMAGE is None:
+            Projectile.IMAGE = pygame.Surface(PROJECTILE_SIZE)
+            Projectile.IMAGE.fill((255, 255, 0))
+        self.image = Projectile.IMAGE
         self.rect = self.image.get_rect(center=(x, y))
         self.velocity = direction
         self.owner = owner
@@ -94,13 +90,83 @@ class Projectile(pygame.sprite.Sprite):
     def update(self, player_x, player_y):
         self.x += self.velocity[0]
         self.y += self.velocity[1]
-        self.rect.center = (self.x, self.y)
-        self.rect = self.image.get_rect(center=(self.x-player_x+(WIDTH//2),self.y-player_y+(HEIGHT//2)))
+        self.rect.center = (self.x-player_x+(WIDTH//2),self.y-player_y+(HEIGHT//2))
         # Kill if out of world bounds
         if not WORLD_RECT.collidepoint((self.x, self.y)):
             self.kill()
 
 
+class ProjectilePool(ProjectileSim):
+    """
+    The game's projectiles (state.projectiles_group). Projectiles come from a fixed pool and all share
+    one image. fire() shows the shot straight away (client-side prediction) and tells the server,
+    which sends back the real projectile to everyone. Messages from the network thread are queued and
+    applied at the start of the next tick so the pool is only ever changed by the game loop.
+    """
+    def __init__(self, size=PROJECTILE_POOL_SIZE, lifetime=PROJECTILE_LIFETIME):
+        super().__init__(size, lifetime, PROJECTILE_SIZE[0], PROJECTILE_SIZE[1], assign_ids=False)
+        self.image = pygame.Surface(PROJECTILE_SIZE)
+        self.image.fill((255, 255, 0))
+        self.net = None               # NetClient when connected to a server
+        self.net_events = deque()     # ("spawn"/"end", data) from the network thread
+        self.next_seq = 1
+        self.ended = []               # (id, target sid, owner sid) from the server this tick, for score etc.
+
+    def fire(self, x, y, vx, vy):
+        seq = self.next_seq
+        self.next_seq += 1
+        my_sid = self.net.my_sid if self.net is not None else ""
+        self.spawn(x, y, vx, vy, owner=my_sid or "", seq=seq)
+        if self.net is not None and self.net.connected:
+            self.net.send_shoot(seq, vx, vy)
+
+    def add(self, *sprites):
+        # lets old code do projectiles.add(Projectile(...))
+        for spr in sprites:
+            vx, vy = getattr(spr, "velocity", (0, 0))
+            self.fire(spr.x, spr.y, vx, vy)
+
+    def _apply_net_events(self):
+        my_sid = self.net.my_sid if self.net is not None else None
+        self.ended = []
+        while self.net_events:
+            kind, data = self.net_events.popleft()
+            if kind == "spawn":
+                pid = data["id"]
+                if pid in self.by_id:
+                    continue
+                if data.get("owner") == my_sid:
+                    # our own shot: give our prediction the server's id instead of making a second one
+                    for p in self.active:
+                        if p.id is None and p.seq == data.get("seq"):
+                            self.set_id(p, pid)
+                            break
+                    continue
+                self.spawn(data["x"], data["y"], data["vx"], data["vy"], owner=data.get("owner", ""), pid=pid)
+            elif kind == "end":
+                for pid, target, owner in data:
+                    self.kill_id(pid)
+                    self.ended.append((pid, target, owner))
+
+    def update(self, rooms=()):
+        """One simulation tick: apply server messages, move projectiles, stop them at walls."""
+        self._apply_net_events()
+        def blocked(x, y):
+            for room in rooms:
+                if room.blocked_point(x, y):
+                    return True
+            return False
+        self.step(blocked)
+
+    def draw(self, surface, cam_x, cam_y, alpha=1.0):
+        # alpha blends between the last two ticks, the same as the camera (see camera_position)
+        back = 1.0 - alpha
+        ox = WIDTH // 2 - self.half_w - cam_x
+        oy = HEIGHT // 2 - self.half_h - cam_y
+        for p in self.active:
+            surface.blit(self.image, (int(p.x - p.vx * back + ox), int(p.y - p.vy * back + oy)))
+
+
 class Player(pygame.sprite.Sprite):
     def __init__(self, colour, projectiles, screen):
         super().__init__()
@@ -154,13 +220,8 @@ class Player(pygame.sprite.Sprite):
         self.color_highlight = tuple(colour)
         self.color_shadow    = tuple(colour)
 
-        new_images = []
-        for base in self.base_frames:
-            img = base.copy()  # don’t mutate the base
-            img = pallete_swap(img, OLD_COLOR_HIGHLIGHT, self.color_highlight)
-            img = pallete_swap(img, OLD_COLOR_SHADOW,    self.color_shadow)
-            new_images.append(img)
-        self.images = new_images
+        # made once per colour and shared (see recoloured_frames)
+        self.images = recoloured_frames(colour)
 
         # keep current frame valid
         self.current_frame = min(self.current_frame, len(self.images) - 1)
@@ -235,12 +296,13 @@ class Player(pygame.sprite.Sprite):
     # ----- gameplay bits you kept -----
 
     def shoot(self):
-        # kept as placeholder for your future use (networked bullets, etc.)
         if self.cooldown == 0:
-            dx = 10 if self.facing == "right" else -10
-            self.cooldown = 50
+            dx = PROJECTILE_SPEED if self.facing == "right" else -PROJECTILE_SPEED
+            self.cooldown = SHOT_COOLDOWN
             self.last_shot_position = (self.x, self.y)
             self.last_shot_direction = dx
+            if hasattr(self.projectiles, "fire"):
+                self.projectiles.fire(self.x, self.y, dx, 0)
 
     # ----- per-frame update -----
 
@@ -303,26 +365,20 @@ class Player_V7(pygame.sprite.Sprite):
     def shoot(self):
         if self.cooldown == 0:
             if self.facing == "right":
-                dx = 10
+                dx = PROJECTILE_SPEED
             else:
-                dx = -10
-            # removed below... don't make a projectile until told to by the network... won't work on single-player game??
-            #bullet = Projectile(self.x, self.y, (dx * 3, 0), self, self.screen)
-            #self.projectiles.add(bullet)
-            self.cooldown = 50  # Cooldown in frames
+                dx = -PROJECTILE_SPEED
+            # the pool shows the shot straight away and tells the server (works offline too)
+            if hasattr(self.projectiles, "fire"):
+                self.projectiles.fire(self.x, self.y, dx, 0)
+            self.cooldown = SHOT_COOLDOWN  # Cooldown in ticks
             self.last_shot_position = (self.x, self.y)
             self.last_shot_direction = dx
 
     def set_colour(self, colour):
         self.color_highlight = (colour)
         self.color_shadow = (colour)
-        self.images = []
-        for fra in self.frames:
-            new_image = (pygame.image.load(fra).convert_alpha())
-            new_image = pygame.transform.scale(new_image, (new_image.get_width()*.66, new_image.get_height()*.66))
-            new_image = pallete_swap(new_image, OLD_COLOR_HIGHLIGHT, self.color_highlight)
-            new_image = pallete_swap(new_image, OLD_COLOR_SHADOW, self.color_shadow)
-            self.images.append(new_image)
+        self.images = recoloured_frames(colour, scale=.66)
             
     def get_image(self):
         next_frame = self.current_frame
@@ -403,6 +459,7 @@ class Player_V7(pygame.sprite.Sprite):
 class BasePlayer(pygame.sprite.Sprite):
     # --- Students set only these two ---
     SHEET       = None          # e.g. "assets/my_character.png"
+                                # (made with make_spritesheet.py --mode maxrects? its JSON is used automatically)
     SHEET_COUNT = 1             # total frames; 1 = no animation
 
     # --- Defaults students rarely touch ---
@@ -428,6 +485,7 @@ class BasePlayer(pygame.sprite.Sprite):
         self.playable = playable
         self.input_enabled = True
         self.interact_pressed =False
+        self.shot_cooldown = 0          # ticks until shoot() works again
 
         # facing & animation state (mirrors your original behaviour)
         self.facing = "right"           # "left" or "right"
@@ -448,8 +506,13 @@ class BasePlayer(pygame.sprite.Sprite):
         return
 
     # Animation happens here so students never have to call super().update()
-    def draw(self, surface):
-        # Work out deltas since the last frame (supports "set x/y directly" style)
+    # The game loop calls this once per simulation tick (after update() and collisions),
+    # so walking animations run at the same speed however fast the screen is drawn.
+    def animate(self):
+        if self.shot_cooldown > 0:
+            self.shot_cooldown -= 1
+
+        # Work out deltas since the start of this tick (supports "set x/y directly" style)
         dx = float(self.x) - float(self.prev_x)
         dy = float(self.y) - float(self.prev_y)
 
@@ -483,10 +546,11 @@ class BasePlayer(pygame.sprite.Sprite):
                         if self.current_frame > (len(self.frames) - 1):
                             self.current_frame = 1
 
+    def draw(self, surface):
         # Compose frame with left/right flip
         frame = self.frames[self.current_frame]
         if self.facing == "left":
-            frame = pygame.transform.flip(frame, True, False)
+            frame = flip_x(frame)
         self.image = frame
 
         # Camera-locked draw + collision rects
@@ -496,14 +560,23 @@ class BasePlayer(pygame.sprite.Sprite):
         # Draw
         surface.blit(self.image, self.rect)
 
-        # IMPORTANT: update previous position AFTER drawing so next frame sees deltas
-        self.prev_x, self.prev_y = float(self.x), float(self.y)
-
 
     # ---------------- helpers for students/engine ----------------
     def move_back(self):
         self.x, self.y = self.prev_x, self.prev_y
 
+    def shoot(self, speed=PROJECTILE_SPEED):
+        """Fire a projectile the way the player is facing. Returns False while still cooling down."""
+        if self.shot_cooldown > 0:
+            return False
+        vx = -speed if self.facing == "left" else speed
+        self.shot_cooldown = SHOT_COOLDOWN
+        self.last_shot_position = (self.x, self.y)
+        self.last_shot_direction = vx
+        if hasattr(self.projectiles, "fire"):
+            self.projectiles.fire(self.x, self.y, vx, 0)
+        return True
+
     def get_frame(self, idx, *, flip=False):
         if not self.frames:
             return self.image
@@ -520,22 +593,16 @@ class BasePlayer(pygame.sprite.Sprite):
     def _load_frames_or_square(self, colour):
         try:
             if self.SHEET and os.path.exists(self.SHEET) and int(self.SHEET_COUNT) > 0:
-                if self.SHEET_COLS is None:
-                    frames = self._load_sprite_strip(self.SHEET, int(self.SHEET_COUNT))
+                scale = float(self.SHEET_SCALE)
+                if packed_atlas(self.SHEET) is not None:
+                    # packed with make_spritesheet.py --mode maxrects: the JSON says where each frame is
+                    frames = ASSETS.atlas_frames(self.SHEET, scale=scale)
+                    self.SHEET_COUNT = len(frames)
+                elif self.SHEET_COLS is None:
+                    frames = self._load_sprite_strip(self.SHEET, int(self.SHEET_COUNT), scale)
                 else:
-                    frames = self._load_frames_grid(self.SHEET, int(self.SHEET_COLS), int(self.SHEET_COUNT), int(self.SHEET_PAD))
+                    frames = self._load_frames_grid(self.SHEET, int(self.SHEET_COLS), int(self.SHEET_COUNT), int(self.SHEET_PAD), scale)
                 if frames:
-                    if float(self.SHEET_SCALE) != 1.0:
-                        scaled = []
-                        i = 0
-                        while i < len(frames):
-                            f = frames[i]
-                            w, h = f.get_size()
-                            nw = int(w * float(self.SHEET_SCALE))
-                            nh = int(h * float(self.SHEET_SCALE))
-                            scaled.append(pygame.transform.scale(f, (nw, nh)))
-                            i = i + 1
-                        frames = scaled
                     return frames
         except Exception:
             pass
@@ -547,25 +614,16 @@ class BasePlayer(pygame.sprite.Sprite):
         return [surf]
 
     # 1-row strip: width split into frame_count equal parts
-    def _load_sprite_strip(self, path, frame_count):
-        sheet = pygame.image.load(path).convert_alpha()
-        sw, sh = sheet.get_size()
+    def _load_sprite_strip(self, path, frame_count, scale=1.0):
         #fw = sw // int(frame_count)
-        fw = 60
-        frames = []
-        x = 0
-        i = 0
-        while i < frame_count:
-            rect = pygame.Rect(x, 0, fw, sh)
-            frames.append(sheet.subsurface(rect).copy())
-            x = x + fw
-            i = i + 1
-        return frames
+        # a strip is just a grid with one row, frames are 60px wide
+        return ASSETS.frames(path, cols=frame_count, count=frame_count, frame_w=60, scale=scale)
 
-    # This wraps the global load_frames_grid function. Added this after accidentally creating a second version of it here
-    def _load_frames_grid(self, path, cols, count, pad):
+    # Loads through the asset manager so every player using the same sheet shares its frames.
+    # Added this after accidentally creating a second version of load_frames_grid here
+    def _load_frames_grid(self, path, cols, count, pad, scale=1.0):
         # Fix frame width at 60px; height still derived from rows
-        return load_frames_grid(path, cols=cols, count=count, pad=pad, frame_w=60)
+        return ASSETS.frames(path, cols=cols, count=count, pad=pad, frame_w=60, scale=scale)
 
 class Other_Player_V7(pygame.sprite.Sprite):
     def __init__(self):
@@ -578,11 +636,7 @@ class Other_Player_V7(pygame.sprite.Sprite):
         self.color_shadow = (15,82,51)
         #self.frames = ["sprites/player_idle.png", "sprites/player_move_1.png", "sprites/player_move_2.png", "sprites/player_move_3.png", "sprites/player_move_4.png", "sprites/player_move_5.png", "sprites/player_move_6.png", "sprites/player_move_7.png", "sprites/player_move_8.png"]
         self.frames = load_frames_grid("assets/player_sheet.png", cols=9, count=9, pad=1)
-        self.images = []
-        for fra in self.frames:
-            new_image = (pygame.image.load(fra).convert_alpha())
-            new_image = pygame.transform.scale(new_image, (new_image.get_width()*.66, new_image.get_height()*.66))
-            self.images.append(new_image)
+        self.images = ASSETS.frames("assets/player_sheet.png", cols=9, count=9, pad=1, scale=.66)
         self.current_frame = 0 # which frame is currently shown
         self.frame_count = 0   # how long has the current frame been shown for
         self.anim_speed = 5  # how often we change the frame when animating
@@ -595,13 +649,7 @@ class Other_Player_V7(pygame.sprite.Sprite):
     def set_colour(self, colour):
         self.color_highlight = (colour)
         self.color_shadow = (colour)
-        self.images = []
-        for fra in self.frames:
-            new_image = (pygame.image.load(fra).convert_alpha())
-            new_image = pygame.transform.scale(new_image, (new_image.get_width()*.66, new_image.get_height()*.66))
-            new_image = pallete_swap(new_image, OLD_COLOR_HIGHLIGHT, self.color_highlight)
-            new_image = pallete_swap(new_image, OLD_COLOR_SHADOW, self.color_shadow)
-            self.images.append(new_image)
+        self.images = recoloured_frames(colour, scale=.66)
     
     def get_image(self):
         next_frame = self.current_frame
@@ -652,7 +700,7 @@ class Other_Player(pygame.sprite.Sprite):
         self.base_frames = load_frames_grid("assets/player_sheet.png", cols=9, count=9, pad=1)
 
         # 2) Working frames we actually render (start as copies of base)
-        self.images = [frm.copy() for frm in self.base_frames]
+        self.images = list(self.base_frames)   # shared frames, set_colour makes new ones rather than drawing on them
 
         # anim state
         self.current_frame = 0
@@ -671,14 +719,8 @@ class Other_Player(pygame.sprite.Sprite):
         """Rebuild self.images by palette-swapping copies of base frames."""
         self.color_highlight = colour
         self.color_shadow    = colour
-        new_images = []
-        for base in self.base_frames:
-            img = base.copy()
-            # apply your palette swaps onto the copy
-            img = pallete_swap(img, OLD_COLOR_HIGHLIGHT, self.color_highlight)
-            img = pallete_swap(img, OLD_COLOR_SHADOW,    self.color_shadow)
-            new_images.append(img)
-        self.images = new_images
+        # every player with the same colour shares one set of recoloured frames
+        self.images = recoloured_frames(colour)
         # keep current frame valid
         self.current_frame = min(self.current_frame, len(self.images) - 1)
         self.image = self.images[self.current_frame]
@@ -705,7 +747,7 @@ class Other_Player(pygame.sprite.Sprite):
 
         # flip for facing without mutating the source frame
         if self.animation_state in ("idle_left", "walk_left"):
-            frame = pygame.transform.flip(frame, True, False)
+            frame = flip_x(frame)
 
         self.image = frame
 
@@ -732,7 +774,7 @@ class Other_Player(pygame.sprite.Sprite):
             return
         # mark pending and request once
         client._pending_ops[self.sid] = sheet_hash   # store sid on creation
-        client.sio.emit("sheet_get", {"hash": sheet_hash})
+        client.request_sheet(sheet_hash)
 
 
 class GameEntity(pygame.sprite.Sprite):
@@ -755,10 +797,9 @@ class GameEntity(pygame.sprite.Sprite):
         return False
 
     def add_frame(self, frame_path):
-        """Add an animation frame and immediately load and scale the image."""
+        """Add an animation frame and immediately load and scale the image (shared, so don't draw on it)."""
         self.frames.append(frame_path)
-        img = pygame.image.load(frame_path).convert_alpha()
-        img = pygame.transform.scale(img, (img.get_width() * self.scale, img.get_height() * self.scale))
+        img = ASSETS.image(frame_path, self.scale)  # loaded once however many entities use it
         self.images.append(img)
         # Automatically set image for first frame added
         if len(self.images) == 1:
@@ -803,78 +844,121 @@ class GameEntity(pygame.sprite.Sprite):
         sy = int(self.y - cam_y + (screen_h // 2))
         self.rect = self.image.get_rect(center=(sx, sy))
 
-class Cafeteria(pygame.sprite.Sprite):
-    def __init__(self, x, y, player):
+def entity_classes():
+    """
+    Name -> class for GameEntity and everything made from it (e.g. student_code's crates), so the game
+    can make an entity another player made (see replication.py) without the server naming any other class.
+    """
+    found = {}
+    todo = [GameEntity]
+    while todo:
+        cls = todo.pop()
+        found[cls.__name__] = cls
+        todo.extend(cls.__subclasses__())
+    return found
+
+class Room(pygame.sprite.Sprite):
+    """A room from the map file (see map_data.py). The image is drawn centred on the room's world x/y."""
+    def __init__(self, room_data, player):
         super().__init__()
-        self.image = pygame.image.load("maps/cafeteria.png").convert_alpha()
-        self.x = x      # this is the starting location that will be offset when the player moves
-        self.y = y   # this is the starting location that will be offset when the player moves
+        self.data = room_data
+        self.name = room_data.name
+        self.image = ASSETS.image(room_data.image)
+        self.x = room_data.x      # this is the starting location that will be offset when the player moves
+        self.y = room_data.y   # this is the starting location that will be offset when the player moves
         self.rect = self.image.get_rect(center=(self.x,self.y))
-        self.hitboxes = []
         self.player = player # need a reference to the player so we can offset the map as the player moves
-        #self.hitboxes.append([(365,415),(363,587),(591,587),(591,415),(365,415)]) # debug code - simple hitbox for testing
-        self.hitboxes.append([(33,238), (197,76), (722,76), (962,316), (964,379), (987,382), (989,369), (973,370), (971,248), (727,4), (194,3), (23,170), (22,369), (5,369), (5,380), (34,381), (33,238)])
-        self.hitboxes.append([(147,285), (168,339), (207,367), (242,377), (270,354), (301,377), (346,358), (376,329), (387,283), (361,282), (385,270), (366,234), (338,213), (294,197), (286,210), (254,210), (249,194), (209,205), (174,228), (149,270), (173,280), (147,285)])
-        self.hitboxes.append([(358,502), (365,537), (383,564), (414,586), (454,599), (467,574), (499,573), (513,597), (557,578), (589,545), (599,502), (574,499), (597,490), (584,458), (556,433), (505,415), (496,429), (467,429), (460,414), (427,420), (397,438), (373,461), (361,492), (387,499), (358,502)])
-        self.hitboxes.append([(561,279), (570,322), (593,347), (625,366), (657,375), (671,343), (699,342), (716,374), (755,358), (785,332), (801,300), (802,279), (775,277), (800,265), (787,234), (759,210), (727,196), (708,191), (700,206), (669,204), (663,189), (628,198), (595,218), (573,242), (564,269), (589,276), (561,279)])
-        self.hitboxes.append([(990,538), (963,538), (963,730), (750,943), (555,943), (555,993), (565,993), (566,954), (754,954), (973,733), (974,548), (990,548), (990,538)])
-        self.hitboxes.append([(5,538), (33,538), (33,738), (240,944), (430,944), (429,993), (418,993), (419,955), (233,954), (22,743), (22,548), (5,548), (5,538)])
-        self.hitboxes.append([(561,716), (568,751), (586,778), (617,800), (657,813), (670,788), (702,787), (716,811), (760,792), (792,759), (802,716), (777,713), (800,704), (787,672), (759,647), (708,629), (699,643), (670,643), (663,628), (630,634), (600,652), (576,675), (564,706), (590,713), (561,716)])
-        self.hitboxes.append([(146,715), (153,750), (171,777), (202,799), (242,812), (255,787), (287,786), (301,810), (345,791), (377,758), (387,715), (362,712), (385,703), (372,671), (344,646), (293,628), (284,642), (255,642), (248,627), (215,633), (185,651), (161,674), (149,705), (175,712), (146,715)])        
+        self.hitboxes = [list(hitbox) for hitbox in room_data.hitboxes]
+        # rebuild these if you change self.hitboxes
+        self.collider = PolygonCollider(self.hitboxes)  # exact edge tests
+        self.collision_layer = room_data.collision_layer()  # blocked cells
         self.draw_hitboxes = False   # Debugging tool
 
+    def memory_bytes(self):
+        return self.image.get_width() * self.image.get_height() * self.image.get_bytesize()
+
+    def blocked_point(self, wx, wy):
+        """True if the world point (wx, wy) is inside one of this room's walls or obstacles."""
+        left, top, right, bottom = self.data.bounds()
+        if left <= wx < right and top <= wy < bottom:
+            return self.collision_layer.blocked_point(wx - left, wy - top)
+        return False
+
     def hit_test(self, rect):
-        # before we can test for collisions we have to work out where the hitboxes are located on the screen.
-        for hitbox in self.hitboxes:
-            new_poly = []
-            for point in hitbox: 
-                new_x = self.rect.topleft[0] + point[0]
-                new_y = self.rect.topleft[1] + point[1]
-                new_poly.append([new_x,new_y])
-            result = collideRectPolygon(rect, new_poly)
-        #print(f"Player x: {player.x}, Player y: {player.y}, Collision: {result}")  # debug code
-        #print(f"Map TopLeft: {self.rect.topleft}, Hitbox coords:{new_poly}")  # debug code
-            if result == True:
-                return result
+        # move the player's rect into map space (rather than moving every hitbox onto the screen)
+        # and check it against the blocked cells, which also catches being inside a table or wall
+        return self.collision_layer.blocked_rect(rect.x - self.rect.x, rect.y - self.rect.y, rect.width, rect.height)
 
-    def update(self):
-        self.rect = self.image.get_rect(center=(self.x-self.player.x+(WIDTH//2),self.y-self.player.y+(HEIGHT//2)))
+    def update(self, cam_x=None, cam_y=None):
+        # the camera defaults to the player, the game loop passes a smoothed camera when drawing
+        if cam_x is None:
+            cam_x = self.player.x
+        if cam_y is None:
+            cam_y = self.player.y
+        self.rect = self.image.get_rect(center=(self.x-cam_x+(WIDTH//2),self.y-cam_y+(HEIGHT//2)))
         if self.draw_hitboxes == True:
             for hitbox in self.hitboxes:
                 pygame.draw.polygon(self.image, (255,0,0), hitbox)
 
+class Cafeteria(Room):
+    """The cafeteria room from the map file, placed at x, y."""
+    def __init__(self, x, y, player, map_file=MAP_FILE):
+        super().__init__(load_map(map_file)["cafeteria"].at(x, y), player)
+
 
 class HUD:
     def __init__(self, font_name=None, font_size=20, pad=10, max_msgs=5):
         self.font = pygame.font.SysFont(font_name, font_size)
         self.pad = pad
         self.max_msgs = max_msgs
-        self.messages = []  # list of dicts: {text, color, t_end}
+        self.messages = []  # list of dicts: {text, color, t_end, surf, back}
         self.score = 0
+        self._score_surf = TEXT_CACHE.render(self.font, "Score: 0", (255, 255, 255))
+        self._backs = {}  # (w, h) -> translucent backdrop, shared by toasts of the same size
 
     def set_score(self, value):
-        self.score = int(value)
+        value = int(value)
+        if value == self.score:
+            return
+        self.score = value
+        # only re-render when the score changes, not every frame
+        self._score_surf = TEXT_CACHE.render(self.font, f"Score: {self.score}", (255, 255, 255))
 
     def add_msg(self, text, color=(255, 255, 0), duration_ms=1500):
         now = pygame.time.get_ticks()
+        surf = TEXT_CACHE.render(self.font, str(text), color)
         self.messages.append({
             "text": str(text),
             "color": color,
-            "t_end": now + duration_ms
+            "t_end": now + duration_ms,
+            "surf": surf,
+            "back": self._backdrop(surf.get_size()),
         })
         if len(self.messages) > self.max_msgs:
             self.messages.pop(0)
 
+    def _backdrop(self, size):
+        back = self._backs.get(size)
+        if back is None:
+            back = pygame.Surface(size, pygame.SRCALPHA)
+            back.fill((0, 0, 0, 100))
+            self._backs[size] = back
+        return back
+
     def update(self):
         now = pygame.time.get_ticks()
-        self.messages = [m for m in self.messages if m["t_end"] > now]
+        # only build a new list when a toast has actually expired
+        for m in self.messages:
+            if m["t_end"] <= now:
+                self.messages = [m for m in self.messages if m["t_end"] > now]
+                break
 
     def draw(self, screen):
         sw, sh = screen.get_size()
         x_right = sw - self.pad
 
         # 1) score in top-right
-        score_surf = self.font.render(f"Score: {self.score}", True, (255, 255, 255))
+        score_surf = self._score_surf
         # soft shadow
         screen.blit(score_surf, (x_right - score_surf.get_width() + 1, self.pad + 1))
         screen.blit(score_surf, (x_right - score_surf.get_width(), self.pad))
@@ -882,12 +966,10 @@ class HUD:
         # 2) stacked toasts under score
         y = self.pad + score_surf.get_height() + 6
         for m in self.messages:
-            surf = self.font.render(m["text"], True, m["color"])
+            surf = m["surf"]
             # draw aligned to right edge
             x = x_right - surf.get_width()
             # subtle backdrop for readability
-            back = pygame.Surface(surf.get_size(), pygame.SRCALPHA)
-            back.fill((0, 0, 0, 100))
-            screen.blit(back, (x - 4, y - 2))
+            screen.blit(m["back"], (x - 4, y - 2))
             screen.blit(surf, (x, y))
             y += surf.get_height() + 4
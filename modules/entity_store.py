@@ -0,0 +1,222 @@
+# entity_store.py
+# Array-backed storage for lots of simple NPCs (crowds, birds, zombies...).
+# A GameEntity is a whole pygame Sprite with its own counters and its own update(), which is fine for
+# a few dozen things but not for thousands. EntityStore keeps every NPC's position, velocity, facing
+# and animation frame in NumPy arrays, so moving, animating and working out where they are on screen
+# is a handful of array operations per tick however many NPCs there are. Drawing is one blits() call.
+#
+# Students don't have to touch the arrays: subclass ArrayEntity (below) like a GameEntity and set
+# x/y/velocity_x/velocity_y on it. Each ArrayEntity just reads and writes its own slot in the store.
+# Needs NumPy (pip install numpy); without it the game runs with state.npcs = None.
+import pygame
+from modules.settings import WIDTH, HEIGHT
+from modules.entities import flip_x
+from modules.assets import ASSETS
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class EntityStore:
+    def __init__(self, capacity=256):
+        if np is None:
+            raise RuntimeError("EntityStore needs NumPy (pip install numpy)")
+        self.count = 0              # slots in use are all below this
+        self.free = []              # slots below count that have been freed
+        self.entities = []          # slot -> ArrayEntity (or None)
+        # per entity
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.x = np.zeros(capacity, dtype=np.float64)
+        self.y = np.zeros(capacity, dtype=np.float64)
+        self.vx = np.zeros(capacity, dtype=np.float64)
+        self.vy = np.zeros(capacity, dtype=np.float64)
+        self.kind = np.zeros(capacity, dtype=np.int32)      # index into self.kinds
+        self.frame = np.zeros(capacity, dtype=np.int32)     # 0 = idle, walking loops 1..end (like GameEntity)
+        self.frame_count = np.zeros(capacity, dtype=np.int32)
+        self.left = np.zeros(capacity, dtype=bool)          # facing left
+        # per kind (one kind per ArrayEntity class)
+        self.kinds = {}             # key -> kind index
+        self.kind_frames = np.zeros(0, dtype=np.int32)      # number of frames
+        self.kind_speed = np.zeros(0, dtype=np.int32)       # ticks per animation frame
+        self.kind_base = np.zeros(0, dtype=np.int32)        # first entry for the kind in the image table
+        # image table: kind_base + frame * 2 + left -> image (and half its size, for centring)
+        self.images = []
+        self.half_w = np.zeros(0, dtype=np.int32)
+        self.half_h = np.zeros(0, dtype=np.int32)
+
+    def __len__(self):
+        return self.count - len(self.free)
+
+    # ----- setup -----
+    def add_kind(self, key, images, anim_speed=5):
+        """Register the frames for one type of NPC. Returns its kind index."""
+        if key in self.kinds:
+            return self.kinds[key]
+        if not images:
+            images = [pygame.Surface((32, 32))]
+        table = []
+        for img in images:
+            table.append(img)
+            table.append(flip_x(img))
+        k = len(self.kinds)
+        self.kinds[key] = k
+        self.kind_frames = np.append(self.kind_frames, len(images)).astype(np.int32)
+        self.kind_speed = np.append(self.kind_speed, anim_speed).astype(np.int32)
+        self.kind_base = np.append(self.kind_base, len(self.images)).astype(np.int32)
+        self.images.extend(table)
+        self.half_w = np.append(self.half_w, [img.get_width() // 2 for img in table]).astype(np.int32)
+        self.half_h = np.append(self.half_h, [img.get_height() // 2 for img in table]).astype(np.int32)
+        return k
+
+    def _grow(self):
+        size = len(self.alive) * 2
+        for name in ("alive", "x", "y", "vx", "vy", "kind", "frame", "frame_count", "left"):
+            old = getattr(self, name)
+            new = np.zeros(size, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def spawn(self, kind, x, y, vx=0.0, vy=0.0, entity=None):
+        """Add an NPC and return its slot number."""
+        if self.free:
+            i = self.free.pop()
+        else:
+            if self.count == len(self.alive):
+                self._grow()
+            i = self.count
+            self.count += 1
+            self.entities.append(None)
+        self.alive[i] = True
+        self.x[i], self.y[i], self.vx[i], self.vy[i] = x, y, vx, vy
+        self.kind[i] = kind
+        self.frame[i] = 0
+        self.frame_count[i] = 0
+        self.left[i] = False
+        self.entities[i] = entity
+        return i
+
+    def remove(self, i):
+        if not self.alive[i]:
+            return
+        self.alive[i] = False
+        self.vx[i] = self.vy[i] = 0
+        self.entities[i] = None
+        self.free.append(i)
+
+    # ----- per tick -----
+    def step(self):
+        """Move and animate every NPC by one simulation tick."""
+        n = self.count
+        if n == 0:
+            return
+        alive = self.alive[:n]
+        vx, vy = self.vx[:n], self.vy[:n]
+        self.x[:n] += vx
+        self.y[:n] += vy
+
+        # facing follows the horizontal velocity, and stays the same when standing still
+        left = self.left[:n]
+        left[vx < 0] = True
+        left[vx > 0] = False
+
+        # same rules as GameEntity.animate
+        moving = alive & ((vx != 0) | (vy != 0))
+        frame, count = self.frame[:n], self.frame_count[:n]
+        kind = self.kind[:n]
+        count += 1
+        advance = moving & (count > self.kind_speed[kind])
+        frame[advance] += 1
+        count[advance] = 0
+        wrap = advance & (frame >= self.kind_frames[kind])
+        frame[wrap] = np.minimum(1, self.kind_frames[kind[wrap]] - 1)
+        frame[~moving] = 0
+        count[~moving] = 0
+
+    def visible(self, cam_x, cam_y, margin=64):
+        """Slots of the NPCs on (or within margin pixels of) the screen for this camera."""
+        n = self.count
+        hw = WIDTH // 2 + margin
+        hh = HEIGHT // 2 + margin
+        x, y = self.x[:n], self.y[:n]
+        return np.nonzero(self.alive[:n] & (np.abs(x - cam_x) < hw) & (np.abs(y - cam_y) < hh))[0]
+
+    def draw(self, surface, cam_x, cam_y, alpha=1.0):
+        """Draw every NPC on screen. alpha blends between the last two ticks like camera_position does."""
+        idx = self.visible(cam_x, cam_y)
+        if len(idx) == 0:
+            return
+        back = 1.0 - alpha
+        t = self.kind_base[self.kind[idx]] + self.frame[idx] * 2 + self.left[idx]
+        sx = (self.x[idx] - self.vx[idx] * back - cam_x + WIDTH // 2).astype(np.int32) - self.half_w[t]
+        sy = (self.y[idx] - self.vy[idx] * back - cam_y + HEIGHT // 2).astype(np.int32) - self.half_h[t]
+        images = self.images
+        surface.blits(list(zip([images[k] for k in t.tolist()], zip(sx.tolist(), sy.tolist()))), doreturn=False)
+
+
+class ArrayEntity(pygame.sprite.Sprite):
+    """
+    Looks like a GameEntity to student code, but its numbers live in an EntityStore.
+    Subclass it and list the frames:
+
+        class Pigeon(ArrayEntity):
+            FRAMES = ["assets/pigeon1.png", "assets/pigeon2.png"]
+            SCALE = 0.15
+
+    The store moves it by velocity_x/velocity_y every tick and animates it, so most NPCs never need
+    an update() at all. kill() frees its slot.
+    """
+    FRAMES = []          # image files, frame 0 is the idle frame
+    SCALE = 0.15
+    ANIM_SPEED = 5
+    store = None         # the game sets this to state.npcs
+
+    def __init__(self, x, y, player, velocity_x=0.0, velocity_y=0.0, store=None):
+        super().__init__()
+        self.store = store if store is not None else ArrayEntity.store
+        if self.store is None:
+            raise RuntimeError("no EntityStore - is NumPy installed?")
+        self.player = player
+        kind = self.store.add_kind(type(self), self._frames(), self.ANIM_SPEED)
+        self.slot = self.store.spawn(kind, x, y, velocity_x, velocity_y, self)
+
+    @classmethod
+    def _frames(cls):
+        return [ASSETS.image(path, cls.SCALE) for path in cls.FRAMES]
+
+    # each property reads/writes this entity's slot in the arrays
+    x = property(lambda self: float(self.store.x[self.slot]),
+                 lambda self, v: self.store.x.__setitem__(self.slot, v))
+    y = property(lambda self: float(self.store.y[self.slot]),
+                 lambda self, v: self.store.y.__setitem__(self.slot, v))
+    velocity_x = property(lambda self: float(self.store.vx[self.slot]),
+                          lambda self, v: self.store.vx.__setitem__(self.slot, v))
+    velocity_y = property(lambda self: float(self.store.vy[self.slot]),
+                          lambda self, v: self.store.vy.__setitem__(self.slot, v))
+    current_frame = property(lambda self: int(self.store.frame[self.slot]))
+
+    @property
+    def facing(self):
+        return "left" if self.store.left[self.slot] else "right"
+
+    @facing.setter
+    def facing(self, value):
+        self.store.left[self.slot] = (value == "left")
+
+    @property
+    def image(self):
+        s = self.store
+        return s.images[s.kind_base[s.kind[self.slot]] + s.frame[self.slot] * 2 + s.left[self.slot]]
+
+    @property
+    def rect(self):
+        """Rect around the NPC in world coordinates."""
+        return self.image.get_rect(center=(int(self.x), int(self.y)))
+
+    def hit_test(self, rect):
+        return False
+
+    def kill(self):
+        if self.slot is not None:
+            self.store.remove(self.slot)
+            self.slot = None
+        super().kill()
@@ -0,0 +1,135 @@
+# instances.py
+# Room instances: separate copies of the game world on one server, so one class (or a class and its
+# visitors) don't all have to see - and pay for - each other. Each instance has its own players (its
+# "world" message only lists them), chat, projectiles and shared entities, and is a Socket.IO room of
+# the same name, so sio.emit(..., room=instance.name) only goes to its own players.
+#
+# The Lobby decides which instance a player joins when they connect:
+#   - by name: the client asks for one (python strathmore-game-v7.py --instance 10CS-2), and it is made
+#     if it doesn't exist yet. If it is full the connection is refused (the client keeps retrying).
+#   - automatically: the fullest instance that still has room, so players end up together rather
+#     than one to an instance. When they are all full a new one is made ("world-2", "world-3", ...).
+# Each instance takes at most INSTANCE_CAP players (or INSTANCE_CAPS[name]). With --workers only
+# worker 0's Lobby chooses: it keeps a place (reserve) for another worker's player until that player
+# arrives in its world, so two workers can't both give away the last place.
+#
+# Sprite sheets are kept once for the whole server (they are stored by hash, so two instances never
+# need two copies); each instance counts which of them its players use (sheet_refs).
+import re, time
+from modules.config import INSTANCE_CAP, INSTANCE_CAPS, MAX_INSTANCES, DEFAULT_INSTANCE, MAX_ENTITIES
+from modules.config import PROJECTILE_SERVER_POOL, PROJECTILE_LIFETIME, PROJECTILE_SIZE
+from modules.projectile_sim import ProjectileSim
+from modules.replication import EntityTable
+
+class LobbyFull(Exception):
+    """The instance asked for is full, or there can't be any more instances."""
+
+def clean_instance_name(name):
+    """Letters, digits, - and _ only (it is a Socket.IO room name and shows in the teacher's pages)."""
+    return re.sub(r"[^A-Za-z0-9_-]", "", str(name or ""))[:32]
+
+class Instance:
+    def __init__(self, name, cap, first_projectile_id=1):
+        self.name = name
+        self.cap = cap
+        self.world = {}        # sid -> player, the same dicts as the server's WORLD
+        self.reserved = {}     # sid -> time.monotonic() their place stops being kept (see Lobby.choose)
+        self.dirty = False     # a move was applied but not broadcast yet (see world_broadcast_loop)
+        self.projectiles = ProjectileSim(PROJECTILE_SERVER_POOL, PROJECTILE_LIFETIME, PROJECTILE_SIZE[0], PROJECTILE_SIZE[1])
+        self.projectiles.next_id = first_projectile_id
+        self.entities = EntityTable(MAX_ENTITIES)
+
+    @property
+    def taken(self):
+        """Players in the instance, and places being kept for players on their way."""
+        now = time.monotonic()
+        for sid in [sid for sid, until in self.reserved.items() if until < now]:
+            del self.reserved[sid]   # they never arrived (the connection failed)
+        return len(self.world) + len(self.reserved)
+
+    @property
+    def full(self):
+        return self.taken >= self.cap
+
+    def sheet_refs(self):
+        """sheet hash -> how many of this instance's players use it"""
+        refs = {}
+        for p in self.world.values():
+            h = p.get("appearance", {}).get("hash", "")
+            if h:
+                refs[h] = refs.get(h, 0) + 1
+        return refs
+
+    def report(self):
+        return {"name": self.name, "players": len(self.world), "reserved": len(self.reserved), "cap": self.cap,
+                "sheets": len(self.sheet_refs()), "projectiles": len(self.projectiles.active),
+                **self.entities.report()}
+
+
+class Lobby:
+    def __init__(self, cap=INSTANCE_CAP, caps=INSTANCE_CAPS, max_instances=MAX_INSTANCES, default=DEFAULT_INSTANCE):
+        self.cap = cap
+        self.caps = caps                 # name -> cap, for instances that need a different size
+        self.max_instances = max_instances
+        self.default = default
+        self.instances = {}              # name -> Instance
+        self.of = {}                     # sid -> Instance they are in
+        self.first_projectile_id = 1     # the server sets this per worker, so projectile ids don't clash
+
+    def get(self, name):
+        """The instance called name, made if it doesn't exist yet."""
+        inst = self.instances.get(name)
+        if inst is None:
+            if len(self.instances) >= self.max_instances:
+                raise LobbyFull(f"the server already has {self.max_instances} instances")
+            inst = self.instances[name] = Instance(name, self.caps.get(name, self.cap), self.first_projectile_id)
+        return inst
+
+    def choose(self, wanted="", reserve_for=None, keep_for=5.0):
+        """
+        Which instance a new player goes in: the one they asked for, else the fullest with room.
+        reserve_for: a sid to keep the place for (for up to keep_for seconds) until join() is called for them.
+        """
+        inst = self._pick(clean_instance_name(wanted))
+        if reserve_for is not None:
+            inst.reserved[reserve_for] = time.monotonic() + keep_for
+        return inst
+
+    def _pick(self, name):
+        if name:
+            inst = self.get(name)
+            if inst.full:
+                raise LobbyFull(f"{name} is full ({inst.cap} players)")
+            return inst
+        open_ones = [inst for inst in self.instances.values() if not inst.full]
+        if open_ones:
+            return max(open_ones, key=lambda inst: (inst.taken, inst.name == self.default))
+        n = 1
+        name = self.default
+        while name in self.instances:
+            n += 1
+            name = f"{self.default}-{n}"
+        return self.get(name)
+
+    def join(self, sid, inst, player):
+        self.leave(sid)
+        inst.reserved.pop(sid, None)
+        inst.world[sid] = player
+        self.of[sid] = inst
+
+    def leave(self, sid):
+        """Take sid out of their instance. Returns the instance (None if they weren't in one)."""
+        for kept in self.instances.values():
+            kept.reserved.pop(sid, None)
+        inst = self.of.pop(sid, None)
+        if inst is not None:
+            inst.world.pop(sid, None)
+        return inst
+
+    def tidy(self, inst):
+        """Forget an instance once everybody has left it and its last projectiles have landed."""
+        if not inst.taken and not inst.projectiles.active and self.instances.get(inst.name) is inst:
+            del self.instances[inst.name]
+
+    def report(self):
+        return [inst.report() for inst in sorted(self.instances.values(), key=lambda inst: inst.name)]
@@ -0,0 +1,139 @@
+# map_data.py
+# Loads the campus map file (maps/campus.json).
+#
+# Map file format:
+# {"rooms": [{"name": "cafeteria",            unique room name
+#             "image": "maps/cafeteria.png",   background image for the room
+#             "x": 640, "y": 560,              world position of the centre of the room
+#             "width": 1024, "height": 1024,   size of the image in pixels
+#             "hitboxes": [[[x, y], ...], ...] hitbox polygons in the image's own coordinates
+#             "spawns": [{"type": "Crate", "x": 100, "y": 200, "args": {...}}]}]}
+#                                              entities created when the room loads. x/y are in the
+#                                              image's coordinates, type is a class name from student_code
+#
+# "Cooking" a map (python -m modules.map_data maps/campus.json) writes maps/campus.cooked with the
+# collision layers already rasterised, so loading skips that work. load_map uses the cooked file
+# whenever it is newer than the json.
+import json, os, struct, sys, zlib
+from modules.collision import CollisionLayer, DEFAULT_CELL
+
+COOKED_MAGIC = b"SMAPCK1\n"
+
+class RoomData:
+    def __init__(self, name, image, x, y, width, height, hitboxes, spawns=None, layer_blob=None, layer_cell=DEFAULT_CELL):
+        self.name = name
+        self.image = image
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.hitboxes = [[tuple(p) for p in hitbox] for hitbox in hitboxes]
+        self.spawns = spawns or []
+        self._layer = None
+        self._layer_blob = layer_blob   # compressed cells from a cooked map
+        self._layer_cell = layer_cell
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["name"], d["image"], d["x"], d["y"], d["width"], d["height"], d.get("hitboxes", []), d.get("spawns", []))
+
+    def to_dict(self):
+        return {"name": self.name, "image": self.image, "x": self.x, "y": self.y, "width": self.width,
+                "height": self.height, "hitboxes": [[list(p) for p in h] for h in self.hitboxes], "spawns": self.spawns}
+
+    def at(self, x, y):
+        """A copy of this room placed at a different world position."""
+        room = RoomData(self.name, self.image, x, y, self.width, self.height, self.hitboxes, self.spawns,
+                        self._layer_blob, self._layer_cell)
+        room._layer = self._layer
+        return room
+
+    def bounds(self):
+        """(left, top, right, bottom) of the room in world coordinates."""
+        left = self.x - self.width // 2
+        top = self.y - self.height // 2
+        return left, top, left + self.width, top + self.height
+
+    def distance_to(self, x, y):
+        """How far the world point (x, y) is from the edge of the room (0 if it's inside)."""
+        left, top, right, bottom = self.bounds()
+        dx = max(left - x, 0, x - right)
+        dy = max(top - y, 0, y - bottom)
+        return (dx * dx + dy * dy) ** 0.5
+
+    def collision_layer(self):
+        if self._layer is None:
+            if self._layer_blob is not None:
+                self._layer = CollisionLayer.from_cells(self.width, self.height, self._layer_cell,
+                                                        zlib.decompress(self._layer_blob))
+            else:
+                self._layer = CollisionLayer.from_polygons(self.hitboxes, self.width, self.height)
+        return self._layer
+
+
+def cooked_path(path):
+    return os.path.splitext(path)[0] + ".cooked"
+
+def load_map(path):
+    """Return {room name: RoomData} for a map file, using the cooked version if it's up to date."""
+    cooked = cooked_path(path)
+    if os.path.exists(cooked) and os.path.getmtime(cooked) >= os.path.getmtime(path):
+        try:
+            return _load_cooked(cooked)
+        except (OSError, ValueError, zlib.error, struct.error) as e:
+            print(f"[map] ignoring {cooked}: {e}")
+    return load_map_json(path)
+
+def cook_map(path, out=None):
+    """Write a cooked copy of the map with every room's collision layer already rasterised."""
+    rooms = load_map_json(path)
+    out = out or cooked_path(path)
+    header = {"rooms": []}
+    blobs = []
+    offset = 0
+    for room in rooms.values():
+        layer = room.collision_layer()
+        blob = zlib.compress(bytes(layer.cells), 9)
+        d = room.to_dict()
+        d["layer"] = {"cell": layer.cell, "offset": offset, "length": len(blob)}
+        header["rooms"].append(d)
+        blobs.append(blob)
+        offset += len(blob)
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    with open(out, "wb") as f:
+        f.write(COOKED_MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        for blob in blobs:
+            f.write(blob)
+    return out
+
+def load_map_json(path):
+    with open(path) as f:
+        data = json.load(f)
+    return {d["name"]: RoomData.from_dict(d) for d in data.get("rooms", [])}
+
+def _load_cooked(path):
+    with open(path, "rb") as f:
+        raw = f.read()
+    if not raw.startswith(COOKED_MAGIC):
+        raise ValueError("not a cooked map")
+    pos = len(COOKED_MAGIC)
+    (header_len,) = struct.unpack_from("<I", raw, pos)
+    pos += 4
+    header = json.loads(raw[pos:pos + header_len].decode("utf-8"))
+    pos += header_len
+    rooms = {}
+    for d in header["rooms"]:
+        layer = d["layer"]
+        start = pos + layer["offset"]
+        room = RoomData.from_dict(d)
+        room._layer_blob = raw[start:start + layer["length"]]
+        room._layer_cell = layer["cell"]
+        rooms[room.name] = room
+    return rooms
+
+
+if __name__ == "__main__":
+    for map_path in sys.argv[1:] or ["maps/campus.json"]:
+        print("Cooked", cook_map(map_path))
@@ -1,8 +1,12 @@
 # network_client.py
-import time
+import threading, time, uuid
+from collections import deque
 import socketio
 from modules.entities import Other_Player  # <-- use your class
-from modules.settings import PLAYER_START_X, PLAYER_START_Y
+from modules.settings import PLAYER_START_X, PLAYER_START_Y, NET_CONNECT_TIMEOUT, NET_RETRY_SECONDS
+from modules.settings import CLOCK_PING_INTERVAL, CLOCK_PING_FAST
+from modules.clock_sync import ClockSync
+from modules.replication import EntityReplicator
 from modules.assets_net import *  # functions to manage client sprite sheets
 
 def hex_to_rgb(h: str):
@@ -18,9 +22,10 @@ def get_xy(player):
     return player.rect.x, player.rect.y
 
 class NetClient:
-    def __init__(self, state, server_url, name="Player", color="#64b5f6"):
+    def __init__(self, state, server_url, name="Player", color="#64b5f6", instance=""):
         self.state = state
         self.url = server_url
+        self.instance = instance   # room instance to join ("" lets the server choose); then the one we're in
         self.name = name
         self.color = color
         self.sio = socketio.Client()
@@ -29,25 +34,47 @@ class NetClient:
         self.last_emit = 0.0
         self.emit_interval = 1 / 30.0
         self._last_pos = None          # for local movement deltas
+        self.move_fixes = deque()      # (dx, dy) the server cut off our moves, applied by apply_move_fixes
         self._prev_remote_pos = {}     # sid -> (x,y) to drive other players' animation
         self.sheet_cache = {}   # hash -> {"frames": [Surfaces], "meta": {...}}
         self._pending_ops = {}  # sid -> sheet_hash waiting to apply
+        self.handlers = {}      # message name -> handler, so replays can call them directly
+        self.deferred = None    # a deque when messages should wait for the game thread (record/replay)
+        self._stop_trying = threading.Event()   # set to stop connect_in_background
+        self.player_id = uuid.uuid4().hex   # lets the server put us back where we were if it restarts
+        self._upload = None     # our sheet, sent when the server says it wants it ("sheet_want")
+        self.clock = ClockSync()   # ping (clock.rtt), jitter and the server's clock (clock.offset, server_time())
+        self._ping_loops = 0       # counts connections, so an old ping loop stops after a reconnect
+        self.entities = EntityReplicator(self)   # shares state.entities_group (see replication.py)
+        self.last_entity_emit = 0.0
 
         # --- handlers ---
         def on_connect():
             self.my_sid = self.sio.get_sid()
             self.connected = True
             print("connected:", self.my_sid)
+            # every time we connect (socketio reconnects by itself after the server restarts), ask if the
+            # server has our sheet; the bytes are only uploaded if it answers "sheet_want"
+            if self._upload:
+                self.sio.emit("sheet_offer", {"hash": self._upload["hash"]})
+            self._ping_loops += 1
+            self.sio.start_background_task(self._ping_loop, self._ping_loops)
+            self.entities.inbox.append(("reset", None))   # the server may be new: register our entities again
 
         def on_chat(msg):
             # msg: {"from": "...", "sid": "...", "text": "..."}
-            msg = f'{msg.get("from", "")}: {msg.get("text", "")}'
-            if state.message_list == "":
-                self.state.message_list = msg 
-            else:
-                self.state.message_list = self.state.message_list  + "\n" + msg 
+            # just queue the text, the chat panel is redrawn on the game thread
+            self.state.chat.add(f'{msg.get("from", "")}: {msg.get("text", "")}')
 
         def on_world(world):
+            # timed as "net_apply" by the profiler (runs on the socket.io thread, so it goes through sample())
+            start = time.perf_counter()
+            try:
+                apply_world(world)
+            finally:
+                self.state.profiler.sample("net_apply", start, time.perf_counter() - start)
+
+        def apply_world(world):
             # world: { sid: {"x","y","name","color"} }
             self.state.player_data.clear()
 
@@ -146,13 +173,7 @@ class NetClient:
                 return
             meta = payload.get("meta", {}) or {}
             surf = load_surface_from_png_bytes(png)
-            frames = frames_from_surface(
-                surf,
-                cols=int(meta.get("cols", 9)),
-                count=int(meta.get("count", 1)),
-                pad=int(meta.get("pad", 0)),
-                scale=float(meta.get("scale", 1.0)),
-            )
+            frames = frames_from_meta(surf, meta)   # grid sheet, or trimmed/packed sheet with an atlas
             self.sheet_cache[h] = {"frames": frames, "meta": meta}
 
             # apply to any remote players waiting on this hash
@@ -162,19 +183,113 @@ class NetClient:
                     op.apply_frames(frames)
                     del self._pending_ops[sid]
 
+        def on_sheet_want(data):
+            # the server doesn't have our sheet yet (it does after a restart, from its saved state)
+            app = self._upload
+            if not self.connected or not app or data.get("hash") != app["hash"]:
+                return
+            self.sio.emit("sheet_register", {
+                "hash": app["hash"],
+                "meta": {"count": app["count"], "cols": app["cols"], "pad": app["pad"], "scale": app["scale"],
+                         "atlas": app["atlas"]},
+                "png_b64": app["register_b64"],
+            })
+            # Nudge peers to re-check (handles race where they asked before bytes existed)
+            self.sio.emit("set_appearance", {"hash": app["hash"]})
+
+        def on_clock_pong(data):
+            # data: {"seq", "t0": our perf_counter() when we pinged, "server": server time}
+            try:
+                self.clock.add_sample(float(data["t0"]), float(data["server"]), time.perf_counter())
+            except (KeyError, TypeError, ValueError):
+                pass
+
+        def on_projectile_spawn(data):
+            # data: {"id","owner","seq","t","x","y","vx","vy"} - queued, the pool is changed on the game thread
+            self.state.projectiles_group.net_events.append(("spawn", data))
+
+        def on_projectile_end(data):
+            # data: {"ended": [[id, target sid or "", owner sid], ...], "t"} - one message per server tick
+            self.state.projectiles_group.net_events.append(("end", data.get("ended", [])))
+
+        def on_entity_ids(data):
+            # data: {"entities": [{"id","key","type","owner","fields"}, ...]} - the reply to entity_register
+            self.entities.inbox.append(("ids", data))
+
+        def on_entities(data):
+            # data: {"t","changed","by","spawned","removed","owners"} - one message per server tick
+            self.entities.inbox.append(("entities", data))
+
+        def on_instance(data):
+            # data: {"name", "players", "cap"} - which room instance the server put us in. Remembered, so
+            # a reconnect (e.g. after the server restarts) asks for the same one
+            self.instance = data.get("name", self.instance)
+            print(f"instance: {self.instance} ({data.get('players')}/{data.get('cap')} players)")
+
+        def on_connect_error(data):
+            # e.g. the instance we asked for is full; connect_in_background keeps trying
+            if isinstance(data, dict) and data.get("message"):
+                print("The server turned us away:", data["message"])
+
+        def on_move_clamped(data):
+            # data: {"dx", "dy"} - the part of a move the server didn't allow (we went faster than
+            # PLAYER_SPEED). Queued: the player is only moved on the game thread
+            self.move_fixes.append((data.get("dx", 0), data.get("dy", 0)))
+
         def on_disconnect():
             self.connected = False
             print("disconnected")
 
+        self._on("world", on_world)
+        self._on("chat", on_chat)
+        self._on("sheet_bytes", on_sheet_bytes)
+        self._on("sheet_want", on_sheet_want)
+        self._on("projectile_spawn", on_projectile_spawn)
+        self._on("projectile_end", on_projectile_end)
+        self._on("entity_ids", on_entity_ids)
+        self._on("entities", on_entities)
+        self._on("instance", on_instance)
+        self._on("move_clamped", on_move_clamped)
+        # not through _on: these only mean something live (a replay never connects, and the pong's
+        # times are this run's), so replays don't record them
         self.sio.on("connect", on_connect)
-        self.sio.on("world", on_world)
         self.sio.on("disconnect", on_disconnect)
-        self.sio.on("chat", on_chat)
-        self.sio.on("sheet_bytes", on_sheet_bytes)
+        self.sio.on("clock_pong", on_clock_pong)
+        self.sio.on("connect_error", on_connect_error)
+
+    def _on(self, name, handler):
+        # every message goes through here so a replay can record it (see replay.py)
+        self.handlers[name] = handler
+        def dispatch(*args):
+            if self.deferred is not None:
+                self.deferred.append((name, args))   # applied by apply_deferred on the game thread
+            else:
+                handler(*args)
+        self.sio.on(name, dispatch)
+
+    def apply_deferred(self, recorder=None, tick=0):
+        """Apply queued messages now (record/replay mode). recorder.net() is told about each one."""
+        while self.deferred:
+            name, args = self.deferred.popleft()
+            if recorder is not None:
+                recorder.net(tick, name, args)
+            self.handlers[name](*args)
     
     def send_chat(self, text: str):
         self.sio.emit("chat", {"text": text})
 
+    def request_sheet(self, sheet_hash):
+        # the reply comes back as "sheet_bytes". Not sent when replaying (the reply is in the replay file)
+        if self.connected:
+            self.sio.emit("sheet_get", {"hash": sheet_hash})
+
+    def send_shoot(self, seq, vx, vy):
+        # the server fires from where it thinks we are, so only the direction and our shot number are sent
+        try:
+            self.sio.emit("shoot", {"seq": seq, "vx": vx, "vy": vy})
+        except Exception as e:
+            print("emit failed:", e)
+
     def _get_spawn_xy(self):
         p = self.state.player
         if p is None:
@@ -215,12 +330,13 @@ class NetClient:
     #     print("[APP] sheet_register sent:", app["hash"]) # debug code: working out why custom sprite sheet isn't being applied over the network 29/9/2025
     #     return True
 
-    def connect(self, timeout=0.6) -> bool:
+    def connect(self, timeout=0.6, quiet=False) -> bool:
         # new connect routine to fix sprite_sheets not sending over network. Delete the above commented out one if this works
         app = self._my_appearance()  # {"hash","count","cols","pad","scale","register_b64"}
         auth_app = {k: app[k] for k in ("hash","count","cols","pad","scale")}  # strip register_b64
 
         x0, y0 = self._get_spawn_xy()
+        self._upload = app if app.get("hash") and app.get("register_b64") else None
         try:
             self.sio.connect(
                 self.url,
@@ -228,6 +344,8 @@ class NetClient:
                     "name": self.name,
                     "color": self.color,
                     "x": x0, "y": y0,
+                    "id": self.player_id,
+                    "instance": self.instance,
                     "appearance": auth_app,                  # ← send metadata here
                 },
                 wait=True,
@@ -235,27 +353,38 @@ class NetClient:
                 transports=["websocket"],
             )
         except Exception as e:
-            print(f"No server at {self.url}; running offline. ({e})")
+            if not quiet:
+                print(f"No server at {self.url}; running offline. ({e})")
             self.connected = False
             return False
 
-        # Upload the PNG bytes after we’re connected (if available)
-        if app.get("hash") and app.get("register_b64"):
-            self.sio.emit("sheet_register", {
-                "hash": app["hash"],
-                "meta": {"count": app["count"], "cols": app["cols"], "pad": app["pad"], "scale": app["scale"]},
-                "png_b64": app["register_b64"],
-            })
-            # Nudge peers to re-check (handles race where they asked before bytes existed)
-            self.sio.emit("set_appearance", {"hash": app["hash"]})
-
         return True
 
 
+    def connect_in_background(self, timeout=NET_CONNECT_TIMEOUT, retry=NET_RETRY_SECONDS):
+        """
+        Keep trying to connect on another thread until it works, so the game never waits for the server.
+        The game checks self.connected each frame and switches to client mode when it becomes True.
+        """
+        def keep_trying():
+            quiet = False
+            while not self._stop_trying.is_set():
+                if self.connect(timeout=timeout, quiet=quiet):
+                    return
+                quiet = True   # only say "No server" once
+                self._stop_trying.wait(retry)
+        threading.Thread(target=keep_trying, name="net-connect", daemon=True).start()
+
     def tick_send_move(self):
         if not self.connected or self.my_sid is None or self.state.player is None:
             return
         now = time.time()
+        if now - self.last_entity_emit >= self.emit_interval:
+            try:
+                self.entities.flush()
+                self.last_entity_emit = now
+            except Exception as e:
+                print("emit failed:", e)
         if now - self.last_emit < self.emit_interval:
             return
         x, y = get_xy(self.state.player)
@@ -271,7 +400,40 @@ class NetClient:
             except Exception as e:
                 print("emit failed:", e)
 
+    def apply_move_fixes(self):
+        """
+        Called at the start of a tick: take back the parts of our moves the server cut off. _last_pos moves
+        back by the same amount, so moves already on their way are still counted once.
+        """
+        p = self.state.player
+        while self.move_fixes:
+            dx, dy = self.move_fixes.popleft()
+            if p is None:
+                continue
+            p.x -= dx
+            p.y -= dy
+            if self._last_pos is not None:
+                self._last_pos = (self._last_pos[0] - dx, self._last_pos[1] - dy)
+
+    def _ping_loop(self, loop_number):
+        """Runs on its own thread while connected: a clock_ping every CLOCK_PING_INTERVAL (faster at first)."""
+        seq = 0
+        while self.connected and loop_number == self._ping_loops:
+            seq += 1
+            ping = {"seq": seq, "t0": time.perf_counter()}
+            ping.update({k: v for k, v in self.clock.report().items() if k.endswith("_ms")})   # for the server's /net page
+            try:
+                self.sio.emit("clock_ping", ping)
+            except Exception:
+                return
+            self.sio.sleep(CLOCK_PING_INTERVAL / 5 if seq <= CLOCK_PING_FAST else CLOCK_PING_INTERVAL)
+
+    def server_time(self):
+        """The server's clock now (its time.time()), worked out from ours. Only meaningful once clock.synced."""
+        return self.clock.server_time()
+
     def close(self):
+        self._stop_trying.set()
         try:
             self.sio.disconnect()
         except Exception:
@@ -287,9 +449,10 @@ class NetClient:
         scale = float(getattr(P, "SHEET_SCALE", 1.0))
         # compute hash/bytes if possible
         sheet_path = getattr(P, "SHEET", None)
-        h = ""; b64 = ""
+        h = ""; b64 = ""; atlas = None
         try:
             if sheet_path:
+                atlas = packed_atlas(sheet_path)  # frame positions for sheets packed with --mode maxrects
                 with open(sheet_path, "rb") as f:
                     b = f.read()
                 if len(b) <= MAX_SHEET_BYTES and is_png(b):
@@ -298,12 +461,12 @@ class NetClient:
                     # cache our own frames locally now
                     if h not in self.sheet_cache:
                         surf = load_surface_from_png_bytes(b)
-                        frames = frames_from_surface(surf, cols=cols, count=count, pad=pad, scale=scale)
-                        self.sheet_cache[h] = {"frames": frames, "meta": {"cols": cols, "count": count, "pad": pad, "scale": scale}}
+                        meta = {"cols": cols, "count": count, "pad": pad, "scale": scale, "atlas": atlas}
+                        self.sheet_cache[h] = {"frames": frames_from_meta(surf, meta), "meta": meta}
         except Exception:
             pass
 
         return {
-            "hash": h, "count": count, "cols": cols, "pad": pad, "scale": scale,
+            "hash": h, "count": count, "cols": cols, "pad": pad, "scale": scale, "atlas": atlas,
             "register_b64": b64,   # empty if not available/too big
         }
\ No newline at end of file
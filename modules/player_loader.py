@@ -25,6 +25,13 @@ def _load_student_module():
         return mod
     return None
 
+def player_class():
+    """The class make_player will use (the student's Player if there is one), without making a player."""
+    mod = _load_student_module()
+    if mod and hasattr(mod, "Player"):
+        return mod.Player
+    return BasePlayer
+
 def make_player(color, projectiles_group, screen, x=PLAYER_START_X, y=PLAYER_START_Y):
     mod = _load_student_module()
     if mod and hasattr(mod, "Player"):
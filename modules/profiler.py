@@ -0,0 +1,161 @@
+# profiler.py
+# Frame-time profiler for finding out what makes the game stutter.
+# Wrap a phase of the game loop in profiler.begin("name") / profiler.end("name"). Those are for the
+# game thread only; other threads (e.g. socket.io's) time things themselves and hand them to sample().
+# When the profiler is switched off, begin/end return straight away so the calls can stay in the
+# game loop all the time. Press F3 in game to switch it on and show the graph, F4 to save a trace
+# file that can be opened in chrome://tracing or https://ui.perfetto.dev
+import json, os, threading, time
+from collections import deque
+import pygame
+from modules.settings import FPS, PROFILER_ENABLED, PROFILER_HISTORY, PROFILER_MAX_EVENTS
+
+# Phases stacked in the graph, bottom to top. "update" is only the part of update_game_state that
+# isn't already counted by input/entities/interactions/collision/replicate.
+PHASE_COLOURS = {
+    "events":       (120, 120, 255),
+    "input":        (80, 200, 255),
+    "entities":     (80, 255, 160),
+    "interactions": (200, 255, 80),
+    "collision":    (255, 200, 60),
+    "replicate":    (60, 200, 200),
+    "update":       (40, 160, 40),
+    "send_move":    (255, 120, 60),
+    "draw":         (255, 80, 160),
+    "flip":         (180, 80, 255),
+    "net_apply":    (255, 255, 255),
+}
+UPDATE_SUBPHASES = ("input", "entities", "interactions", "collision", "replicate")
+
+class Profiler():
+    def __init__(self, enabled=PROFILER_ENABLED, history=PROFILER_HISTORY, max_events=PROFILER_MAX_EVENTS,
+                 graph_height=100, graph_ms=2000.0 / FPS):
+        self.enabled = enabled
+        self.history = deque(maxlen=history)      # one {phase: seconds} dict per frame
+        self.events = deque(maxlen=max_events)    # (name, thread id, start, duration) for the trace file
+        self.frame = {}                           # phase -> seconds spent in it so far this frame
+        self._starts = {}                         # phase -> perf_counter() when begin() was called
+        self.incoming = deque()                   # (name, thread id, start, duration) from other threads
+        self._t0 = time.perf_counter()
+        self.graph_height = graph_height
+        self.graph_ms = graph_ms                  # milliseconds shown by the full height of the graph
+        self.graph = None                         # scrolling graph surface, one column per frame
+        self.legend = None
+        self.font = None
+        self._frames_since_legend = 0
+        self.notes = {}                           # name -> a line of text shown under the legend (e.g. the ping)
+
+    # ----- timing -----
+    def begin(self, name):
+        if not self.enabled:
+            return
+        self._starts[name] = time.perf_counter()
+
+    def end(self, name):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        start = self._starts.pop(name, None)
+        if start is None:
+            return
+        duration = now - start
+        self.frame[name] = self.frame.get(name, 0.0) + duration
+        self.events.append((name, threading.get_ident(), start, duration))
+
+    def sample(self, name, start, duration):
+        """A section timed on another thread. Queued (appending to a deque is thread safe) for end_frame()."""
+        if self.enabled:
+            self.incoming.append((name, threading.get_ident(), start, duration))
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        while self.incoming:
+            name, tid, start, duration = self.incoming.popleft()
+            self.frame[name] = self.frame.get(name, 0.0) + duration
+            self.events.append((name, tid, start, duration))
+        frame, self.frame = self.frame, {}
+        self.history.append(frame)
+        if self.graph is not None:
+            self._add_column(frame)
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.frame = {}
+        self._starts.clear()
+        self.incoming.clear()
+        self.graph = None
+        self.legend = None
+
+    # ----- on-screen graph -----
+    def _add_column(self, frame):
+        # scroll the existing graph one pixel left and only draw the newest frame's column
+        g = self.graph
+        w, h = g.get_size()
+        g.scroll(-1, 0)
+        g.fill((0, 0, 0, 160), (w - 1, 0, 1, h))
+        px_per_s = h / (self.graph_ms / 1000.0)
+        y = h
+        for phase, colour in PHASE_COLOURS.items():
+            t = frame.get(phase, 0.0)
+            if phase == "update":
+                t -= sum(frame.get(sub, 0.0) for sub in UPDATE_SUBPHASES)
+            if t <= 0:
+                continue
+            top = max(0, y - int(t * px_per_s + 0.5))
+            if top < y:
+                g.fill(colour, (w - 1, top, 1, y - top))
+            y = top
+        # frame budget line (1/FPS)
+        budget_y = h - int((1.0 / FPS) * px_per_s)
+        g.set_at((w - 1, budget_y), (255, 0, 0))
+
+    def _make_legend(self):
+        frames = list(self.history)
+        lines = []
+        for phase, colour in PHASE_COLOURS.items():
+            avg = sum(f.get(phase, 0.0) for f in frames) / max(1, len(frames))
+            lines.append((f"{phase}: {avg * 1000:.2f} ms", colour))
+        total = sum(sum(v for k, v in f.items() if k in PHASE_COLOURS and k not in UPDATE_SUBPHASES) for f in frames)
+        lines.append((f"total: {total * 1000 / max(1, len(frames)):.2f} ms", (255, 255, 255)))
+        lines.extend((text, (255, 255, 255)) for text in self.notes.values())
+        lh = self.font.get_linesize()
+        width = max([170] + [self.font.size(text)[0] + 8 for text, _ in lines])
+        self.legend = pygame.Surface((width, lh * len(lines)), pygame.SRCALPHA)
+        self.legend.fill((0, 0, 0, 160))
+        for i, (text, colour) in enumerate(lines):
+            self.legend.blit(self.font.render(text, True, colour), (4, i * lh))
+
+    def draw(self, screen, x=10, y=10):
+        if not self.enabled:
+            return
+        if self.graph is None:
+            self.graph = pygame.Surface((self.history.maxlen, self.graph_height), pygame.SRCALPHA)
+            self.graph.fill((0, 0, 0, 160))
+            self.font = self.font or pygame.font.Font(None, 18)
+        self._frames_since_legend += 1
+        if self.legend is None or self._frames_since_legend >= 30:  # refresh the numbers twice a second
+            self._make_legend()
+            self._frames_since_legend = 0
+        screen.blit(self.graph, (x, y))
+        screen.blit(self.legend, (x + self.graph.get_width() + 4, y))
+
+    # ----- trace export -----
+    def export_trace(self, path=None):
+        """Write the recorded events as a Chrome trace JSON file and return its path."""
+        if path is None:
+            path = time.strftime("profile_trace_%Y%m%d_%H%M%S.json")
+        pid = os.getpid()
+        main_tid = threading.main_thread().ident
+        trace = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": main_tid, "args": {"name": "game loop"}},
+        ]
+        for name, tid, start, duration in list(self.events):
+            trace.append({
+                "name": name, "cat": "game", "ph": "X", "pid": pid, "tid": tid,
+                "ts": (start - self._t0) * 1e6,   # microseconds
+                "dur": duration * 1e6,
+            })
+        with open(path, "w") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+        return path
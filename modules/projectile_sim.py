@@ -0,0 +1,130 @@
+# projectile_sim.py
+# Projectile simulation shared by the game and the server.
+# All projectiles come from a pool made at the start, so firing never creates new objects; when a
+# projectile dies it goes back on the free list to be reused. Velocities are in pixels per simulation
+# tick (SIM_RATE ticks per second) on both sides so the client's prediction matches the server.
+from math import isfinite
+from modules.config import PLAYER_HITBOX
+
+class PooledProjectile:
+    __slots__ = ("id", "seq", "owner", "x", "y", "vx", "vy", "age", "index")
+
+    def __init__(self):
+        self.id = None      # id given by the server (None for a client prediction not confirmed yet)
+        self.seq = 0        # the shooter's own shot number, used to match predictions to the server's copy
+        self.owner = ""     # sid of the shooter
+        self.x = 0.0        # world position of the centre
+        self.y = 0.0
+        self.vx = 0.0
+        self.vy = 0.0
+        self.age = 0        # ticks since it was fired
+        self.index = -1     # position in ProjectileSim.active, -1 when not in use
+
+
+class ProjectileSim:
+    def __init__(self, size, lifetime, width=60, height=20, assign_ids=True):
+        self.lifetime = lifetime            # ticks before a projectile expires
+        self.assign_ids = assign_ids        # the server numbers projectiles, clients wait to be told the id
+        self.half_w = width / 2
+        self.half_h = height / 2
+        self.free = [PooledProjectile() for _ in range(size)]
+        self.active = []
+        self.by_id = {}
+        self.next_id = 1
+
+    def __len__(self):
+        return len(self.active)
+
+    def __iter__(self):
+        return iter(self.active)
+
+    def spawn(self, x, y, vx, vy, owner="", pid=None, seq=0):
+        if not self.free:
+            # pool is full: recycle the oldest projectile
+            self.kill(max(self.active, key=lambda a: a.age))
+        p = self.free.pop()
+        if pid is None and self.assign_ids:
+            pid = self.next_id
+            self.next_id += 1
+        p.id, p.seq, p.owner = pid, seq, owner
+        p.x, p.y, p.vx, p.vy, p.age = float(x), float(y), float(vx), float(vy), 0
+        p.index = len(self.active)
+        self.active.append(p)
+        if pid is not None:
+            self.by_id[pid] = p
+        return p
+
+    def set_id(self, p, pid):
+        if p.id is not None:
+            self.by_id.pop(p.id, None)
+        p.id = pid
+        self.by_id[pid] = p
+
+    def kill(self, p):
+        if p.index < 0:
+            return
+        # swap the last active projectile into this one's place so removing is O(1)
+        last = self.active.pop()
+        if last is not p:
+            self.active[p.index] = last
+            last.index = p.index
+        p.index = -1
+        if p.id is not None:
+            self.by_id.pop(p.id, None)
+        self.free.append(p)
+
+    def kill_id(self, pid):
+        p = self.by_id.get(pid)
+        if p is not None:
+            self.kill(p)
+
+    def clear(self):
+        """Remove every projectile. Returns [(id, "", owner)] for them, like step()."""
+        ended = [(p.id, "", p.owner) for p in self.active]
+        for p in list(self.active):
+            self.kill(p)
+        return ended
+
+    def step(self, blocked=None):
+        """Move every projectile one tick. Returns [(id, "", owner)] for ones that expired or hit a wall."""
+        ended = []
+        lifetime = self.lifetime
+        for p in list(self.active):
+            p.x += p.vx
+            p.y += p.vy
+            p.age += 1
+            if p.age > lifetime or not (isfinite(p.x) and isfinite(p.y)) or \
+                    (blocked is not None and blocked(p.x, p.y)):
+                ended.append((p.id, "", p.owner))
+                self.kill(p)
+        return ended
+
+    def hit_players(self, players, player_size=PLAYER_HITBOX, cell=128):
+        """
+        Check every projectile against every player in one pass. players is {sid: {"x", "y"}} in
+        world coordinates. Players are put into a grid first so each projectile only looks at the
+        players near it. Returns [(projectile id, sid hit, owner)] and removes those projectiles.
+        """
+        if not self.active or not players:
+            return []
+        grid = {}
+        for sid, pl in players.items():
+            grid.setdefault((int(pl["x"] // cell), int(pl["y"] // cell)), []).append((sid, pl["x"], pl["y"]))
+        reach_x = self.half_w + player_size / 2
+        reach_y = self.half_h + player_size / 2
+        hits = []
+        for p in list(self.active):
+            cx, cy = int(p.x // cell), int(p.y // cell)
+            target = None
+            for gx in (cx - 1, cx, cx + 1):
+                for gy in (cy - 1, cy, cy + 1):
+                    for sid, x, y in grid.get((gx, gy), ()):
+                        if sid != p.owner and abs(p.x - x) < reach_x and abs(p.y - y) < reach_y:
+                            target = sid
+                            break
+                    if target: break
+                if target: break
+            if target:
+                hits.append((p.id, target, p.owner))
+                self.kill(p)
+        return hits
@@ -0,0 +1,85 @@
+# rate_limit.py
+# Flood protection for the server. Every connected client gets a token bucket per message type:
+# the bucket holds up to `burst` tokens, refills at `rate` tokens a second, and each message uses one.
+# A client that sends faster than that just finds its bucket empty and the extra messages are dropped
+# (or, for "move", not broadcast). The counts are kept so the teacher can see who is flooding.
+import time
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "last")
+
+    def __init__(self, rate, burst, now=None):
+        self.rate = float(rate)      # tokens added per second
+        self.burst = float(burst)    # most tokens it can hold
+        self.tokens = float(burst)   # start full so a new client isn't throttled straight away
+        self.last = time.monotonic() if now is None else now
+
+    def refill(self, now=None):
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def take(self, amount=1.0, now=None):
+        """Use amount tokens if there are enough. Returns True if allowed."""
+        self.refill(now)
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+    def take_up_to(self, amount, now=None):
+        """Use as many whole tokens as there are, up to amount (a whole number). Returns how many were used."""
+        self.refill(now)
+        used = min(amount, int(self.tokens))
+        self.tokens -= used
+        return used
+
+
+class ClientLimits:
+    """All the buckets and throttle counters for one connected client."""
+    def __init__(self, limits, move_rate, move_burst):
+        self.limits = limits                       # event -> (per second, burst)
+        self.buckets = {}                          # made the first time each event is seen
+        self.movement = TokenBucket(move_rate, move_burst)   # pixels the player may move
+        self.dropped = {}                          # event -> messages over the limit
+        self.clamped = 0                           # moves that were further than PLAYER_SPEED allows
+        self.first_throttled = None                # time.time() of the first dropped message
+
+    def allow(self, event):
+        """True if this client may send another `event` message now. Events with no limit are always allowed."""
+        limit = self.limits.get(event)
+        if limit is None:
+            return True
+        bucket = self.buckets.get(event)
+        if bucket is None:
+            bucket = self.buckets[event] = TokenBucket(*limit)
+        if bucket.take():
+            return True
+        self.dropped[event] = self.dropped.get(event, 0) + 1
+        if self.first_throttled is None:
+            self.first_throttled = time.time()
+        return False
+
+    def clamp_move(self, dx, dy):
+        """
+        Shorten a move to what the player could really have walked since their last one.
+        Diagonal moves are allowed the full speed on both axes, like the Player classes do it.
+        Only whole pixels are used up, so the longer axis gets exactly what was paid for and any part
+        of a pixel left over stays in the bucket for the next move.
+        """
+        step = max(abs(dx), abs(dy))
+        if step == 0:
+            return dx, dy
+        allowed = self.movement.take_up_to(step)
+        if allowed >= step:
+            return dx, dy
+        self.clamped += 1
+        def shorten(d):
+            return abs(d) * allowed // step * (1 if d >= 0 else -1)   # whole numbers, towards zero
+        return shorten(dx), shorten(dy)
+
+    def total_dropped(self):
+        return sum(self.dropped.values())
+
+    def report(self):
+        return {"dropped": dict(self.dropped), "clamped": self.clamped, "first_throttled": self.first_throttled}
@@ -0,0 +1,98 @@
+# render.py
+# Draws the game world at a lower internal resolution and scales it up to the window once per frame.
+# Weak lab PCs spend most of each frame copying pixels, so drawing the world at 640x360 instead of
+# 1280x720 means a quarter of the work. Everything still uses the 1280x720 virtual screen coordinates
+# (WIDTH/HEIGHT) - WorldRenderer.blit converts them. UI (chat, HUD) is drawn afterwards straight onto
+# the window so text stays sharp.
+import weakref
+import pygame
+from modules.settings import WIDTH, HEIGHT, FPS, RENDER_SCALE, RENDER_SCALES, RENDER_AUTO_SCALE, RENDER_SMOOTH_UPSCALE
+
+class WorldRenderer():
+    def __init__(self, window, scale=RENDER_SCALE, auto_scale=RENDER_AUTO_SCALE, smooth=RENDER_SMOOTH_UPSCALE):
+        self.window = window
+        self.smooth = smooth
+        self.auto_scale = auto_scale
+        self.surface = window
+        self.scale = 1.0
+        # source image -> the same image shrunk to the current scale. Weak keys so entries
+        # disappear when a sprite's frames are thrown away.
+        self._scaled = weakref.WeakKeyDictionary()
+        # auto scale bookkeeping
+        self._fps_total = 0.0
+        self._fps_samples = 0
+        self._ms_since_change = 0
+        self.set_scale(scale)
+
+    def set_scale(self, scale):
+        scale = max(0.1, min(1.0, float(scale)))
+        if scale == self.scale:
+            return
+        self.scale = scale
+        self._scaled = weakref.WeakKeyDictionary()
+        if scale == 1.0:
+            self.surface = self.window    # no scaling, draw straight onto the window
+        else:
+            size = (max(1, int(WIDTH * scale)), max(1, int(HEIGHT * scale)))
+            self.surface = pygame.Surface(size).convert()
+        self._ms_since_change = 0
+
+    @property
+    def size(self):
+        return self.surface.get_size()
+
+    def _scaled_image(self, image):
+        small = self._scaled.get(image)
+        if small is None:
+            w, h = image.get_size()
+            small = pygame.transform.scale(image, (max(1, round(w * self.scale)), max(1, round(h * self.scale))))
+            self._scaled[image] = small
+        return small
+
+    def blit(self, image, dest, area=None, special_flags=0):
+        """Same as Surface.blit, but dest is in virtual screen (WIDTH x HEIGHT) coordinates."""
+        if self.scale == 1.0:
+            return self.window.blit(image, dest, area, special_flags)
+        s = self.scale
+        if area is not None:
+            area = pygame.Rect(area)
+            area = pygame.Rect(int(area.x * s), int(area.y * s), max(1, round(area.w * s)), max(1, round(area.h * s)))
+        x, y = dest[0], dest[1]
+        return self.surface.blit(self._scaled_image(image), (int(x * s), int(y * s)), area, special_flags)
+
+    def blits(self, blit_sequence, doreturn=False):
+        """Same as Surface.blits for a list of (image, (x, y)) in virtual screen coordinates."""
+        if self.scale == 1.0:
+            return self.window.blits(blit_sequence, doreturn)
+        s = self.scale
+        scaled = self._scaled_image
+        return self.surface.blits([(scaled(image), (int(x * s), int(y * s))) for image, (x, y) in blit_sequence], doreturn)
+
+    def present(self):
+        """Scale the world up to fill the window. Call once per frame, before drawing the UI."""
+        if self.surface is self.window:
+            return
+        if self.smooth:
+            pygame.transform.smoothscale(self.surface, self.window.get_size(), self.window)
+        else:
+            pygame.transform.scale(self.surface, self.window.get_size(), self.window)
+
+    def auto_adjust(self, fps, frame_ms):
+        """Drop to the next lower scale in RENDER_SCALES when we can't hold FPS, go back up when there's room."""
+        if not self.auto_scale or fps <= 0:
+            return
+        self._fps_total += fps
+        self._fps_samples += 1
+        self._ms_since_change += frame_ms
+        if self._fps_samples < FPS * 2:   # decide on roughly 2 seconds of frames
+            return
+        avg = self._fps_total / self._fps_samples
+        self._fps_total = 0.0
+        self._fps_samples = 0
+        lower = [s for s in RENDER_SCALES if s < self.scale]
+        higher = [s for s in RENDER_SCALES if s > self.scale]
+        if avg < FPS * 0.9 and lower:
+            self.set_scale(max(lower))
+        elif avg >= FPS * 0.98 and higher and self._ms_since_change > 10000:
+            # only try a sharper picture after 10 seconds of holding the target, to avoid flickering back and forth
+            self.set_scale(min(higher))
@@ -0,0 +1,194 @@
+# replay.py
+# Record and replay a game session, tick by tick.
+# The simulation only changes because of keyboard events and network messages, so those are all a
+# replay file needs. Both are tagged with the simulation tick they were applied before, and in record
+# and replay mode the game reads the keyboard from InputState (built from those same events) instead
+# of the real keyboard, and applies network messages on the game thread at the start of a frame.
+# Every CHECK_EVERY ticks the recorder also writes the player's position and a running checksum of
+# every tick's position and collision, so a replay can prove it ended up in exactly the same place.
+#
+# File format: JSON, one object per line.
+#   {"replay": 1, "seed": 1, "sim_rate": 60, "map": "...", "player": "Player", "my_sid": null}   header
+#   {"t": 12, "event": {"type": 768, "key": 100, "mod": 0, "unicode": "d"}}                         input
+#   {"t": 40, "net": "world", "args": [{...}]}                                                      network
+#   {"t": 60, "check": [x, y, collisions, crc]}                                                     checkpoint
+#   {"t": 600, "end": [x, y, collisions, crc]}                                                      last line
+# A file with only events in it works as a script for headless benchmarks.
+import json, random, zlib
+import pygame
+
+CHECK_EVERY = 60
+LIVE_ONLY = ("connect", "disconnect")   # recorded by older versions, but a replay never connects
+RECORDED_EVENTS = (pygame.KEYDOWN, pygame.KEYUP, pygame.TEXTINPUT, pygame.MOUSEWHEEL)
+
+def event_to_dict(event):
+    d = {"type": event.type}
+    for name in ("key", "mod", "scancode", "unicode", "text", "x", "y"):
+        if hasattr(event, name):
+            d[name] = getattr(event, name)
+    return d
+
+def event_from_dict(d):
+    d = dict(d)
+    return pygame.event.Event(d.pop("type"), d)
+
+
+class KeyState:
+    """Looks like the result of pygame.key.get_pressed(): keys[pygame.K_a] is True while A is down."""
+    def __init__(self, pressed):
+        self.pressed = pressed
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+    def __len__(self):
+        return 512
+
+
+class InputState:
+    """
+    The keyboard as seen by the simulation, built only from KEYDOWN/KEYUP events.
+    install() points pygame.key.get_pressed at it, so student Player code needs no changes.
+    """
+    def __init__(self):
+        self.pressed = set()
+        self._real_get_pressed = None
+
+    def handle_event(self, event):
+        if event.type == pygame.KEYDOWN:
+            self.pressed.add(event.key)
+        elif event.type == pygame.KEYUP:
+            self.pressed.discard(event.key)
+
+    def get_pressed(self):
+        return KeyState(self.pressed)
+
+    def install(self):
+        if self._real_get_pressed is None:
+            self._real_get_pressed = pygame.key.get_pressed
+            pygame.key.get_pressed = self.get_pressed
+
+    def uninstall(self):
+        if self._real_get_pressed is not None:
+            pygame.key.get_pressed = self._real_get_pressed
+            self._real_get_pressed = None
+
+
+class Checksum:
+    """Running checksum of the player's position and collisions, updated once per tick."""
+    def __init__(self):
+        self.crc = 0
+        self.collisions = 0
+
+    def add_tick(self, x, y, collided):
+        if collided:
+            self.collisions += 1
+        self.crc = zlib.crc32(f"{x!r},{y!r},{int(bool(collided))};".encode("ascii"), self.crc)
+
+    def value(self, x, y):
+        return [x, y, self.collisions, self.crc]
+
+
+class ReplayRecorder:
+    def __init__(self, path, header):
+        self.path = path
+        self.file = open(path, "w")
+        self.checksum = Checksum()
+        self._write(dict({"replay": 1}, **header))
+
+    def _write(self, obj):
+        self.file.write(json.dumps(obj, separators=(",", ":")) + "\n")
+
+    def event(self, tick, event):
+        if event.type in RECORDED_EVENTS:
+            self._write({"t": tick, "event": event_to_dict(event)})
+
+    def net(self, tick, name, args):
+        self._write({"t": tick, "net": name, "args": list(args)})
+
+    def after_tick(self, tick, x, y, collided):
+        """tick is the number of ticks run so far (including this one)."""
+        self.checksum.add_tick(x, y, collided)
+        if tick % CHECK_EVERY == 0:
+            self._write({"t": tick, "check": self.checksum.value(x, y)})
+
+    def close(self, tick, x, y):
+        if self.file is None:
+            return
+        self._write({"t": tick, "end": self.checksum.value(x, y)})
+        self.file.close()
+        self.file = None
+
+
+class ReplayPlayer:
+    def __init__(self, path):
+        self.path = path
+        with open(path) as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        if not lines or "replay" not in lines[0]:
+            raise ValueError(f"{path} is not a replay file")
+        self.header = lines[0]
+        self.events = {}     # tick -> [event dicts]
+        self.net = {}        # tick -> [(name, args)]
+        self.checks = {}     # tick -> expected [x, y, collisions, crc]
+        self.end = None      # (tick, expected) from the last line, if the recording finished cleanly
+        for line in lines[1:]:
+            t = line["t"]
+            if "event" in line:
+                self.events.setdefault(t, []).append(line["event"])
+            elif "net" in line:
+                if line["net"] not in LIVE_ONLY:
+                    self.net.setdefault(t, []).append((line["net"], line["args"]))
+            elif "check" in line:
+                self.checks[t] = line["check"]
+            elif "end" in line:
+                self.end = (t, line["end"])
+        self.checksum = Checksum()
+        self.mismatch = None  # (tick, expected, got) for the first checkpoint that differs
+
+    @property
+    def length(self):
+        """Ticks in the recording (or up to the last input if it has no end line)."""
+        if self.end is not None:
+            return self.end[0]
+        return max(list(self.events) + list(self.net) + [0]) + 1
+
+    def events_for(self, tick):
+        return [event_from_dict(d) for d in self.events.get(tick, ())]
+
+    def net_for(self, tick):
+        return self.net.get(tick, ())
+
+    def after_tick(self, tick, x, y, collided):
+        self.checksum.add_tick(x, y, collided)
+        expected = self.checks.get(tick)
+        if expected is None and self.end is not None and self.end[0] == tick:
+            expected = self.end[1]
+        if expected is not None and self.mismatch is None:
+            got = self.checksum.value(x, y)
+            if got != expected:
+                self.mismatch = (tick, expected, got)
+
+
+class RandomWalker:
+    """Scripted input for headless runs: holds a random direction key for a random number of ticks."""
+    KEYS = (pygame.K_w, pygame.K_a, pygame.K_s, pygame.K_d)
+
+    def __init__(self, seed=0, shortest=10, longest=90):
+        self.random = random.Random(seed)   # its own generator so it doesn't change the game's random numbers
+        self.shortest = shortest
+        self.longest = longest
+        self.held = None
+        self.next_change = 0
+
+    def events_for(self, tick):
+        if tick < self.next_change:
+            return []
+        events = []
+        if self.held is not None:
+            events.append(pygame.event.Event(pygame.KEYUP, key=self.held, mod=0))
+        self.held = self.random.choice(self.KEYS + (None,))   # None = stand still for a bit
+        if self.held is not None:
+            events.append(pygame.event.Event(pygame.KEYDOWN, key=self.held, mod=0, unicode=pygame.key.name(self.held)))
+        self.next_change = tick + self.random.randint(self.shortest, self.longest)
+        return events
@@ -0,0 +1,399 @@
+# replication.py
+# Shares game entities (crates, doors, anything in state.entities_group) with everyone connected.
+# An entity takes part by listing the attributes the other players should see:
+#
+#     class Crate(GameEntity):
+#         REPLICATE = ("opened",)         # only these are sent, and only when they change
+#         NET_AUTHORITY = "shared"        # who may change them (see below)
+#
+#         def on_interact(self, state):
+#             self.opened = not self.opened
+#
+#         def on_net_update(self, changed):   # optional: another player changed these fields
+#             self.image = self.images[1 if self.opened else 0]
+#
+# NET_AUTHORITY:
+#   "shared"  (the default) anybody may change the fields, e.g. opening a door. The server takes the
+#             changes in the order they arrive.
+#   "owner"   one player runs the entity and everyone else sees their copy, e.g. a pet that walks about
+#             by itself. The owner is whoever made it, or for entities from the map whoever loaded it
+#             first. Other players' copies are put back to the owner's values every tick. When the owner
+#             leaves, another player who has the entity takes over.
+#
+# Ids: the server numbers every entity. Entities a room spawns from the map file are known by
+# "<room>:<spawn number>", so everybody's copy of the same crate gets the same id. Entities made by
+# code (state.entities_group.add(...)) are known by "<player id>:<n>", and the server tells the other
+# players to make a copy ("spawned"). The class is looked up by name among the GameEntity classes
+# (entities.entity_classes()) and is made at the entity's x, y - so put "x" and "y" in REPLICATE for
+# entities made by code. Only the REPLICATE fields of a copy are set from the message.
+#
+# Only the fields that changed are sent. Clients send theirs with their moves (NetClient.tick_send_move)
+# and the server sends everybody's changes together WORLD_BROADCAST_RATE times a second ("entities").
+# Field values have to be JSON: numbers, strings, True/False/None, or lists of those.
+# EntityTable is the server's half, EntityReplicator the client's.
+from collections import deque
+
+MAX_FIELDS = 16          # fields per entity
+MAX_STRING = 200         # characters in a string field
+
+def clean_value(v):
+    """The value as it will look after a trip through JSON, or raises ValueError if it can't be sent."""
+    if v is None or isinstance(v, (bool, int)):
+        return v
+    if isinstance(v, float):
+        if v != v or v in (float("inf"), float("-inf")):
+            raise ValueError("not a number")
+        return v
+    if isinstance(v, str):
+        return v[:MAX_STRING]
+    if isinstance(v, (list, tuple)) and len(v) <= MAX_FIELDS:
+        return [clean_value(x) for x in v]
+    raise ValueError(f"can't send a {type(v).__name__}")
+
+def same_kind(old, new):
+    """False if new can't replace old: a number field only takes numbers (x = "boom" would break drawing)."""
+    if isinstance(old, (int, float)) and not isinstance(old, bool):
+        return isinstance(new, (int, float)) and not isinstance(new, bool)
+    return True
+
+def clean_fields(fields):
+    if not isinstance(fields, dict):
+        return {}
+    out = {}
+    for name, v in list(fields.items())[:MAX_FIELDS]:
+        try:
+            out[str(name)[:64]] = clean_value(v)
+        except ValueError:
+            pass
+    return out
+
+
+class EntityTable:
+    """The server's copy of every replicated entity, and the changes waiting to be broadcast."""
+    def __init__(self, max_entities=5000):
+        self.max_entities = max_entities
+        self.entities = {}    # id -> {"key", "type", "authority", "owner", "creator", "fields", "holders"}
+        self.ids = {}         # key -> id
+        self.next_id = 1
+        self.changed = {}     # id -> {field: value} not broadcast yet
+        self.changed_by = {}  # id -> {field: sid that made the latest change to it (they already have it)}
+        self.spawned = []     # code-made entities the other players need to make a copy of
+        self.removed = []     # ids of entities that are gone
+        self.owners = {}      # id -> new owner sid ("" for nobody)
+
+    def describe(self, eid):
+        ent = self.entities[eid]
+        return {"id": eid, "key": ent["key"], "type": ent["type"], "owner": ent["owner"], "fields": ent["fields"]}
+
+    def register(self, sid, item):
+        """
+        sid has this entity (loaded its room, or made it). item: {"key", "type", "fields", "authority", "spawned"}
+        Makes it if the server hasn't seen it before. Returns what the client needs (None if the table is full).
+        """
+        key = str(item.get("key", ""))[:128]
+        if not key:
+            return None
+        eid = self.ids.get(key)
+        if eid is None:
+            if len(self.entities) >= self.max_entities:
+                return None
+            eid = self.next_id
+            self.next_id += 1
+            self.ids[key] = eid
+            self.entities[eid] = {"key": key, "type": str(item.get("type", ""))[:64],
+                                  "authority": "owner" if item.get("authority") == "owner" else "shared",
+                                  "owner": "", "creator": sid if item.get("spawned") else "",
+                                  "fields": clean_fields(item.get("fields")), "holders": set()}
+            if item.get("spawned"):
+                self.spawned.append(eid)
+        ent = self.entities[eid]
+        ent["holders"].add(sid)
+        if ent["authority"] == "owner" and not ent["owner"]:
+            self.set_owner(eid, sid)
+        return self.describe(eid)
+
+    def set_owner(self, eid, sid):
+        self.entities[eid]["owner"] = sid
+        self.owners[eid] = sid
+
+    def may_change(self, sid, eid):
+        ent = self.entities.get(eid)
+        if ent is None or sid not in ent["holders"]:
+            return False
+        return ent["authority"] == "shared" or ent["owner"] == sid
+
+    def update(self, sid, changes):
+        """Apply {id: {field: value}} from sid. Returns the ids sid wasn't allowed to change."""
+        refused = []
+        for eid, fields in changes.items():
+            try:
+                eid = int(eid)
+            except (TypeError, ValueError):
+                continue
+            if not self.may_change(sid, eid):
+                if eid in self.entities:
+                    refused.append(eid)
+                continue
+            known = self.entities[eid]["fields"]
+            for name, v in clean_fields(fields).items():
+                if name in known and known[name] != v:
+                    known[name] = v
+                    self.changed.setdefault(eid, {})[name] = v
+                    self.changed_by.setdefault(eid, {})[name] = sid
+        return refused
+
+    def correction(self, eids):
+        """Message putting sid's copies of these entities back to the server's values."""
+        return {"changed": {eid: self.entities[eid]["fields"] for eid in eids},
+                "owners": {eid: self.entities[eid]["owner"] for eid in eids}}
+
+    def drop(self, sid, eid, destroy=False):
+        """sid no longer has the entity (unloaded its room), or - if they made it - destroyed it."""
+        ent = self.entities.get(eid)
+        if ent is None:
+            return
+        if destroy and ent["creator"] == sid:
+            self.remove(eid)
+            return
+        ent["holders"].discard(sid)
+        if not ent["holders"] and ent["creator"]:
+            self.remove(eid)   # nobody has a copy of a code-made entity any more
+        elif ent["owner"] == sid:
+            # any of the others will do (min so it's predictable); a map entity nobody has waits for
+            # the next player to load it
+            self.set_owner(eid, min(ent["holders"]) if ent["holders"] else "")
+
+    def leave(self, sid):
+        """A player left: hand over what they owned."""
+        for eid in list(self.entities):
+            ent = self.entities.get(eid)
+            if ent is not None and sid in ent["holders"]:
+                self.drop(sid, eid)
+
+    def remove(self, eid):
+        ent = self.entities.pop(eid)
+        self.ids.pop(ent["key"], None)
+        self.changed.pop(eid, None)
+        self.changed_by.pop(eid, None)
+        self.owners.pop(eid, None)
+        self.removed.append(eid)
+
+    def take(self, now):
+        """Everything that changed since last time, as one "entities" message (None if nothing did)."""
+        if not (self.changed or self.spawned or self.removed or self.owners):
+            return None
+        message = {"t": now, "changed": self.changed, "by": self.changed_by,
+                   "spawned": [self.describe(eid) for eid in self.spawned if eid in self.entities],
+                   "removed": self.removed, "owners": self.owners}
+        message = {key: v for key, v in message.items() if v}   # leave out the empty parts
+        self.changed, self.changed_by, self.spawned, self.removed, self.owners = {}, {}, [], [], {}
+        return message
+
+    def report(self):
+        by_authority = {}
+        for ent in self.entities.values():
+            by_authority[ent["authority"]] = by_authority.get(ent["authority"], 0) + 1
+        return {"entities": len(self.entities), "by_authority": by_authority}
+
+
+class EntityReplicator:
+    """
+    The client's half. NetClient makes one (client.entities); the game attaches it to
+    state.entities_group, which then tells it about every entity added or removed.
+    Messages from the server are queued and applied on the game thread by sync(), once a tick.
+    """
+    def __init__(self, client):
+        self.client = client        # NetClient: my_sid, player_id, sio, state
+        self.group = None
+        self.classes = {}           # class name -> class, for copies of entities other players made
+        self.tracked = {}           # key -> entity
+        self.by_id = {}             # server id -> entity
+        self.baseline = {}          # key -> {field: value} as the server last had them
+        self.inbox = deque()        # ("ids" | "entities" | "reset", data) from the network thread
+        self.to_register = {}       # key -> entity, sent by the next flush()
+        self.changes = {}           # id -> {field: value} for the next flush()
+        self.dropped = []           # ids of entities we unloaded
+        self.destroyed = []         # ids of entities we made and then killed
+        self.made = 0               # counts entities made here, for their keys
+
+    def attach(self, group, classes=None):
+        """classes: name -> class of the entities other players may make copies of here (entity_classes())."""
+        group.net = self
+        self.group = group
+        self.classes = classes or {}
+        for ent in group:
+            self.track(ent)
+
+    @staticmethod
+    def read(ent):
+        fields = {}
+        for name in ent.REPLICATE:
+            try:
+                fields[name] = clean_value(getattr(ent, name, None))
+            except ValueError:
+                pass
+        return fields
+
+    # ----- called by SpatialGroup -----
+    def track(self, ent):
+        if not hasattr(ent, "REPLICATE"):
+            return
+        key = getattr(ent, "net_key", None)
+        if key is None:
+            self.made += 1
+            key = ent.net_key = f"{self.client.player_id}:{self.made}"
+            ent.net_made_here = True
+        if key in self.tracked:
+            return
+        self.tracked[key] = ent
+        self.baseline[key] = self.read(ent)
+        if getattr(ent, "net_id", None) is not None:
+            self.by_id[ent.net_id] = ent     # a copy of another player's entity, made by _apply_entities
+        else:
+            ent.net_id = None
+            ent.net_owner = ""
+            self.to_register[key] = ent
+
+    def untrack(self, ent):
+        key = getattr(ent, "net_key", None)
+        if self.tracked.get(key) is not ent:
+            return
+        del self.tracked[key]
+        self.baseline.pop(key, None)
+        self.to_register.pop(key, None)
+        if ent.net_id is not None:
+            self.by_id.pop(ent.net_id, None)
+            (self.destroyed if getattr(ent, "net_made_here", False) else self.dropped).append(ent.net_id)
+
+    # ----- game thread -----
+    def may_change(self, ent):
+        return getattr(ent, "NET_AUTHORITY", "shared") != "owner" or ent.net_owner == self.client.my_sid
+
+    def sync(self, active):
+        """
+        Once a tick, after the entities have updated: apply what the server sent, then note what changed
+        on the active entities. Changes we are allowed to make are sent by flush(); anything else is put back.
+        """
+        while self.inbox:
+            kind, data = self.inbox.popleft()
+            if kind == "ids":
+                self._apply_ids(data.get("entities", []))
+            elif kind == "entities":
+                self._apply_entities(data)
+            elif kind == "reset":
+                self._reset()
+        for ent in active:
+            if getattr(ent, "net_id", None) is None or not hasattr(ent, "REPLICATE"):
+                continue
+            base = self.baseline[ent.net_key]
+            diff = {}
+            for name in ent.REPLICATE:
+                v = getattr(ent, name, None)
+                old = base.get(name)
+                if v == old:
+                    continue   # most fields of most entities, so this is checked before anything else
+                try:
+                    v = clean_value(v)
+                except ValueError:
+                    continue
+                if v != old:
+                    diff[name] = v
+            if not diff:
+                continue
+            if self.may_change(ent):
+                self.changes.setdefault(ent.net_id, {}).update(diff)
+                base.update(diff)
+            else:
+                for name in diff:
+                    setattr(ent, name, base[name])
+
+    def flush(self):
+        """Send registrations and changes (NetClient.tick_send_move calls this, so they go with the moves)."""
+        sio = self.client.sio
+        if self.to_register:
+            sio.emit("entity_register", {"entities": [
+                {"key": key, "type": type(ent).__name__, "fields": self.baseline[key],
+                 "authority": getattr(ent, "NET_AUTHORITY", "shared"), "spawned": getattr(ent, "net_made_here", False)}
+                for key, ent in self.to_register.items()]})
+            self.to_register = {}
+        if self.changes or self.dropped or self.destroyed:
+            sio.emit("entity_update", {"changes": self.changes, "dropped": self.dropped, "destroyed": self.destroyed})
+            self.changes, self.dropped, self.destroyed = {}, [], []
+
+    def _set_fields(self, ent, fields):
+        base = self.baseline[ent.net_key]
+        changed = [name for name, v in fields.items() if name in base and base[name] != v and same_kind(base[name], v)]
+        for name in changed:
+            base[name] = fields[name]
+            setattr(ent, name, fields[name])
+        if changed:
+            if hasattr(ent, "on_net_update"):
+                ent.on_net_update(changed)
+            if self.group is not None:
+                self.group.moved(ent)
+
+    def _apply_ids(self, records):
+        for rec in records:
+            if not rec:
+                continue
+            ent = self.tracked.get(rec["key"])
+            if ent is None or ent.net_id is not None:
+                continue
+            ent.net_id = rec["id"]
+            ent.net_owner = rec["owner"]
+            self.by_id[ent.net_id] = ent
+            if ent.net_owner != self.client.my_sid:
+                self._set_fields(ent, rec["fields"])   # e.g. somebody opened this crate before we got here
+
+    def _apply_entities(self, msg):
+        my_sid = self.client.my_sid
+        for rec in msg.get("spawned", []):
+            if rec["key"] not in self.tracked:
+                self._make_copy(rec)
+        for eid, owner in msg.get("owners", {}).items():
+            ent = self.by_id.get(int(eid))
+            if ent is not None:
+                ent.net_owner = owner
+        by = msg.get("by", {})
+        for eid, fields in msg.get("changed", {}).items():
+            ent = self.by_id.get(int(eid))
+            if ent is None:
+                continue
+            if getattr(ent, "NET_AUTHORITY", "shared") == "owner" and ent.net_owner == my_sid:
+                continue   # ours to run
+            if self.may_change(ent):
+                # leave out our own changes coming back (we may have changed them again since), but
+                # not the other fields somebody else changed in the same broadcast
+                ours = by.get(eid, {})
+                fields = {name: v for name, v in fields.items() if ours.get(name) != my_sid}
+            self._set_fields(ent, fields)
+        for eid in msg.get("removed", []):
+            ent = self.by_id.pop(int(eid), None)
+            if ent is not None:
+                ent.net_id = None          # so untrack doesn't tell the server about it
+                ent.kill()
+
+    def _make_copy(self, rec):
+        cls = self.classes.get(rec["type"])
+        if cls is None or not hasattr(cls, "REPLICATE") or self.group is None:
+            print(f"[entities] can't make a copy of {rec['type']!r} (unknown class)")
+            return
+        fields = rec["fields"]
+        try:
+            ent = cls(fields.get("x", 0), fields.get("y", 0), self.client.state.player)   # like RoomStreamer's spawns
+            for name in cls.REPLICATE:   # not whatever else the other player sent (e.g. "rect" or "update")
+                if name in fields and same_kind(getattr(ent, name, None), fields[name]):
+                    setattr(ent, name, fields[name])
+        except Exception as e:
+            print(f"[entities] can't make a copy of {rec['type']!r} ({rec['key']}): {e!r}")
+            return
+        ent.net_key, ent.net_id, ent.net_owner = rec["key"], rec["id"], rec["owner"]
+        self.group.add(ent)   # -> track()
+
+    def _reset(self):
+        # connected again (maybe to a restarted server): every entity needs registering again
+        self.by_id.clear()
+        self.changes, self.dropped, self.destroyed = {}, [], []
+        for key, ent in self.tracked.items():
+            ent.net_id = None
+            self.to_register[key] = ent
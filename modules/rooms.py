@@ -0,0 +1,73 @@
+# rooms.py
+# Streams rooms from the map file in and out as the player moves around the campus.
+# Rooms within ROOM_LOAD_DISTANCE are loaded (at most one per tick so there's no big pause) and rooms
+# further than ROOM_UNLOAD_DISTANCE are unloaded, along with the entities they spawned. If loading a
+# room would go over ROOM_MEMORY_BUDGET, the furthest loaded rooms are unloaded first.
+from modules.entities import Room
+from modules.assets import ASSETS
+from modules.settings import ROOM_LOAD_DISTANCE, ROOM_UNLOAD_DISTANCE, ROOM_MEMORY_BUDGET
+
+class RoomStreamer:
+    def __init__(self, rooms, state, resolve=None, load_distance=ROOM_LOAD_DISTANCE,
+                 unload_distance=ROOM_UNLOAD_DISTANCE, budget=ROOM_MEMORY_BUDGET):
+        self.rooms = rooms              # {name: RoomData} from map_data.load_map
+        self.state = state
+        self.resolve = resolve          # function: class name -> class, used for entity spawns
+        self.load_distance = load_distance
+        self.unload_distance = unload_distance
+        self.budget = budget
+        self.loaded = {}                # name -> (Room sprite, [spawned entities])
+
+    def memory_used(self):
+        return sum(room.memory_bytes() for room, _ in self.loaded.values())
+
+    def update(self, x, y, max_loads=1):
+        """Load/unload rooms around the world point (x, y). max_loads=None loads everything in range."""
+        for name in list(self.loaded):
+            if self.rooms[name].distance_to(x, y) > self.unload_distance:
+                self.unload(name)
+
+        wanted = sorted((data.distance_to(x, y), name) for name, data in self.rooms.items()
+                        if name not in self.loaded and data.distance_to(x, y) <= self.load_distance)
+        loads = 0
+        for distance, name in wanted:
+            if max_loads is not None and loads >= max_loads:
+                break
+            cost = self.rooms[name].width * self.rooms[name].height * 4
+            # make room in the budget by dropping rooms that are further away than this one
+            while self.memory_used() + cost > self.budget:
+                further = [(self.rooms[n].distance_to(x, y), n) for n in self.loaded
+                           if self.rooms[n].distance_to(x, y) > distance]
+                if not further:
+                    break
+                self.unload(max(further)[1])
+            if self.memory_used() + cost > self.budget and self.loaded:
+                break   # everything loaded is closer than this room, so leave it for now
+            self.load(name)
+            loads += 1
+
+    def load(self, name):
+        data = self.rooms[name]
+        room = Room(data, self.state.player)
+        self.state.rooms_group.add(room)
+        spawned = []
+        left, top, _, _ = data.bounds()
+        for number, spawn in enumerate(data.spawns):
+            cls = self.resolve(spawn.get("type", "")) if self.resolve else None
+            if cls is None:
+                print(f"[rooms] {name}: unknown entity type {spawn.get('type')!r}")
+                continue
+            ent = cls(left + spawn.get("x", 0), top + spawn.get("y", 0), self.state.player, **spawn.get("args", {}))
+            ent.net_key = f"{name}:{number}"   # the same on every player's PC, so the server can match them up
+            if getattr(ent, "slot", None) is None:
+                self.state.entities_group.add(ent)  # ArrayEntity NPCs live in state.npcs instead
+            spawned.append(ent)
+        self.loaded[name] = (room, spawned)
+        return room
+
+    def unload(self, name):
+        room, spawned = self.loaded.pop(name)
+        room.kill()
+        ASSETS.forget(room.data.image)   # let the image be freed, the budget assumes it is
+        for ent in spawned:
+            ent.kill()
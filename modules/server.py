@@ -1,15 +1,56 @@
 # server.py
+# Run from the project folder:  python -m modules.server  [--host 0.0.0.0] [--port 8000] [--workers 4]
+# Only uses the pygame-free modules (config.py, not settings.py), so it starts quickly and doesn't load SDL.
+# --workers N runs N server processes on the same port (see "WORKER PROCESSES" at the bottom).
+# Players are split into room instances (modules/instances.py): each has its own world, chat,
+# projectiles and shared entities, and is a Socket.IO room so its messages only go to its own players.
+import argparse
+import asyncio
+import base64
+import math
+import os
 import random
+import signal
+import socket
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 import socketio
 from aiohttp import web
-from settings import WIDTH, HEIGHT, PLAYER_START_X, PLAYER_START_Y 
-import base64
-from assets_net import MAX_SHEET_BYTES, is_png  # used by sheet_register
+from modules.config import WIDTH, HEIGHT, PLAYER_START_X, PLAYER_START_Y, SIM_RATE, MAP_FILE, MAX_SHEET_BYTES
+from modules.config import PROJECTILE_SPEED, SHOT_COOLDOWN, MAX_SHOT_SEQ
+from modules.config import PLAYER_SPEED, RATE_LIMITS, MOVE_SLACK, MOVE_BURST, WORLD_BROADCAST_RATE
+from modules.config import LOBBY_REPLY_TIMEOUT
+from modules.config import SERVER_STATE_DIR, SAVE_INTERVAL, COMPACT_LOG_BYTES, FORGET_PLAYERS_AFTER
+from modules.atlas import clean_atlas  # used by sheet_register
+from modules.map_data import load_map
+from modules.sheet_ingest import ingest_sheet, SheetRejected
+from modules.rate_limit import ClientLimits
+from modules.server_store import ServerStore
+from modules.bus import BusHub, BusClient, BusManager
+from modules.instances import Lobby, LobbyFull
+
+ROOT = Path(__file__).resolve().parents[1]   # the project folder (the map path is relative to it)
 
 W, H = WIDTH, HEIGHT
 SIZE = 20
 WORLD = {}
-SHEETS = {}  # hash -> {"meta": {...}, "png": bytes}
+SHEETS = {}  # hash -> {"meta": {...}, "png": bytes, "png_b64": str, "stats": {...}}
+
+# Saved state (see modules/server_store.py). main() sets STORE unless --no-save is given.
+STORE = None
+PLAYER_IDS = {}     # sid -> the id the client sent when connecting (not broadcast, it's how they get their place back)
+TO_SAVE = set()     # sids whose position or appearance changed since the last save
+
+# Worker processes (--workers N). Each player belongs to the worker that has their connection; the
+# others keep a copy of them in WORLD, sent over the bus (modules/bus.py).
+WORKER = None       # this worker's number, None when the server is a single process
+BUS = None          # BusClient to the other workers
+REMOTE = {}         # sid -> host_id of the worker a player from another worker belongs to
+JOINS = {}          # sid -> Future for worker 0's answer to "which instance?" (see choose_instance)
 
 def clamp(n, lo, hi): return max(lo, min(hi, n))
 
@@ -19,9 +60,35 @@ app = web.Application()
 sio.attach(app)
 
 # Authoritative world state: { sid: {"x": int, "y": int, "name": str, "color": str} }
+# Everybody on the server; LOBBY.of[sid] is the instance they are in, and its .world is what they see.
 WORLD = {}
+LOBBY = Lobby()
+
+# Flood protection: token buckets and throttle counters per client (see modules/rate_limit.py)
+LIMITS = {}          # sid -> ClientLimits
+NET_STATS = {}       # sid -> the ping, jitter and clock offset that client last reported (see on_clock_ping)
+MOVE_RATE = PLAYER_SPEED * SIM_RATE * MOVE_SLACK   # pixels per second a player may move
+
+def allowed(sid, event):
+    """False if sid has sent too many `event` messages recently (the message should be ignored)."""
+    limits = LIMITS.get(sid)
+    if limits is None:
+        return True
+    if limits.allow(event):
+        return True
+    if limits.total_dropped() == 1:
+        name = WORLD.get(sid, {}).get("name", sid[:5])
+        print(f"[limits] {name} ({sid[:5]}) is sending {event} too fast; extra messages are being dropped")
+    return False
 
 async def on_connect(sid, environ, auth=None):
+    # which instance: the one they asked for (auth "instance"), else the lobby picks one
+    try:
+        inst = await choose_instance(sid, (auth or {}).get("instance", ""))
+    except LobbyFull as e:
+        print(f"[lobby] turned away {sid[:5]}: {e}")
+        raise socketio.exceptions.ConnectionRefusedError(str(e))
+
     name  = (auth or {}).get("name")  or sid[:5]
     color = (auth or {}).get("color") or "#64b5f6"
 
@@ -40,87 +107,255 @@ async def on_connect(sid, environ, auth=None):
         "scale": float(app_in.get("scale", 1.0)),
     }
 
+    # a player the server remembers (it restarted, or they dropped out) carries on where they were
+    player_id = str((auth or {}).get("id", ""))[:64]
+    saved = STORE.players.get(player_id) if STORE is not None and player_id else None
+    if saved is not None:
+        x, y = int(saved["x"]), int(saved["y"])
+    if player_id:
+        PLAYER_IDS[sid] = player_id
+        TO_SAVE.add(sid)
+
     WORLD[sid] = {"x": x, "y": y, "name": name, "color": color, "appearance": appearance}
-    await sio.emit("world", WORLD)
+    LOBBY.join(sid, inst, WORLD[sid])
+    await sio.enter_room(sid, inst.name)
+    LIMITS[sid] = ClientLimits(RATE_LIMITS, MOVE_RATE, MOVE_RATE * MOVE_BURST)
+    await share_players([sid])
+    await sio.emit("instance", {"name": inst.name, "players": len(inst.world), "cap": inst.cap}, to=sid)
+    await sio.emit("world", inst.world, room=inst.name)
 
     print("APPEAR:", WORLD[sid]["appearance"]) #debug code - checking that appearance is passed
 
 async def on_move(sid, data):
     p = WORLD.get(sid)
-    if not p: return
-    p["x"] += int(data.get("dx", 0))
-    p["y"] += int(data.get("dy", 0))
-    await sio.emit("world", WORLD)
+    inst = LOBBY.of.get(sid)
+    if not p or inst is None: return
+    try:
+        dx, dy = int(data.get("dx", 0)), int(data.get("dy", 0))
+    except (TypeError, ValueError, OverflowError, AttributeError):
+        return
+    limits = LIMITS.get(sid)
+    if limits is not None:
+        sent = dx, dy
+        dx, dy = limits.clamp_move(dx, dy)   # no further than PLAYER_SPEED allows since their last move
+        if (dx, dy) != sent:
+            # tell them how much was cut off, so their position stays the same as ours
+            await sio.emit("move_clamped", {"dx": sent[0] - dx, "dy": sent[1] - dy}, to=sid)
+    p["x"] += dx
+    p["y"] += dy
+    TO_SAVE.add(sid)
+    if BUS is not None:
+        await share_players([sid])
+    if allowed(sid, "move"):
+        inst.dirty = False
+        await sio.emit("world", inst.world, room=inst.name)
+    else:
+        inst.dirty = True   # still moved, but the instance hears about it on the next world_broadcast_loop
 
 async def on_disconnect(sid):
+    LAST_SHOT.pop(sid, None)
+    LIMITS.pop(sid, None)
+    NET_STATS.pop(sid, None)
+    for sids in WAITING.values():
+        sids.discard(sid)
     if sid in WORLD:
-        del WORLD[sid]
-        await sio.emit("world", WORLD)
+        inst = remove_player(sid)
+        await share_players(gone=[sid])
+        if inst is not None:
+            await sio.emit("world", inst.world, room=inst.name)
+
+async def choose_instance(sid, wanted):
+    '''
+    Which instance a new player goes in (raises LobbyFull). With --workers worker 0 decides for every
+    worker, and keeps the place until the player turns up in a "players" message, so two workers can't
+    both give away an instance's last place.
+    '''
+    if WORKER in (None, 0):
+        return LOBBY.choose(wanted)
+    answer = asyncio.get_running_loop().create_future()
+    JOINS[sid] = answer
+    try:
+        await BUS.publish({"method": "join", "sid": sid, "wanted": wanted})
+        reply = await asyncio.wait_for(answer, LOBBY_REPLY_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise LobbyFull("worker 0 didn't answer")
+    finally:
+        JOINS.pop(sid, None)
+    if "error" in reply:
+        raise LobbyFull(reply["error"])
+    return LOBBY.get(reply["instance"])
+
+def remove_player(sid):
+    '''Forget a player who left (from this worker or another). Returns the instance they were in.'''
+    save_player(sid)   # remembered, so they get their place back if they reconnect (to any worker)
+    TO_SAVE.discard(sid)
+    PLAYER_IDS.pop(sid, None)
+    REMOTE.pop(sid, None)
+    WORLD.pop(sid, None)
+    inst = LOBBY.leave(sid)
+    if inst is not None:
+        if WORKER in (None, 0):
+            inst.entities.leave(sid)   # hands over the entities they ran (worker 0 keeps the entities, see below)
+        LOBBY.tidy(inst)
+    return inst
+
+def server_time():
+    # the wall clock rather than time.monotonic(): every worker process (--workers) agrees on it
+    return time.time()
+
+async def on_clock_ping(sid, data):
+    '''
+    data: { "seq": int, "t0": float, and the client's own estimates: "rtt_ms", "jitter_ms", "offset_ms" }
+    Answered straight away with clock_pong { "seq", "t0", "server": server_time() } (see modules/clock_sync.py).
+    '''
+    if not allowed(sid, "clock_ping") or not isinstance(data, dict):
+        return
+    await sio.emit("clock_pong", {"seq": data.get("seq"), "t0": data.get("t0"), "server": server_time()}, to=sid)
+    try:
+        NET_STATS[sid] = {key: float(data[key]) for key in ("rtt_ms", "jitter_ms", "offset_ms") if key in data}
+    except (TypeError, ValueError):
+        pass
 
 async def on_chat(sid, data):
+    if not allowed(sid, "chat"):
+        return
     text = str(data.get("text", ""))[:200]
     if not text:
         return
+    inst = LOBBY.of.get(sid)
+    if inst is None:
+        return
     # include a display name if you track one in WORLD; fallback to sid
     name = WORLD.get(sid, {}).get("name", sid[:5])
-    await sio.emit("chat", {"from": name, "sid": sid, "text": text})
+    await sio.emit("chat", {"from": name, "sid": sid, "text": text}, room=inst.name)   # their instance's chat only
 
 sio.on("chat", on_chat)
 sio.on("connect", on_connect)
 sio.on("move", on_move)
 sio.on("disconnect", on_disconnect)
+sio.on("clock_ping", on_clock_ping)
 
 # --- HANDLE CLIENT SPRITE SHEETS ---
-SHEETS = {}  # hash -> {"meta": {...}, "png": bytes}
+SHEETS = {}  # hash -> {"meta": {...}, "png": bytes, "png_b64": str, "stats": {...}}
+
+# Uploaded sheets are decoded, checked, scaled and re-compressed by sheet_ingest.ingest_sheet in a
+# thread pool, so the event loop keeps broadcasting positions while a student uploads.
+SHEET_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="sheet-ingest")
+INGESTING = set()      # hashes being processed right now
+WAITING = {}           # hash -> sids that asked for it while it was being processed
+LOOP_LAG = {"worst_ms": 0.0, "ingest_worst_ms": 0.0}   # longest event loop pauses seen (see watch_loop_lag)
+
+def clean_sheet_meta(meta):
+    return {
+        "count": int(meta.get("count", 1)),
+        "cols":  int(meta.get("cols", 9)),
+        "pad":   int(meta.get("pad", 0)),
+        "scale": min(4.0, max(0.05, float(meta.get("scale", 1.0)))),
+        "atlas": clean_atlas(meta.get("atlas")),   # frame positions for trimmed/packed sheets (or None)
+    }
 
 async def on_sheet_register(sid, data):
     """
-    data: { "hash": str, "meta": {count, cols, pad, scale}, "png_b64": str }
+    data: { "hash": str, "meta": {count, cols, pad, scale, atlas}, "png_b64": str }
     """
+    if not allowed(sid, "sheet_register"):
+        return
     try:
         h = str(data.get("hash", ""))
-        meta = data.get("meta", {}) or {}
+        meta = clean_sheet_meta(data.get("meta", {}) or {})
         b64 = data.get("png_b64", "")
-        if not h or not b64:
+        if not h or not isinstance(b64, str) or not b64:
             return
-        if h in SHEETS:
+        if h in SHEETS or h in INGESTING:
             return  # already have it
-        png = base64.b64decode(b64.encode("ascii"))
-        if len(png) > MAX_SHEET_BYTES or not is_png(png):
-            return  # reject oversize/non-png
-        SHEETS[h] = {"meta": {
-            "count": int(meta.get("count", 1)),
-            "cols":  int(meta.get("cols", 9)),
-            "pad":   int(meta.get("pad", 0)),
-            "scale": float(meta.get("scale", 1.0)),
-        }, "png": png}
-        # (optional) nothing to broadcast; clients will request when needed
-    except Exception:
-        pass
+        if len(b64) > MAX_SHEET_BYTES * 4 // 3 + 4:
+            return  # reject oversize before decoding anything
+    except (TypeError, ValueError, OverflowError, AttributeError):
+        return
+
+    INGESTING.add(h)
+    LOOP_LAG["ingest_worst_ms"] = 0.0
+    started = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        SHEETS[h] = await loop.run_in_executor(SHEET_POOL, ingest_and_save, h, b64, meta)
+    except SheetRejected as e:
+        print(f"[sheets] rejected {h[:8]} from {sid[:5]}: {e}")
+        WAITING.pop(h, None)   # there is nothing to send the players who asked for it
+        return
+    finally:
+        INGESTING.discard(h)
+    rec = SHEETS[h]
+    info = None
+    if "file" in rec:
+        info = STORE.sheet_added(h, rec["file"], len(rec["png"]), rec["meta"], rec["stats"])
+    if BUS is not None:
+        # the other workers map the saved file; with --no-save there isn't one, so the bytes go over the bus
+        await BUS.publish({"method": "sheet", "hash": h, "info": info, "meta": rec["meta"], "stats": rec["stats"],
+                           "png_b64": None if info else rec["png_b64"]})
+    stats = rec["stats"]
+    print(f"[sheets] {h[:8]}: {stats['in_bytes']} -> {stats['out_bytes']} bytes, {stats['size'][0]}x{stats['size'][1]}, "
+          f"{(time.perf_counter() - started) * 1000:.0f} ms, worst event loop pause meanwhile "
+          f"{LOOP_LAG['ingest_worst_ms']:.1f} ms")
+    # answer anyone who asked while it was being processed
+    for waiting_sid in WAITING.pop(h, ()):
+        await send_sheet(waiting_sid, h)
+
+def ingest_and_save(h, b64, meta):
+    # runs in SHEET_POOL: the file is written before the sheet is logged, so the log never points at a missing file
+    rec = ingest_sheet(h, b64, meta, MAX_SHEET_BYTES)
+    if STORE is not None:
+        rec["file"] = STORE.write_sheet_file(rec["png"])
+    return rec
+
+async def on_sheet_offer(sid, data):
+    '''
+    data: { "hash": str }
+    Sent by a client when it connects. Only asks for the bytes ("sheet_want") if the server doesn't
+    already have the sheet - after a restart it usually does, from the saved state.
+    '''
+    if not allowed(sid, "sheet_offer"):
+        return
+    h = str((data or {}).get("hash", ""))
+    if h and h not in SHEETS and h not in INGESTING:
+        await sio.emit("sheet_want", {"hash": h}, to=sid)
 
 async def on_sheet_get(sid, data):
     """
     data: { "hash": str }
     Reply only to requester: { "hash": str, "meta": {...}, "png_b64": str }
     """
+    if not allowed(sid, "sheet_get"):
+        return
     h = str((data or {}).get("hash", ""))
+    if h in INGESTING or (BUS is not None and h and h not in SHEETS):
+        WAITING.setdefault(h, set()).add(sid)   # sent when it's ready (or when another worker has it)
+        return
+    await send_sheet(sid, h)
+
+async def send_sheet(sid, h):
     rec = SHEETS.get(h)
     if not rec:
         return
+    if rec["png_b64"] is None:
+        # loaded from the saved state: encoded the first time somebody asks, not all at once on start-up
+        rec["png_b64"] = base64.b64encode(rec["png"]).decode("ascii")
     payload = {
         "hash": h,
         "meta": rec["meta"],
-        "png_b64": base64.b64encode(rec["png"]).decode("ascii"),
+        "png_b64": rec["png_b64"],   # encoded once at ingest, not for every request
     }
     await sio.emit("sheet_bytes", payload, to=sid)
 
 sio.on("sheet_register", on_sheet_register)
 sio.on("sheet_get", on_sheet_get)
+sio.on("sheet_offer", on_sheet_offer)
 
 async def on_set_appearance(sid, data): 
     ''' Allows student to change spritesheet mid-game)'''
     p = WORLD.get(sid); 
     if not p: return
+    if not allowed(sid, "set_appearance"): return
     app = p["appearance"]
     app.update({
         "hash":  str(data.get("hash",  app.get("hash", ""))),
@@ -129,10 +364,455 @@ async def on_set_appearance(sid, data):
         "pad":   int(data.get("pad",   app.get("pad", 0))),
         "scale": float(data.get("scale",app.get("scale", 1.0))),
     })
-    await sio.emit("world", WORLD)
+    TO_SAVE.add(sid)
+    await share_players([sid])
+    inst = LOBBY.of.get(sid)
+    if inst is not None:
+        await sio.emit("world", inst.world, room=inst.name)
 
 sio.on("set_appearance", on_set_appearance)
 
+# --- PROJECTILES ---
+# The server owns every projectile: it moves them at SIM_RATE, stops them at walls, and decides who got hit.
+# Clients show their own shots straight away and match them up using the "seq" they sent.
+# Each instance has its own projectiles (instance.projectiles), which only hit players in that instance.
+LAST_SHOT = {}  # sid -> server tick of their last shot
+TICK = 0
+try:
+    ROOMS = list(load_map(str(ROOT / MAP_FILE)).values())
+except OSError as e:
+    print(f"[projectiles] no map ({e}); projectiles won't hit walls")
+    ROOMS = []
+
+def room_blocked(x, y):
+    for room in ROOMS:
+        left, top, right, bottom = room.bounds()
+        if left <= x < right and top <= y < bottom and room.collision_layer().blocked_point(x - left, y - top):
+            return True
+    return False
+
+async def on_shoot(sid, data):
+    """
+    data: { "seq": int, "vx": float, "vy": float }
+    The projectile starts at the shooter's position on the server, not wherever the client says.
+    """
+    p = WORLD.get(sid)
+    inst = LOBBY.of.get(sid)
+    if not p or inst is None:
+        return
+    if not allowed(sid, "shoot"):
+        return
+    if sid in LAST_SHOT and TICK - LAST_SHOT[sid] < SHOT_COOLDOWN:
+        return  # shooting faster than the cooldown allows
+    try:
+        vx = float(data.get("vx", 0))
+        vy = float(data.get("vy", 0))
+        seq = int(data.get("seq", 0))
+    except (TypeError, ValueError, OverflowError, AttributeError):
+        return
+    if not (math.isfinite(vx) and math.isfinite(vy)) or not 0 <= seq < MAX_SHOT_SEQ:
+        return  # "inf" or NaN would make a projectile that can't be moved or hit anything
+    speed = (vx * vx + vy * vy) ** 0.5
+    if speed == 0:  # no direction
+        return
+    if speed > PROJECTILE_SPEED:
+        vx, vy = vx * PROJECTILE_SPEED / speed, vy * PROJECTILE_SPEED / speed
+    LAST_SHOT[sid] = TICK
+    proj = inst.projectiles.spawn(p["x"], p["y"], vx, vy, owner=sid, seq=seq)
+    await sio.emit("projectile_spawn", {"id": proj.id, "owner": sid, "seq": seq, "t": server_time(),
+                                        "x": proj.x, "y": proj.y, "vx": vx, "vy": vy}, room=inst.name)
+
+sio.on("shoot", on_shoot)
+
+async def projectile_loop(app):
+    """Steps the projectiles SIM_RATE times a second and sends each instance one "projectile_end" message per tick."""
+    global TICK
+    dt = 1 / SIM_RATE
+    last = time.perf_counter()
+    accumulator = 0.0
+    while True:
+        await asyncio.sleep(dt)
+        now = time.perf_counter()
+        accumulator = min(accumulator + now - last, 0.25)
+        last = now
+        ended = {}   # instance -> [(id, target sid, owner sid)]
+        while accumulator >= dt:
+            accumulator -= dt
+            TICK += 1
+            for inst in LOBBY.instances.values():
+                if inst.projectiles.active:
+                    inst_ended = ended.setdefault(inst, [])
+                    try:
+                        inst_ended.extend(inst.projectiles.step(room_blocked))
+                        inst_ended.extend(inst.projectiles.hit_players(inst.world))
+                    except Exception as e:
+                        # a bad projectile mustn't stop this loop (and every instance's projectiles with it)
+                        print(f"[projectiles] {inst.name}: {e!r}; removing its projectiles")
+                        inst_ended.extend(inst.projectiles.clear())
+        for inst, inst_ended in ended.items():
+            if inst_ended:
+                await sio.emit("projectile_end", {"ended": [list(e) for e in inst_ended], "t": server_time()},
+                               room=inst.name)
+            LOBBY.tidy(inst)   # an instance everybody left goes once its last shots have landed
+
+async def start_projectile_loop(app):
+    app["projectile_loop"] = asyncio.create_task(projectile_loop(app))
+
+async def stop_projectile_loop(app):
+    app["projectile_loop"].cancel()
+
+app.on_startup.append(start_projectile_loop)
+app.on_cleanup.append(stop_projectile_loop)
+
+async def watch_loop_lag(app, interval=0.005):
+    """Measures how late the event loop wakes up - i.e. the longest time something blocked it."""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag_ms = (time.perf_counter() - start - interval) * 1000
+        LOOP_LAG["worst_ms"] = max(LOOP_LAG["worst_ms"], lag_ms)
+        if INGESTING:
+            LOOP_LAG["ingest_worst_ms"] = max(LOOP_LAG["ingest_worst_ms"], lag_ms)
+
+async def start_lag_watch(app):
+    app["lag_watch"] = asyncio.create_task(watch_loop_lag(app))
+
+async def stop_lag_watch(app):
+    app["lag_watch"].cancel()
+    SHEET_POOL.shutdown(wait=False)
+
+app.on_startup.append(start_lag_watch)
+app.on_cleanup.append(stop_lag_watch)
+
+# --- SHARED ENTITIES ---
+# Crates, doors etc. that every player in an instance sees the same (see modules/replication.py).
+# Changes are collected in the instance's EntityTable (instance.entities) and sent to its players by
+# world_broadcast_loop. With --workers, worker 0 keeps the entity tables and the other workers pass
+# their clients' entity messages on to it.
+
+async def on_entity_register(sid, data):
+    '''
+    data: { "entities": [{"key", "type", "fields": {...}, "authority": "shared"|"owner", "spawned": bool}, ...] }
+    Replies with entity_ids { "entities": [{"id", "key", "type", "owner", "fields"}, ...] } - the server's
+    values, which win if somebody changed the entity before this client loaded it.
+    '''
+    if not allowed(sid, "entity_register") or not isinstance(data, dict):
+        return
+    if await pass_to_worker0("entity_register", sid, data):
+        return
+    await entity_register(sid, data)
+
+async def entity_register(sid, data):
+    inst = LOBBY.of.get(sid)
+    items = data.get("entities")
+    if inst is None or not isinstance(items, list):
+        return
+    replies = [inst.entities.register(sid, item) for item in items[:200] if isinstance(item, dict)]
+    await sio.emit("entity_ids", {"entities": replies}, to=sid)
+
+async def on_entity_update(sid, data):
+    '''
+    data: { "changes": {id: {field: value}}, "dropped": [ids unloaded], "destroyed": [ids they made and killed] }
+    Changes they weren't allowed to make are answered with the real values (an "entities" message to them only).
+    '''
+    if not allowed(sid, "entity_update") or not isinstance(data, dict):
+        return
+    if await pass_to_worker0("entity_update", sid, data):
+        return
+    await entity_update(sid, data)
+
+async def entity_update(sid, data):
+    inst = LOBBY.of.get(sid)
+    if inst is None:
+        return
+    changes = data.get("changes")
+    refused = inst.entities.update(sid, changes) if isinstance(changes, dict) else []
+    for key, destroy in (("dropped", False), ("destroyed", True)):
+        for eid in data.get(key, []) if isinstance(data.get(key), list) else []:
+            if isinstance(eid, int):
+                inst.entities.drop(sid, eid, destroy)
+    if refused:
+        await sio.emit("entities", inst.entities.correction(refused), to=sid)
+
+async def pass_to_worker0(event, sid, data):
+    '''True if this is another worker, and the message has gone to worker 0 to be handled.'''
+    if WORKER in (None, 0):
+        return False
+    await BUS.publish({"method": "entity", "event": event, "sid": sid, "data": data})
+    return True
+
+sio.on("entity_register", on_entity_register)
+sio.on("entity_update", on_entity_update)
+
+# --- FLOOD PROTECTION ---
+async def world_broadcast_loop(app):
+    """
+    Sends each instance its world when moves were held back by RATE_LIMITS, at most WORLD_BROADCAST_RATE
+    times a second, and the entity changes since the last time round.
+    """
+    while True:
+        await asyncio.sleep(1 / WORLD_BROADCAST_RATE)
+        for inst in list(LOBBY.instances.values()):
+            LOBBY.tidy(inst)   # e.g. one made for a player who never arrived
+            if inst.dirty:
+                inst.dirty = False
+                await sio.emit("world", inst.world, room=inst.name)
+            changes = inst.entities.take(server_time())
+            if changes is not None:
+                await sio.emit("entities", changes, room=inst.name)
+
+async def start_world_broadcast(app):
+    app["world_broadcast"] = asyncio.create_task(world_broadcast_loop(app))
+
+async def stop_world_broadcast(app):
+    app["world_broadcast"].cancel()
+
+app.on_startup.append(start_world_broadcast)
+app.on_cleanup.append(stop_world_broadcast)
+
+def throttle_report():
+    """Who is sending too much, worst first: [{"sid", "name", "dropped": {event: n}, "clamped", ...}]"""
+    rows = []
+    for sid, limits in LIMITS.items():
+        row = limits.report()
+        row.update(sid=sid, name=WORLD.get(sid, {}).get("name", sid[:5]))
+        rows.append(row)
+    rows.sort(key=lambda row: (sum(row["dropped"].values()), row["clamped"]), reverse=True)
+    return rows
+
+async def get_throttle(request):
+    """For the teacher: open http://<server>:8000/throttle in a browser."""
+    return web.json_response(throttle_report())
+
+app.router.add_get("/throttle", get_throttle)
+
+def net_report():
+    '''Ping, jitter and clock offset of every client connected to this server, slowest first, with a summary.'''
+    rows = [dict(stats, sid=sid, name=WORLD.get(sid, {}).get("name", sid[:5]),
+                 instance=LOBBY.of[sid].name if sid in LOBBY.of else "") for sid, stats in NET_STATS.items()]
+    rows.sort(key=lambda row: row.get("rtt_ms", 0), reverse=True)
+    rtts = sorted(row["rtt_ms"] for row in rows if "rtt_ms" in row)
+    summary = {"clients": len(rows)}
+    if rtts:
+        summary.update(median_rtt_ms=rtts[len(rtts) // 2], worst_rtt_ms=rtts[-1],
+                       worst_jitter_ms=max(row.get("jitter_ms", 0) for row in rows))
+    return {"summary": summary, "clients": rows}
+
+async def get_net(request):
+    """For the teacher: open http://<server>:8000/net to see everyone's ping."""
+    return web.json_response(net_report())
+
+app.router.add_get("/net", get_net)
+
+async def get_instances(request):
+    """
+    For the teacher: open http://<server>:8000/instances to see how full each instance is.
+    With --workers the entity counts are only known by worker 0 (the others show 0).
+    """
+    return web.json_response(LOBBY.report())
+
+app.router.add_get("/instances", get_instances)
+
+# --- SAVED STATE ---
+def save_player(sid):
+    player_id = PLAYER_IDS.get(sid)
+    p = WORLD.get(sid)
+    if STORE is not None and player_id and p is not None:
+        STORE.player_seen(player_id, p)
+
+async def save_loop(app):
+    '''Every SAVE_INTERVAL: log what changed, and now and then rewrite the snapshot (on a worker thread, it fsyncs).'''
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(SAVE_INTERVAL)
+        for sid in list(TO_SAVE):
+            save_player(sid)
+        TO_SAVE.clear()
+        text = STORE.take_pending()
+        if text:
+            await loop.run_in_executor(None, STORE.append_log, text)
+        if STORE.log_bytes > COMPACT_LOG_BYTES:
+            await loop.run_in_executor(None, STORE.write_snapshot, STORE.snapshot_text(FORGET_PLAYERS_AFTER))
+
+async def load_state(app):
+    started = time.perf_counter()
+    sheets, players = STORE.load()
+    SHEETS.update(sheets)
+    print(f"[store] loaded {len(sheets)} sheets and {len(players)} players from {STORE.folder} "
+          f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+    app["save_loop"] = asyncio.create_task(save_loop(app))
+
+async def save_state(app):
+    '''Last save when the server is stopped properly (Ctrl+C), so nothing since the last SAVE_INTERVAL is lost.'''
+    app["save_loop"].cancel()
+    if STORE.read_only:
+        return
+    for sid in WORLD:
+        save_player(sid)
+    text = STORE.take_pending()
+    if text:
+        STORE.append_log(text)
+    STORE.write_snapshot(STORE.snapshot_text(FORGET_PLAYERS_AFTER))
+
+# --- WORKER PROCESSES ---
+# python -m modules.server --workers 4 starts 4 copies of this server, all listening on the same port
+# (SO_REUSEPORT: the operating system shares new connections between them), plus a BusHub in the
+# parent process that passes messages between them. Each worker:
+#   - runs the players connected to it (moves, shots, rate limits) and sends their changes to the
+#     others as "players" messages, so every worker has the whole WORLD and knows every instance's players
+#   - broadcasts through python-socketio's BusManager, so chat, world and projectile messages reach
+#     the clients of every worker
+#   - tells the others about each sheet it ingests ("sheet"), and they load it from the saved file
+#   - passes its clients' entity messages to worker 0 ("entity"), which keeps the shared entities
+#   - asks worker 0 which instance a new player goes in ("join"), so instance caps hold across workers
+# A player who reconnects to a different worker gets their place back the same way as after a restart
+# (their id). If a worker crashes, the parent starts a new one and its players reconnect to the others.
+async def share_players(sids=(), gone=()):
+    '''Tell the other workers about our players that changed (sids) or left (gone).'''
+    if BUS is None:
+        return
+    players = {sid: dict(WORLD[sid], id=PLAYER_IDS.get(sid, ""), instance=LOBBY.of[sid].name)
+               for sid in sids if sid in WORLD and sid in LOBBY.of}
+    await BUS.publish({"method": "players", "host_id": BUS.host_id, "set": players, "gone": list(gone)})
+
+async def on_bus_message(message):
+    '''Game messages from the other workers (Socket.IO's own are handled by BusManager).'''
+    method = message.get("method")
+    if method == "players":
+        for sid, p in message["set"].items():
+            player_id = p.pop("id", "")
+            if player_id:
+                PLAYER_IDS[sid] = player_id
+            name = p.pop("instance")
+            WORLD[sid] = p
+            REMOTE[sid] = message["host_id"]   # so host_gone still finds them
+            TO_SAVE.add(sid)
+            try:
+                LOBBY.join(sid, LOBBY.get(name), p)   # worker 0 already agreed to the join (see choose_instance)
+            except LobbyFull as e:
+                print(f"[lobby] can't show {p.get('name', sid[:5])} ({sid[:5]}) in {name} on this worker: {e}")
+        for sid in message["gone"]:
+            remove_player(sid)
+    elif method == "sheet":
+        h = message["hash"]
+        if message["info"]:
+            png = STORE.map_sheet(message["info"])
+            if png is None:
+                return
+            STORE.sheet_added(h, message["info"]["file"], message["info"]["bytes"], message["meta"], message["stats"])
+            SHEETS[h] = {"meta": message["meta"], "png": png, "png_b64": None, "stats": message["stats"]}
+        else:
+            png_b64 = message["png_b64"]
+            SHEETS[h] = {"meta": message["meta"], "png": base64.b64decode(png_b64), "png_b64": png_b64,
+                         "stats": message["stats"]}
+        for waiting_sid in WAITING.pop(h, ()):
+            await send_sheet(waiting_sid, h)
+    elif method == "join":
+        if WORKER == 0:
+            try:
+                reply = {"instance": LOBBY.choose(message["wanted"], reserve_for=message["sid"]).name}
+            except LobbyFull as e:
+                reply = {"error": str(e)}
+            await BUS.publish(dict(reply, method="join_reply", sid=message["sid"]))
+    elif method == "join_reply":
+        answer = JOINS.get(message["sid"])
+        if answer is not None and not answer.done():
+            answer.set_result(message)
+    elif method == "entity":
+        if WORKER == 0:
+            handler = {"entity_register": entity_register, "entity_update": entity_update}[message["event"]]
+            await handler(message["sid"], message["data"])
+    elif method == "host_gone":
+        # a worker stopped (or crashed): its players' connections went with it
+        gone = [sid for sid, host_id in REMOTE.items() if host_id == message["host_id"]]
+        changed = {remove_player(sid) for sid in gone} - {None}
+        for inst in changed:
+            await sio.emit("world", inst.world, room=inst.name, ignore_queue=True)   # every worker tells its own clients
+    elif method == "bus_closed":
+        print(f"[worker {WORKER}] the message bus closed; stopping")
+        os.kill(os.getpid(), signal.SIGTERM)   # aiohttp shuts down properly (and saves) on SIGTERM
+
+async def start_bus(app, path):
+    global BUS
+    BUS = BusClient(path, host_id=f"worker{WORKER}-{uuid.uuid4().hex[:8]}")
+    await BUS.connect()
+    manager = BusManager(BUS, on_bus_message)
+    manager.set_server(sio)
+    sio.manager = manager
+    manager.start()
+
+def run_worker(args):
+    global WORKER, STORE
+    WORKER = args.worker
+    LOBBY.first_projectile_id = WORKER * 1_000_000_000 + 1   # projectile ids mustn't clash between workers
+    if not args.no_save:
+        STORE = ServerStore(args.state, read_only=WORKER != 0)   # worker 0 writes the saved state
+    app.on_startup.insert(0, lambda app: start_bus(app, args.bus))
+    if STORE is not None:
+        app.on_startup.append(load_state)
+        app.on_cleanup.append(save_state)
+    web.run_app(app, host=args.host, port=args.port, reuse_port=True, print=None)
+
+async def supervise(args, command):
+    '''Run the bus hub and the workers; start a worker again if it crashes.'''
+    hub = BusHub(args.bus)
+    await hub.start()
+    workers = {}
+    async def start(n):
+        workers[n] = await asyncio.create_subprocess_exec(*command, "--worker", str(n), cwd=str(ROOT))
+    try:
+        for n in range(args.workers):
+            await start(n)
+        print(f"Serving on {args.host}:{args.port} with {args.workers} workers")
+        while True:
+            await asyncio.sleep(0.5)
+            for n, proc in list(workers.items()):
+                if proc.returncode is None:
+                    continue
+                if proc.returncode == 0:
+                    del workers[n]   # stopped properly (e.g. Ctrl+C)
+                else:
+                    print(f"[workers] worker {n} crashed (exit code {proc.returncode}); starting it again")
+                    await start(n)
+    finally:
+        for proc in workers.values():
+            if proc.returncode is None:
+                proc.terminate()
+        for proc in workers.values():
+            await proc.wait()
+        await hub.close()
+
+def main(argv=None):
+    global STORE
+    ap = argparse.ArgumentParser(description="Multiplayer game server")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--state", default=str(ROOT / SERVER_STATE_DIR), help="folder the server saves its state in")
+    ap.add_argument("--no-save", action="store_true", help="start empty and don't save anything")
+    ap.add_argument("--workers", type=int, default=1, help="server processes to run on the port (Linux/macOS)")
+    ap.add_argument("--worker", type=int, default=None, help=argparse.SUPPRESS)   # set by the parent process
+    ap.add_argument("--bus", default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+    if args.worker is not None:
+        run_worker(args)
+        return
+    if args.workers > 1:
+        if not hasattr(socket, "SO_REUSEPORT") or not hasattr(socket, "AF_UNIX"):
+            ap.error("--workers needs Linux or macOS")
+        args.bus = os.path.join(tempfile.gettempdir(), f"strathmore-bus-{args.port}.sock")
+        command = [sys.executable, "-m", "modules.server", "--host", args.host, "--port", str(args.port),
+                   "--state", args.state, "--bus", args.bus] + (["--no-save"] if args.no_save else [])
+        try:
+            asyncio.run(supervise(args, command))
+        except KeyboardInterrupt:
+            pass
+        return
+    if not args.no_save:
+        STORE = ServerStore(args.state)
+        app.on_startup.append(load_state)
+        app.on_cleanup.append(save_state)
+    print(f"Serving on {args.host}:{args.port}")
+    web.run_app(app, host=args.host, port=args.port)
+
 if __name__ == "__main__":
-    print("Serving on 0.0.0.0:8000")
-    web.run_app(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    main()
@@ -0,0 +1,171 @@
+# server_store.py
+# Saves the server's state to disk so restarting it (or a crash) mid-lesson doesn't lose everyone's
+# uploaded sprite sheets and where they were standing. Everything lives in one folder:
+#   sheets/<sha256>.png   the bytes of each sheet, named by their own hash - written once, never changed
+#   snapshot.json         all the state as it was at one moment ("seq" says which change it includes up to)
+#   changes.log           one JSON line per change since the snapshot, appended and flushed every SAVE_INTERVAL
+# A crash can only cut off the end of changes.log, and load() ignores a half-written last line.
+# When the log gets bigger than COMPACT_LOG_BYTES it is compacted: a new snapshot is written to a temp
+# file and renamed over the old one (a rename is all or nothing), then the log is emptied. Every log
+# line has a seq number, so lines that are already in the snapshot are skipped if the server died
+# between those two steps.
+# On load the sheet files are memory-mapped rather than read, so a restart with a class worth of
+# sheets is quick and the bytes are only paged in when somebody asks for that sheet.
+# With --workers every worker loads the same folder, but only worker 0 writes the snapshot and log
+# (the others are read_only: they keep their copy up to date in memory). Sheet files are named by
+# their hash and renamed into place, so any worker can save one.
+import hashlib, json, mmap, os, time
+
+class ServerStore:
+    def __init__(self, folder, read_only=False):
+        self.folder = folder
+        self.read_only = read_only   # changes are kept in memory but never written to the log
+        self.sheet_folder = os.path.join(folder, "sheets")
+        self.snapshot_path = os.path.join(folder, "snapshot.json")
+        self.log_path = os.path.join(folder, "changes.log")
+        os.makedirs(self.sheet_folder, exist_ok=True)
+        self.seq = 0          # number of the last change
+        self.sheets = {}      # client's sheet hash -> {"file": sha256 of the stored PNG, "bytes", "meta", "stats"}
+        self.players = {}     # player id -> {"x", "y", "name", "color", "appearance", "t"}
+        self.pending = []     # changes not written to the log yet
+        self.log_bytes = 0
+
+    # ----- loading -----
+    def load(self):
+        """
+        Read the snapshot and replay the log after it. Returns (sheets, players):
+            sheets:  hash -> {"meta", "png", "png_b64": None, "stats"} ready for the server's SHEETS
+            players: player id -> last known {"x", "y", "name", "color", "appearance", "t"}
+        png is a memory map of the file; png_b64 is made the first time the sheet is sent.
+        """
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+            self.seq = snapshot.get("seq", 0)
+            self.sheets = snapshot.get("sheets", {})
+            self.players = snapshot.get("players", {})
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "rb") as f:
+                data = f.read()
+            if not data.endswith(b"\n") and not self.read_only:
+                # cut off the half-written last line, or the next change would be appended onto the end of it
+                with open(self.log_path, "r+b") as f:
+                    f.truncate(data.rfind(b"\n") + 1)
+            lines = data.split(b"\n")
+            for line in lines:
+                try:
+                    change = json.loads(line)
+                except ValueError:
+                    continue   # empty, or the half-written last line of a crash
+                if change.get("seq", 0) > self.seq:
+                    self._apply(change)
+                    self.seq = change["seq"]
+            self.log_bytes = os.path.getsize(self.log_path)
+
+        sheets = {}
+        for h, info in list(self.sheets.items()):
+            png = self.map_sheet(info)
+            if png is None:
+                print(f"[store] sheet {h[:8]} is missing or the wrong size; it will have to be uploaded again")
+                del self.sheets[h]
+                continue
+            sheets[h] = {"meta": info["meta"], "png": png, "png_b64": None, "stats": info.get("stats", {})}
+        return sheets, dict(self.players)
+
+    def map_sheet(self, info):
+        """Memory-map a saved sheet file. None if it is missing or not the size it should be."""
+        path = self.sheet_path(info["file"])
+        try:
+            if os.path.getsize(path) != info["bytes"]:
+                return None
+            with open(path, "rb") as f:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+    def _apply(self, change):
+        if "sheet" in change:
+            self.sheets[change["sheet"]] = change["info"]
+        elif "player" in change:
+            self.players[change["player"]] = change["data"]
+
+    # ----- recording changes (on the server's event loop) -----
+    def sheet_path(self, digest):
+        return os.path.join(self.sheet_folder, digest + ".png")
+
+    def write_sheet_file(self, png):
+        """
+        Save a sheet's bytes under their own hash and return the hash. Safe to call from the ingest threads.
+        A file that is already there has the same bytes, so it isn't written again.
+        """
+        digest = hashlib.sha256(png).hexdigest()
+        path = self.sheet_path(digest)
+        if not os.path.exists(path):
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(png)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        return digest
+
+    def sheet_added(self, sheet_hash, digest, size, meta, stats):
+        """Record a sheet whose file write_sheet_file has already saved. Returns the info map_sheet needs."""
+        info = {"file": digest, "bytes": size, "meta": meta, "stats": stats}
+        self._record({"sheet": sheet_hash, "info": info})
+        return info
+
+    def player_seen(self, player_id, data):
+        """Record where a player is (and what they look like) so they can carry on after a restart."""
+        self._record({"player": player_id, "data": dict(data, t=time.time())})
+
+    def _record(self, change):
+        self.seq += 1
+        change["seq"] = self.seq
+        self._apply(change)
+        if not self.read_only:
+            self.pending.append(json.dumps(change, separators=(",", ":")))
+
+    # ----- writing -----
+    def take_pending(self):
+        """The changes to write next, as one block of log lines (empty string if there are none)."""
+        if not self.pending:
+            return ""
+        text = "\n".join(self.pending) + "\n"
+        self.pending = []
+        return text
+
+    def append_log(self, text):
+        """Append log lines and make sure they are on the disk. Can run on a worker thread."""
+        data = text.encode("utf-8")
+        with open(self.log_path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self.log_bytes += len(data)
+
+    def snapshot_text(self, forget_after=None):
+        """
+        Everything as one JSON document, to be written by write_snapshot. Players not seen for
+        forget_after seconds are left out (and forgotten), so the file doesn't grow all term.
+        """
+        if forget_after is not None:
+            too_old = time.time() - forget_after
+            self.players = {pid: p for pid, p in self.players.items() if p.get("t", 0) >= too_old}
+        return json.dumps({"seq": self.seq, "sheets": self.sheets, "players": self.players}, separators=(",", ":"))
+
+    def write_snapshot(self, text):
+        """
+        Replace snapshot.json and empty the log. Can run on a worker thread, but take_pending must have
+        been written first (the snapshot includes those changes).
+        """
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        with open(self.log_path, "wb") as f:
+            f.flush()
+            os.fsync(f.fileno())
+        self.log_bytes = 0
@@ -0,0 +1,116 @@
+# sheet_ingest.py
+# Server side processing of a sprite sheet a student uploads (the "sheet_register" message).
+# This is slow work - base64 decoding up to 700 KB of text, decoding the PNG, resizing and
+# re-compressing it - so the server runs ingest_sheet() in an executor instead of on the event loop,
+# where it would stop every position broadcast until it finished.
+#
+# What it does:
+#   1) checks the upload really is a PNG: signature, every chunk's CRC, IHDR first, IDAT, IEND last,
+#      and a sensible width/height - all before Pillow is allowed to decode it
+#   2) checks the sha256 matches the hash the client says it has (so nobody can replace someone else's sheet)
+#   3) applies the declared scale once, here, so clients download the smaller sheet and don't resize it.
+#      Not for packed sheets (with an atlas): resizing the whole sheet would blur neighbouring frames
+#      into each other, so clients scale those a frame at a time, as they always did
+#   4) re-encodes with the best compression, and as a palette PNG when the sheet has 256 colours or
+#      fewer (only if that gives back exactly the same pixels)
+# Needs Pillow (already in requirements.txt) but not pygame.
+import base64, binascii, hashlib, io, struct, zlib
+from PIL import Image
+from modules.config import MAX_SHEET_SIDE
+from modules.atlas import clean_atlas
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+class SheetRejected(ValueError):
+    pass
+
+def check_png(png, max_side=MAX_SHEET_SIDE):
+    """Walk the PNG chunks without decoding the image. Returns (width, height) or raises SheetRejected."""
+    if not png.startswith(PNG_SIGNATURE):
+        raise SheetRejected("not a PNG")
+    pos = len(PNG_SIGNATURE)
+    first = True
+    seen_idat = False
+    size = None
+    while pos + 12 <= len(png):
+        length, kind = struct.unpack_from(">I4s", png, pos)
+        data_start = pos + 8
+        data_end = data_start + length
+        if data_end + 4 > len(png):
+            raise SheetRejected(f"chunk {kind!r} runs past the end of the file")
+        (crc,) = struct.unpack_from(">I", png, data_end)
+        if zlib.crc32(png[pos + 4:data_end]) != crc:
+            raise SheetRejected(f"bad CRC in chunk {kind!r}")
+        if first:
+            if kind != b"IHDR" or length != 13:
+                raise SheetRejected("IHDR must be the first chunk")
+            width, height = struct.unpack_from(">II", png, data_start)
+            if not (0 < width <= max_side and 0 < height <= max_side):
+                raise SheetRejected(f"{width}x{height} is too big (max {max_side}x{max_side})")
+            size = (width, height)
+            first = False
+        elif kind == b"IDAT":
+            seen_idat = True
+        elif kind == b"IEND":
+            if not seen_idat:
+                raise SheetRejected("no image data")
+            return size
+        pos = data_end + 4
+    raise SheetRejected("missing IEND")
+
+def _encode(im):
+    out = io.BytesIO()
+    im.save(out, format="PNG", optimize=True)
+    return out.getvalue()
+
+def reencode(im):
+    """Smallest lossless PNG we can make of an RGBA image: plain RGBA, or a palette if that's exact."""
+    best = _encode(im)
+    colours = im.getcolors(256)
+    if colours is not None:
+        quantized = im.quantize(colors=max(2, len(colours)), method=Image.Quantize.FASTOCTREE)
+        if quantized.convert("RGBA").tobytes() == im.tobytes():
+            palette = _encode(quantized)
+            if len(palette) < len(best):
+                best = palette
+    return best
+
+def ingest_sheet(sheet_hash, png_b64, meta, max_bytes):
+    """
+    Decode, check, scale and re-encode one uploaded sheet. Runs in an executor.
+    Returns {"meta", "png", "png_b64", "stats"} ready to store, or raises SheetRejected.
+    meta must already be cleaned (count, cols, pad, scale, atlas).
+    """
+    try:
+        png = base64.b64decode(png_b64.encode("ascii"), validate=True)
+    except (binascii.Error, UnicodeEncodeError, ValueError):
+        raise SheetRejected("bad base64")
+    if len(png) > max_bytes:
+        raise SheetRejected(f"{len(png)} bytes is over the {max_bytes} byte limit")
+    if hashlib.sha256(png).hexdigest() != sheet_hash:
+        raise SheetRejected("hash doesn't match the PNG")
+    width, height = check_png(png)
+    if meta.get("atlas") and clean_atlas(meta["atlas"], (width, height), meta.get("scale", 1.0)) is None:
+        raise SheetRejected(f"the atlas doesn't fit a {width}x{height} sheet")
+    try:
+        im = Image.open(io.BytesIO(png))
+        im.load()
+    except Exception as e:
+        raise SheetRejected(f"PNG won't decode: {e}")
+    im = im.convert("RGBA")
+
+    new_meta = dict(meta)
+    scale = meta.get("scale", 1.0)
+    if scale != 1.0 and not meta.get("atlas"):
+        # same sizes the client used to work out when it scaled sheets itself
+        im = im.resize((max(1, int(width * scale)), max(1, int(height * scale))), Image.LANCZOS)
+        new_meta["scale"] = 1.0
+    out = reencode(im)
+    if len(out) >= len(png):
+        # the original was already smaller (smoothing when scaling adds colours that don't compress well),
+        # so send that and let clients scale it like they used to
+        out, new_meta, size = png, dict(meta), (width, height)
+    else:
+        size = im.size
+    stats = {"in_bytes": len(png), "out_bytes": len(out), "size": size, "scaled": new_meta["scale"] != scale}
+    return {"meta": new_meta, "png": out, "png_b64": base64.b64encode(out).decode("ascii"), "stats": stats}
@@ -0,0 +1,172 @@
+# spatial.py
+# Spatial hash for game entities. The world is split into square cells and each entity is filed under
+# the cell its world x/y is in, so "what is near the player?" only looks at a few cells instead of
+# every crate and NPC in the game.
+# SpatialGroup is a normal pygame sprite Group that keeps the hash up to date, so student code can
+# keep doing state.entities_group.add(crate) and crate.kill().
+# Queries give entities back in the order they were added, like iterating the Group does, so
+# entities are still drawn (and overlap) in the same order as before they were filed by cell.
+import pygame
+from modules.settings import SPATIAL_CELL_SIZE, DEFAULT_INTERACT_RADIUS
+
+class LargestOf:
+    """The biggest of a number kept for each entity, still right after that entity goes or shrinks."""
+    def __init__(self, floor=0):
+        self.floor = floor
+        self.values = {}      # entity -> its number (only the ones above floor)
+        self._largest = floor
+        self._stale = False   # the largest one went down or was removed; worked out again when asked
+
+    def set(self, ent, v):
+        old = self.values.get(ent)
+        if v > self.floor:
+            self.values[ent] = v
+        elif old is not None:
+            del self.values[ent]
+        if v > self._largest:
+            self._largest = v
+        elif old is not None and old == self._largest and v < old:
+            self._stale = True
+
+    def discard(self, ent):
+        old = self.values.pop(ent, None)
+        if old is not None and old == self._largest:
+            self._stale = True
+
+    @property
+    def value(self):
+        if self._stale:
+            self._largest = max(self.values.values(), default=self.floor)
+            self._stale = False
+        return self._largest
+
+
+class SpatialHash:
+    def __init__(self, cell_size=SPATIAL_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}       # (cx, cy) -> {entity: None} (a dict so the order is always the same)
+        self.where = {}       # entity -> (cx, cy) it is filed under
+        self.unplaced = {}    # entities without x/y, returned by every query
+        self.order = {}       # entity -> when it was added, so queries can give them back in that order
+        self.added = 0
+        self.extents = LargestOf(0)   # half the size of each entity, so queries catch overlapping edges
+
+    @property
+    def max_extent(self):
+        return self.extents.value
+
+    def _cell_of(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def add(self, ent):
+        self.added += 1
+        self.order[ent] = self.added
+        if not (hasattr(ent, "x") and hasattr(ent, "y")):
+            self.unplaced[ent] = None
+            return
+        self._note_size(ent)
+        cell = self._cell_of(ent.x, ent.y)
+        self.cells.setdefault(cell, {})[ent] = None
+        self.where[ent] = cell
+
+    def remove(self, ent):
+        self.order.pop(ent, None)
+        self.extents.discard(ent)
+        self.unplaced.pop(ent, None)
+        cell = self.where.pop(ent, None)
+        if cell is None:
+            return
+        bucket = self.cells.get(cell)
+        if bucket is not None:
+            bucket.pop(ent, None)
+            if not bucket:
+                del self.cells[cell]
+
+    def move(self, ent):
+        """Call after an entity's x/y may have changed. Only touches the hash if it changed cell."""
+        old = self.where.get(ent)
+        if old is None:
+            return
+        self._note_size(ent)
+        cell = self._cell_of(ent.x, ent.y)
+        if cell == old:
+            return
+        bucket = self.cells[old]
+        del bucket[ent]
+        if not bucket:
+            del self.cells[old]
+        self.cells.setdefault(cell, {})[ent] = None
+        self.where[ent] = cell
+
+    def _note_size(self, ent):
+        rect = getattr(ent, "rect", None)
+        if rect is not None:
+            self.extents.set(ent, max(rect.width, rect.height) // 2 + 1)
+
+    def query_rect(self, left, top, right, bottom):
+        """
+        Entities whose x/y is inside the world rect, widened by the biggest entity's half size.
+        In the order they were added (draw order), not the order of the cells they are in.
+        """
+        m = self.max_extent
+        cx0, cy0 = self._cell_of(left - m, top - m)
+        cx1, cy1 = self._cell_of(right + m, bottom + m)
+        found = list(self.unplaced)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self.cells):
+            # the area covers more cells than are in use, so just walk the used ones
+            for (cx, cy), bucket in self.cells.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    found.extend(bucket)
+        else:
+            for cy in range(cy0, cy1 + 1):
+                for cx in range(cx0, cx1 + 1):
+                    bucket = self.cells.get((cx, cy))
+                    if bucket:
+                        found.extend(bucket)
+        found.sort(key=self.order.__getitem__)
+        return found
+
+    def query_radius(self, x, y, r):
+        return self.query_rect(x - r, y - r, x + r, y + r)
+
+    def __len__(self):
+        return len(self.where) + len(self.unplaced)
+
+
+class SpatialGroup(pygame.sprite.Group):
+    """A sprite Group with a SpatialHash kept in step with it."""
+    def __init__(self, *sprites, cell_size=SPATIAL_CELL_SIZE):
+        self.grid = SpatialHash(cell_size)
+        self.radii = LargestOf(DEFAULT_INTERACT_RADIUS)   # each entity's interact_radius
+        self.net = None   # replication.EntityReplicator when connected to a server
+        super().__init__(*sprites)
+
+    @property
+    def max_interact_radius(self):
+        """Biggest interact_radius of the entities in the group now (at least DEFAULT_INTERACT_RADIUS)."""
+        return self.radii.value
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        self.grid.add(sprite)
+        self.radii.set(sprite, getattr(sprite, "interact_radius", 0))
+        if self.net is not None:
+            self.net.track(sprite)
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.grid.remove(sprite)
+        self.radii.discard(sprite)
+        if self.net is not None:
+            self.net.untrack(sprite)
+
+    def moved(self, sprite):
+        """Call after an entity may have moved, or changed size or interact_radius."""
+        self.grid.move(sprite)
+        self.radii.set(sprite, getattr(sprite, "interact_radius", 0))
+
+    def near(self, x, y, r):
+        return self.grid.query_radius(x, y, r)
+
+    def in_rect(self, left, top, right, bottom):
+        return self.grid.query_rect(left, top, right, bottom)
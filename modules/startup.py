@@ -0,0 +1,86 @@
+# startup.py
+# Gets a window up straight away and does the slow start-up work on a worker thread while a progress
+# bar is drawn: reading the map, building the collision grids of the rooms near the start and decoding
+# images. The worker never converts a Surface - ASSETS.decode just reads the file, and ASSETS.image
+# converts it on the main thread the first time the game asks for it.
+import sys, threading
+import pygame
+from modules.settings import WIDTH, HEIGHT
+
+class StartupLoader:
+    """
+    Runs a list of steps on a worker thread:
+        loader.add("Reading the map", load_map, MAP_FILE)
+        loader.start()
+    Each step's return value ends up in loader.results[label].
+    """
+    def __init__(self):
+        self.steps = []       # (label, function, args)
+        self.results = {}     # label -> what the step returned
+        self.done = 0         # steps finished
+        self.current = ""     # label of the step running now
+        self.error = None     # (label, exception) if a step failed
+        self.thread = None
+
+    def add(self, label, func, *args):
+        self.steps.append((label, func, args))
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="startup-loader", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        for label, func, args in self.steps:
+            self.current = label
+            try:
+                self.results[label] = func(*args)
+            except Exception as e:
+                self.error = (label, e)
+                return
+            self.done += 1
+        self.current = "Ready"
+
+    @property
+    def finished(self):
+        return self.thread is not None and not self.thread.is_alive()
+
+    @property
+    def progress(self):
+        return self.done / max(1, len(self.steps))
+
+
+class LoadingScreen:
+    """Title, progress bar and what's being loaded. draw() flips the display itself."""
+    def __init__(self, screen, title="Strathmore Game"):
+        self.screen = screen
+        self.title = pygame.font.Font('assets/FreeSans.ttf', 100).render(title, True, (128, 128, 255))
+        self.font = pygame.font.Font('assets/FreeSans.ttf', 20)
+
+    def draw(self, message, progress):
+        screen = self.screen
+        screen.fill((0, 0, 0))
+        screen.blit(self.title, self.title.get_rect(center=(WIDTH // 2, HEIGHT // 2 - 80)))
+        bar = pygame.Rect(0, 0, WIDTH // 2, 16)
+        bar.center = (WIDTH // 2, HEIGHT // 2 + 40)
+        pygame.draw.rect(screen, (60, 60, 90), bar, border_radius=8)
+        filled = bar.copy()
+        filled.width = int(bar.width * min(1.0, progress))
+        if filled.width > 0:
+            pygame.draw.rect(screen, (128, 128, 255), filled, border_radius=8)
+        text = self.font.render(message, True, (200, 200, 200))
+        screen.blit(text, text.get_rect(center=(WIDTH // 2, bar.bottom + 24)))
+        pygame.display.flip()
+
+    def wait_for(self, loader, clock, fps=60):
+        """Keep the window alive and the bar moving until the loader is finished."""
+        while not loader.finished:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    pygame.quit()
+                    sys.exit(0)
+            self.draw(loader.current, loader.progress)
+            clock.tick(fps)
+        if loader.error is not None:
+            label, e = loader.error
+            raise RuntimeError(f"start-up step failed: {label}") from e
+        self.draw(loader.current, 1.0)
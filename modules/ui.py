@@ -1,4 +1,46 @@
 import pygame
+from collections import OrderedDict
+
+# Text rendering cache. font.render() is one of the slowest things we do every frame,
+# and the HUD/chat box mostly draw the same strings over and over, so keep the
+# rendered surfaces around and only render again when the text actually changes.
+class TextCache():
+    def __init__(self, max_items=256):
+        self.max_items = max_items
+        self._surfaces = OrderedDict()  # (font, text, colour, background, antialias) -> Surface
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, colour, background=None, antialias=True):
+        key = (font, text, _colour_key(colour), _colour_key(background), antialias)
+        surf = self._surfaces.get(key)
+        if surf is not None:
+            self._surfaces.move_to_end(key)  # most recently used goes to the back
+            self.hits += 1
+            return surf
+        self.misses += 1
+        if background is None:
+            surf = font.render(text, antialias, colour)
+        else:
+            surf = font.render(text, antialias, colour, background)
+        self._surfaces[key] = surf
+        if len(self._surfaces) > self.max_items:
+            self._surfaces.popitem(last=False)  # evict the least recently used
+        return surf
+
+    def clear(self):
+        self._surfaces.clear()
+
+    def __len__(self):
+        return len(self._surfaces)
+
+def _colour_key(colour):
+    # pygame.Color can't be used as a dict key, so turn colours into plain tuples
+    if colour is None or isinstance(colour, str):
+        return colour
+    return tuple(colour)
+
+TEXT_CACHE = TextCache()  # shared by the HUD, chat box and chat messages
 
 class TextBox():
     def __init__(self,x,y,width,height):
@@ -10,12 +52,16 @@ class TextBox():
         self.font = pygame.font.SysFont('FreeSans.ttf', 16)
         self.active = False
         self.text = ""
+        self._txt_surface = None   # last rendered text, only re-rendered when self.text changes
+        self._rendered_text = None
         
     def draw(self, screen):
         if self.active:
             pygame.draw.rect(screen, '#ffffff', self.rect, 2)
-            txt_surface = self.font.render(self.text, True, pygame.Color("white"))
-            screen.blit(txt_surface, (self.rect.x + 5, self.rect.y + 5))
+            if self.text != self._rendered_text:
+                self._txt_surface = TEXT_CACHE.render(self.font, self.text, (255, 255, 255))
+                self._rendered_text = self.text
+            screen.blit(self._txt_surface, (self.rect.x + 5, self.rect.y + 5))
         
     def handle_event(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN:
@@ -5,68 +5,200 @@
 # v7.1 started 28/9/25 allows the game to run as local only if a server is not found
 # Also implements a student_code.py module where students write their Player class and later other classes such as objects and NPCs
 # v7.2 student sprite sheet pngs shared by uploading to the server
+#
+# Command line options (all optional):
+#   --headless          no window, runs the simulation as fast as it can (for benchmarks and testing)
+#   --ticks N           stop after N simulation ticks (headless default 600)
+#   --record FILE       save every input and network message to a replay file
+#   --replay FILE       play a replay file back and check it ends in exactly the same place
+#   --bot               press random keys (seeded) instead of reading the keyboard
+#   --seed N            seed for random numbers, so runs can be repeated
+#   --no-draw           skip drawing (headless only), to time just the simulation
+#   --instance NAME     join this room instance on the server (e.g. your class), instead of letting the server choose
+# e.g. python strathmore-game-v7.py --headless --bot --record replays/test.jsonl
+#      python strathmore-game-v7.py --headless --replay replays/test.jsonl
+
+import argparse, os, random, sys, time
+STARTED = time.perf_counter()  # start-up times are measured from here
+from collections import deque
+parser = argparse.ArgumentParser(description="Strathmore multiplayer game")
+parser.add_argument("--headless", action="store_true")
+parser.add_argument("--ticks", type=int, default=None)
+parser.add_argument("--record")
+parser.add_argument("--replay")
+parser.add_argument("--bot", action="store_true")
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("--no-draw", action="store_true")
+parser.add_argument("--instance", default="", help="room instance to join on the server (default: the server chooses)")
+args = parser.parse_args()
+if args.headless:
+    os.environ["SDL_VIDEODRIVER"] = "dummy"   # must be set before pygame opens a window
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
 
 import pygame
-from modules.entities import *
 from modules.settings import *
+from modules.startup import StartupLoader, LoadingScreen
+
+# Open the window and show the loading screen before doing anything slow
+pygame.init()
+screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.DOUBLEBUF)
+pygame.display.set_caption("Strathmore Game")
+loading = LoadingScreen(screen)
+loading.draw("Starting...", 0.0)
+first_frame_ms = (time.perf_counter() - STARTED) * 1000
+
+from modules.entities import *
 from modules.ui import *
+from modules.chat import ChatLog
+from modules.profiler import Profiler
+from modules.render import WorldRenderer
+from modules.spatial import SpatialGroup
+from modules.assets import ASSETS, read_manifest, manifest_paths
+from modules.entity_store import EntityStore, ArrayEntity
+from modules.map_data import load_map
+from modules.rooms import RoomStreamer
 from modules.network_client import NetClient
-from modules.player_loader import make_player
+from modules.player_loader import make_player, player_class
+from modules.replay import InputState, ReplayRecorder, ReplayPlayer, RandomWalker
 from student_code import *
 
 SERVER_URL = "http://localhost:8000"  # or "http://<host-lan-ip>:8000" on students' PCs
 
-# Set up the game window
-pygame.init()
-
 # Game State Class to store variables - makes it easier to pass them around
 class GameState:
-    def __init__(self):
-        self.screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.DOUBLEBUF)
-        pygame.display.set_caption("Strathmore Game")
+    def __init__(self, screen):
+        self.screen = screen
         self.clock = pygame.time.Clock()
-        self.background = pygame.image.load("assets/starfield720.png").convert()
+        self.background = None # set once the images are loaded
         self.mode = "auto" #accepts menu, offline, server or client, added auto in 7.1 to connect to a server if there is one or run offline
         self.player = None
         self.client = None
+        self.connecting = None # NetClient still trying to reach the server in the background
         self.server = None
-        self.message_cache = []  # list of surfaces containing rendered messages ready to blit
-        self.message_list = "" # new messages read from network ready to be put in the cache
         self.chat_font = pygame.font.Font('assets/FreeSans.ttf', 16)
+        self.chat = ChatLog(self.chat_font, 10, HEIGHT - 10) # chat messages from the network, drawn bottom-left
         self.menu_font = pygame.font.Font('assets/FreeSans.ttf', 100) # used when showing the menu, define here as globals to avoid repeating code in the game loop
         self.menu_text = self.menu_font.render("Strathmore Game", True, (128,128,255)) # used when showing the menu, define here as globals to avoid repeating code in the game loop
         self.player_data = {} # hold the data on network player sprites to be broadcast
         self.players_group = {} # holds the Other_Player sprite objects to be displayed
-        self.projectiles_group = pygame.sprite.Group()
+        self.projectiles_group = ProjectilePool()  # pooled projectiles, shared with the server when online
         self.player_group = pygame.sprite.GroupSingle() # the current player of the local client, stored in a group for some reason that I forget now
         self.rooms_group = pygame.sprite.Group()
-        self.entities_group = pygame.sprite.Group()
+        self.room_streamer = None # loads rooms from the map file as the player gets near them
+        self.entities_group = SpatialGroup() # a Group that also files entities by position so we can find nearby ones quickly
+        try:
+            self.npcs = EntityStore() # big crowds of simple NPCs (ArrayEntity), kept in NumPy arrays
+        except RuntimeError as e:
+            print(e)
+            self.npcs = None
+        ArrayEntity.store = self.npcs
         self.chat_box = None
         self.hud = HUD(font_size=20, max_msgs=4)
         self.hud.set_score(0)
-
-state = GameState()
-
-# Message Caching and Drawing
-def update_message_cache(state):
-    #message_cache = []  # Clear cache and re-render messages
-    for line in state.message_list.splitlines():
-        text_surface = state.chat_font.render(line, True, (0, 0, 0), (255, 255, 255))
-        state.message_cache.append(text_surface)
-        if len(state.message_cache) > 50:
-            state.message_cache.pop(0)
-    state.message_list = "" # rather than clearing the message cache and re-renedering the whols list when there is one change, I will addd new lines to the cache without clearing it so the message-list only contains new lines to be added now
-
-def draw_messages(state):
-    h = state.message_cache[0].get_height() if state.message_cache else 16
-    y = HEIGHT - (h * len(state.message_cache)) - 10
-    for text_surface in state.message_cache:
-        state.screen.blit(text_surface, (10, y))
-        y += h
+        self.sim_dt = 1.0 / SIM_RATE # the simulation always moves forward in steps of this many seconds
+        self.accumulator = 0.0 # real time that has passed but hasn't been simulated yet
+        self.alpha = 0.0 # how far we are between the last two simulation ticks (0-1), used to smooth drawing
+        self.profiler = Profiler() # times each part of the game loop, F3 to show, F4 to save a trace
+        self.renderer = WorldRenderer(self.screen) # the world is drawn through this so it can be rendered at a lower resolution
+        self.tick = 0 # simulation ticks run so far
+        self.collided = False # did the player bump into something this tick
+        self.headless = False # no window: one tick per frame, as fast as possible
+        self.input = None # InputState when the keyboard comes from events we can record/replay
+        self.recorder = None # ReplayRecorder when recording
+        self.replay = None # ReplayPlayer when playing a replay back
+        self.bot = None # RandomWalker when --bot is used
+        self.startup = {"first_frame_ms": first_frame_ms} # start-up times, see report_startup
+
+state = GameState(screen)
+
+# Slow start-up work runs on a worker thread while the loading screen is drawn (see startup.py)
+def prepare_rooms_near_start(rooms):
+    '''decode the images and build the collision grids of the rooms the player starts next to'''
+    for data in rooms.values():
+        if data.distance_to(PLAYER_START_X, PLAYER_START_Y) <= ROOM_LOAD_DISTANCE:
+            ASSETS.decode(data.image)
+            data.collision_layer()
+
+loader = StartupLoader()
+loader.add("Reading the map", load_map, MAP_FILE)
+loader.add("Loading rooms", lambda: prepare_rooms_near_start(loader.results["Reading the map"]))
+manifest = read_manifest(ASSET_MANIFEST) # images listed here are loaded now rather than mid-game
+for path in manifest_paths(manifest):
+    loader.add(f"Loading {path}", ASSETS.decode, path)
+player_sheet = getattr(player_class(), "SHEET", None)
+if player_sheet and os.path.exists(player_sheet):
+    loader.add(f"Loading {player_sheet}", ASSETS.decode, player_sheet)
+loader.start()
+loading.wait_for(loader, state.clock, FPS)
+ASSETS.preload(manifest) # converts the images the loader decoded
+state.background = ASSETS.image("assets/starfield720.png", mode="opaque")
 
 # Game Logic (Called in the game loop)
+def get_events(state):
+    '''this frame's events, from the keyboard, a replay or the bot (and records them if recording)'''
+    events = pygame.event.get()
+    if state.replay is not None:
+        events = [e for e in events if e.type == pygame.QUIT] + state.replay.events_for(state.tick)
+    elif state.bot is not None:
+        events = [e for e in events if e.type == pygame.QUIT] + state.bot.events_for(state.tick)
+    for event in events:
+        if state.input is not None:
+            state.input.handle_event(event)
+        if state.recorder is not None:
+            state.recorder.event(state.tick, event)
+    return events
+
+def apply_network(state):
+    '''in record/replay mode network messages are applied here, on the game thread, between ticks'''
+    if state.replay is not None and state.client is not None:
+        for name, net_args in state.replay.net_for(state.tick):
+            state.client.handlers[name](*net_args)
+    elif state.client is not None and state.client.deferred is not None:
+        state.client.apply_deferred(state.recorder, state.tick)
+
+def check_connection(state):
+    '''switch from offline to client mode as soon as the background connect gets through to the server'''
+    nc = state.connecting
+    if nc is not None and nc.connected and nc.my_sid is not None:
+        state.connecting = None
+        state.client = nc
+        state.projectiles_group.net = nc
+        nc.entities.attach(state.entities_group, classes=entity_classes())
+        state.mode = "client"
+        state.hud.add_msg("Connected to the server")
+        state.startup["connected_ms"] = (time.perf_counter() - STARTED) * 1000
+        print(f"[startup] connected after {state.startup['connected_ms']:.0f} ms")
+
+def report_startup(state):
+    '''called after the first game frame: how long until the window appeared, and until you could play'''
+    state.startup["playable_ms"] = (time.perf_counter() - STARTED) * 1000
+    print(f"[startup] first frame after {state.startup['first_frame_ms']:.0f} ms, "
+          f"playable after {state.startup['playable_ms']:.0f} ms")
+
+def finish(state):
+    '''close the replay file, print the headless report and quit'''
+    code = 0
+    p = state.player
+    if state.recorder is not None:
+        state.recorder.close(state.tick, p.x, p.y)
+        print(f"Recorded {state.tick} ticks to {state.recorder.path}")
+    if state.headless:
+        seconds = time.perf_counter() - state.started
+        print(f"{state.tick} ticks in {seconds:.2f}s ({state.tick / max(seconds, 1e-9):.0f} ticks/s), "
+              f"player at ({p.x:.2f}, {p.y:.2f})")
+    if state.replay is not None:
+        if state.replay.mismatch is not None:
+            tick, expected, got = state.replay.mismatch
+            print(f"Replay DIFFERENT at tick {tick}: expected {expected}, got {got}")
+            code = 1
+        elif state.replay.checks or state.replay.end:
+            print("Replay matched the recording")
+    pygame.quit()
+    sys.exit(code)
+
 def handle_events(state):
-    for event in pygame.event.get():
+    for event in get_events(state):
+        state.chat.handle_event(event)
         if state.chat_box.handle_event(event) == "submit":
             if state.mode == "client":   # don't try to send a message if we are offline
                 if state.chat_box.text.strip():
@@ -75,12 +207,19 @@ def handle_events(state):
             state.chat_box.active = False
             state.player.input_enabled = True
         if event.type == pygame.QUIT:
-            pygame.quit()
-            exit()
+            finish(state)
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_t:
                 state.chat_box.active = True
                 state.player.input_enabled = False    
+            elif event.key == pygame.K_F3:
+                state.profiler.toggle()
+            elif event.key == pygame.K_F4 and state.profiler.events:
+                path = state.profiler.export_trace()
+                state.hud.add_msg(f"Saved {path}")
+            elif event.key == pygame.K_F5:
+                ASSETS.print_report()   # memory used by each loaded image
+                state.hud.add_msg(f"Images: {ASSETS.total_bytes() / (1024 * 1024):.1f} MB")
 
 def _can_interact(ent, player, default_r=DEFAULT_INTERACT_RADIUS):
     # allow per-entity override: ent.interact_radius = 72
@@ -100,7 +239,8 @@ def run_interactions(state):
     nearest = None
     best_d2 = None
 
-    for ent in state.entities_group:
+    # only look at entities close enough that they could be in range
+    for ent in state.entities_group.near(player.x, player.y, state.entities_group.max_interact_radius):
         # must actually support interaction
         if not hasattr(ent, "on_interact"):
             continue
@@ -114,29 +254,60 @@ def run_interactions(state):
         return
 
     # optional per-entity cooldown
-    now = pygame.time.get_ticks()
+    now = state.tick * 1000 // SIM_RATE   # simulation time (ms), so replays behave the same
     cd = getattr(nearest, "_cooldown_ms", 200)
     last = getattr(nearest, "_last_interact_time", 0)
     if now - last >= cd:
         nearest._last_interact_time = now
         nearest.on_interact(state)
+        state.entities_group.moved(nearest) # in case on_interact moved it
 
 def update_game_state(state):
-    # --- snapshot player position BEFORE any updates this frame ---
+    '''runs one fixed simulation tick (1/SIM_RATE seconds) no matter how fast we are drawing'''
+    prof = state.profiler
+    if state.client is not None:
+        state.client.apply_move_fixes()   # the server said we moved too far
+    # --- snapshot player position BEFORE any updates this tick ---
     if state.player is not None:
         state.player.prev_x, state.player.prev_y = state.player.x, state.player.y
 
-    '''applies data recieved from the network in the last game loop'''
+    prof.begin("input")
     state.player_group.update()
-    state.projectiles_group.update()
-    for ent in state.entities_group:
-        ent.update(state.player.x, state.player.y, WIDTH, HEIGHT)
+    prof.end("input")
+
+    prof.begin("entities")
+    state.projectiles_group.update(state.rooms_group)
+    if state.client is not None:
+        for pid, target, owner in state.projectiles_group.ended:
+            if not target:
+                continue    # hit a wall or ran out of time
+            if owner == state.client.my_sid:
+                state.hud.set_score(state.hud.score + 1)
+            elif target == state.client.my_sid:
+                state.hud.add_msg("You were hit!", (255, 80, 80))
+    # only entities on or near the screen are updated, ones far away wait until the player comes closer
+    px, py = state.player.x, state.player.y
+    reach_x = WIDTH // 2 + ENTITY_ACTIVE_MARGIN
+    reach_y = HEIGHT // 2 + ENTITY_ACTIVE_MARGIN
+    active = state.entities_group.in_rect(px - reach_x, py - reach_y, px + reach_x, py + reach_y)
+    for ent in active:
+        ent.update(px, py, WIDTH, HEIGHT)
+        state.entities_group.moved(ent)
+    if state.npcs is not None:
+        state.npcs.step()  # moves and animates every ArrayEntity at once
+    state.room_streamer.update(px, py)  # load rooms we are walking towards, unload ones far behind
     state.rooms_group.update()
+    for op in state.players_group.values():
+        op.update(state.player.x, state.player.y)  # steps the network players' animation
+    prof.end("entities")
 
     # Handle interactions by finding the nearest interactive object within DEFAULT_INTERACT_RADIUS
+    prof.begin("interactions")
     run_interactions(state)
+    prof.end("interactions")
 
     # Handle player collisions (rooms + solid entities)
+    prof.begin("collision")
     collided = False
 
     # 1) room/tiles 
@@ -145,10 +316,11 @@ def update_game_state(state):
             collided = True
             break
 
-    # 2) entities 
-    for ent in state.entities_group:
+    # 2) entities (only the ones near the player can be touching it)
+    hit_rect = state.player.hit_rect
+    for ent in state.entities_group.near(state.player.x, state.player.y, max(hit_rect.width, hit_rect.height)):
         # overlap check once
-        if not ent.rect.colliderect(state.player.hit_rect):
+        if not ent.rect.colliderect(hit_rect):
             continue
 
         # 2a) re-check solidity (it may have changed in on_interact)
@@ -157,38 +329,73 @@ def update_game_state(state):
             # optional touch hook even for solids (e.g., damage, sound)
             if hasattr(ent, "on_collide"):
                 ent.on_collide(state.player)
+                state.entities_group.moved(ent)
             collided = True
             break  # stop at first blocking contact
 
         # 2b) non-solid touch triggers (coins, pads, checkpoints, etc.)
         if hasattr(ent, "on_collide"):
             ent.on_collide(state.player)
+            state.entities_group.moved(ent)
 
     # 3) resolve
+    state.collided = collided
     if collided:
         state.player.move_back()
+    prof.end("collision")
+
+    # shared entities: send what changed on the ones near us, apply what other players changed
+    if state.client is not None:
+        prof.begin("replicate")
+        state.client.entities.sync(active)
+        prof.end("replicate")
+
+    # 4) animate once per tick, after collisions have decided where the player ended up
+    if hasattr(state.player, "animate"):
+        state.player.animate()
+
+def camera_position(state):
+    '''the local player's position blended between the last two ticks, so drawing stays smooth when FPS != SIM_RATE'''
+    p = state.player
+    return p.prev_x + (p.x - p.prev_x) * state.alpha, p.prev_y + (p.y - p.prev_y) * state.alpha
+
+def place_on_screen(spr, cam_x, cam_y):
+    '''move a sprite's rect to where its world x/y appears for the given camera'''
+    if hasattr(spr, "x") and hasattr(spr, "y"):
+        spr.rect.center = (int(spr.x - cam_x + (WIDTH // 2)), int(spr.y - cam_y + (HEIGHT // 2)))
 
 def draw_group(surface, group):
     for spr in group.sprites():
         if hasattr(spr, "draw"):
-            spr.draw(surface)          # lets BasePlayer run facing/idle/animation
+            spr.draw(surface)          # lets BasePlayer flip/position its current frame
         else:
             surface.blit(spr.image, spr.rect)
 
 def draw_game(state):
     '''draws all elements to the screen'''
-    state.screen.blit(state.background, (0,0))
-    state.rooms_group.draw(state.screen) 
+    cam_x, cam_y = camera_position(state)
+    world = state.renderer    # world layer, may be lower resolution than the window
+    world.blit(state.background, (0,0))
+    for room in state.rooms_group:
+        room.update(cam_x, cam_y)
+        world.blit(room.image, room.rect)
     #state.player_group.draw(state.screen) # the player group only contains the local player
-    state.entities_group.draw(state.screen)
-    draw_group(state.screen, state.player_group)
+    for ent in state.entities_group.in_rect(cam_x - WIDTH // 2, cam_y - HEIGHT // 2, cam_x + WIDTH // 2, cam_y + HEIGHT // 2):
+        place_on_screen(ent, cam_x, cam_y)
+        world.blit(ent.image, ent.rect)
+    if state.npcs is not None:
+        state.npcs.draw(world, cam_x, cam_y, state.alpha)
+    draw_group(world, state.player_group)
     
     for op in state.players_group.values():
-        op.update(state.player.x, state.player.y)  # draw relative to camera
-        state.screen.blit(op.image, op.rect)
-    state.projectiles_group.draw(state.screen)
+        place_on_screen(op, cam_x, cam_y)  # draw relative to camera
+        world.blit(op.image, op.rect)
+    state.projectiles_group.draw(world, cam_x, cam_y, state.alpha)
+    world.present()
+
+    # UI is drawn on top at full window resolution
     state.chat_box.draw(state.screen)
-    draw_messages(state)
+    state.chat.draw(state.screen)
 
     state.hud.update()
     state.hud.draw(state.screen)
@@ -201,45 +408,128 @@ state.chat_box = TextBox(WIDTH - 410,HEIGHT - 35,400,20)
 state.chat_box.active=False 
 
 # Set up network client
-if state.mode in ("client","auto"):
-    nc = NetClient(state, SERVER_URL, name="Player1", color="#ffcc66")
+random.seed(args.seed)
+if args.replay:
+    state.replay = ReplayPlayer(args.replay)
+    random.seed(state.replay.header.get("seed", args.seed))
+if args.headless or args.record or args.replay or args.bot:
+    # the simulation reads the keyboard from events, so it can be recorded and replayed
+    state.input = InputState()
+    state.input.install()
+state.headless = args.headless
+state.bot = RandomWalker(args.seed) if args.bot else None
+
+if state.replay is not None:
+    # a replay never connects; recorded network messages are fed to a client that isn't connected
+    state.client = NetClient(state, SERVER_URL, name="Player1", color="#ffcc66", instance=args.instance)
+    state.client.my_sid = state.replay.header.get("my_sid")
+    state.projectiles_group.net = state.client
+    state.client.entities.attach(state.entities_group, classes=entity_classes())
+    state.mode = "offline"
+elif state.mode in ("client","auto") and not args.headless and args.record:
+    # a recording needs to know our sid before the first tick, so this waits for the server
+    nc = NetClient(state, SERVER_URL, name="Player1", color="#ffcc66", instance=args.instance)
     if nc.connect(timeout=0.6):
         state.client = nc
+        state.projectiles_group.net = nc
+        nc.entities.attach(state.entities_group, classes=entity_classes())
         state.mode = "client"
     else:
         state.client = None
         state.mode = "offline"
-
-# Set up Rooms
-cafeteria = Cafeteria(WIDTH//2,HEIGHT//2+200, state.player)
-state.rooms_group.add(cafeteria)
+elif state.mode in ("client","auto") and not args.headless:
+    # play offline straight away, check_connection switches to client mode when the server answers
+    state.connecting = NetClient(state, SERVER_URL, name="Player1", color="#ffcc66", instance=args.instance)
+    state.connecting.connect_in_background()
+    state.mode = "offline"
+else:
+    state.mode = "offline"
+
+if args.record:
+    os.makedirs(os.path.dirname(args.record) or ".", exist_ok=True)
+    state.recorder = ReplayRecorder(args.record, {"seed": args.seed, "sim_rate": SIM_RATE, "map": MAP_FILE,
+                                                  "player": type(state.player).__name__,
+                                                  "my_sid": state.client.my_sid if state.client else None})
+    if state.client is not None:
+        state.client.deferred = deque()   # network messages wait for the game thread so they can be recorded
+
+max_ticks = args.ticks
+if max_ticks is None and state.replay is not None:
+    max_ticks = state.replay.length
+elif max_ticks is None and args.headless:
+    max_ticks = 600
+
+# Set up Rooms - rooms come from the map file and are loaded/unloaded as the player moves
+state.room_streamer = RoomStreamer(loader.results["Reading the map"], state, resolve=globals().get)
+state.room_streamer.update(state.player.x, state.player.y, max_loads=None) # load everything near the start straight away
 
 # Add entities
 #crate = Crate(0,0,state)
 #state.entities_group.add(crate)
 
 # GAME LOOP
+# The simulation runs at a fixed SIM_RATE using an accumulator: each frame adds the real time
+# that has passed, then we run as many fixed ticks as fit. A slow PC draws fewer frames but the
+# game still runs at the same speed, and a fast PC draws extra frames blended between ticks.
+def run_tick(state):
+    prof.begin("update")
+    update_game_state(state)
+    prof.end("update")
+    state.tick += 1
+    p = state.player
+    if state.recorder is not None:
+        state.recorder.after_tick(state.tick, p.x, p.y, state.collided)
+    if state.replay is not None:
+        state.replay.after_tick(state.tick, p.x, p.y, state.collided)
+
+frame_time = 0.0
+prof = state.profiler
+state.started = time.perf_counter()
 while True:
+    if max_ticks is not None and state.tick >= max_ticks:
+        finish(state)
+
+    prof.begin("events")
     handle_events(state)
+    apply_network(state)
+    check_connection(state)
+    prof.end("events")
 
     # if state.mode == "menu":
     #     update_menu(state)
 
     if state.mode in ("server", "client", "offline"):
-        update_game_state(state)
+        if state.headless:
+            # no real time to keep up with: exactly one tick per frame, as fast as we can
+            run_tick(state)
+            state.alpha = 1.0
+        else:
+            state.accumulator += min(frame_time, MAX_FRAME_TIME)
+            while state.accumulator >= state.sim_dt:
+                run_tick(state)
+                state.accumulator -= state.sim_dt
+                if max_ticks is not None and state.tick >= max_ticks:
+                    break
+            state.alpha = state.accumulator / state.sim_dt
 
         # --- network tick (client only) ---
         if state.mode == "client" and state.client is not None:
+            prof.begin("send_move")
             state.client.tick_send_move()
-        update_message_cache(state)
-        draw_game(state)
-        
-        # draw OTHER players (kept in a dict of sprites) -DEBUG CODE: generated by chatgpt - doesn't seem to integrate with gamestate 
-        for sid, spr in state.players_group.items():
-            # if your Other_Player needs per-frame update, do it here:
-            # spr.update(state.player.x, state.player.y)  # e.g., camera-relative
-            state.screen.blit(spr.image, spr.rect)
+            prof.end("send_move")
+            if prof.enabled:
+                prof.notes["ping"] = state.client.clock.describe()
+        if not (state.headless and args.no_draw):
+            prof.begin("draw")
+            draw_game(state)
+            prof.end("draw")
     
+    prof.draw(state.screen)
+    prof.begin("flip")
     pygame.display.flip() 
-    #print(state.clock.get_fps())
-    state.clock.tick(FPS)
\ No newline at end of file
+    prof.end("flip")
+    prof.end_frame()
+    if "playable_ms" not in state.startup:
+        report_startup(state)
+    frame_time = state.clock.tick(0 if state.headless else FPS) / 1000.0
+    state.renderer.auto_adjust(state.clock.get_fps(), frame_time * 1000)